@@ -0,0 +1,152 @@
+"""
+准入控制（位于 /v1/chat/completions 之前，保护 vLLM 后端）
+- 最多 max_inflight 个请求同时处理，超出的进入有界等待队列（先到先得）
+- CoDel 式丢弃：队列持续非空超过 interval，说明排队已是常态而非突发，
+  此后排队最多等 target_delay；平时最多等 max_wait（且不超过请求自身的截止时间）
+- 队列已满或等待超时立即拒绝（Overloaded），由调用方返回 503 + Retry-After，而不是让请求堆积
+- 排队时间单独统计（wait），与处理时间（service）分开
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import metrics
+from config import (
+    ADMISSION_INTERVAL,
+    ADMISSION_MAX_INFLIGHT,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_WAIT,
+    ADMISSION_RETRY_AFTER_MAX,
+    ADMISSION_TARGET_DELAY,
+)
+from metrics import LatencyHistogram
+
+
+class Overloaded(Exception):
+    """请求被拒绝：reason 为 queue_full / queue_delay / deadline"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"overloaded: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+
+    def __init__(
+        self,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        target_delay: float = ADMISSION_TARGET_DELAY,
+        interval: float = ADMISSION_INTERVAL,
+        max_wait: float = ADMISSION_MAX_WAIT,
+    ):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.target_delay = target_delay
+        self.interval = interval
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._busy_since = 0.0   # 队列最近一次由空变为非空的时间
+        self.wait = LatencyHistogram()
+        self.service = LatencyHistogram()
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "queue_delay": 0, "deadline": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def overloaded(self, now: Optional[float] = None) -> bool:
+        """队列持续非空超过 interval"""
+        now = time.monotonic() if now is None else now
+        return bool(self._waiters) and now - self._busy_since > self.interval
+
+    def retry_after(self) -> int:
+        """建议客户端重试的秒数：按处理时间中位数估算当前队列排空所需时间"""
+        per_request = self.service.percentile(50) or 1.0
+        seconds = math.ceil(per_request * (len(self._waiters) + 1) / max(1, self.max_inflight))
+        return max(1, min(ADMISSION_RETRY_AFTER_MAX, seconds))
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.shed[reason] += 1
+        metrics.incr(f"admission_shed_{reason}")
+        return Overloaded(reason, self.retry_after())
+
+    async def acquire(self, deadline: Optional[float] = None) -> float:
+        """
+        获取一个处理名额，返回排队时间（秒）；被拒绝时抛出 Overloaded
+        - deadline: time.monotonic() 时间点，排队不超过请求自身的截止时间
+        """
+        now = time.monotonic()
+        if self.in_flight < self.max_inflight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            self.wait.observe(0.0)
+            return 0.0
+
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        timeout, reason = (self.target_delay if self.overloaded(now) else self.max_wait), "queue_delay"
+        if deadline is not None and deadline - now < timeout:
+            timeout, reason = max(0.0, deadline - now), "deadline"
+
+        if not self._waiters:
+            self._busy_since = now
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # 刚分配到名额就被取消：转交给下一个
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(reason) from None
+            raise
+
+        waited = time.monotonic() - now
+        self.admitted += 1
+        self.wait.observe(waited)
+        return waited
+
+    def release(self, started: Optional[float] = None) -> None:
+        """
+        归还名额：有排队请求时直接转交给最早的一个
+        - started: 处理开始的 time.monotonic()，用于统计处理时间
+        """
+        if started is not None:
+            self.service.observe(time.monotonic() - started)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_inflight": self.max_inflight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "overloaded": self.overloaded(),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "wait": self.wait.stats(),
+            "service": self.service.stats(),
+        }
+
+
+# 进程级准入控制器
+admission = AdmissionController()
+metrics.register_collector("admission", admission.stats)
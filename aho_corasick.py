@@ -0,0 +1,104 @@
+"""
+Aho-Corasick 多模式匹配（纯 Python）
+- 构建：所有模式串插入字典树，再按 BFS 建立失配指针，一次构建多次使用
+- 匹配：对文本单次扫描 O(len(text) + 匹配数)，返回所有模式出现的位置
+- longest()：从左到右、同一位置取最长、互不重叠的匹配（地名、关键词解析常用），沿字典树前向扫描
+"""
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class AhoCorasick:
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]] = ()):
+        # 节点 i：_goto[i] 子节点表，_fail[i] 失配指针，_own[i] 以该节点结尾的 (模式长度, 值)，
+        # _out[i] 为 _own[i] 加上失配链上的输出（build() 时重新计算）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._own: List[List[Tuple[int, Any]]] = [[]]
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+        self._built = False
+        for pattern, value in patterns:
+            self.add(pattern, value)
+        self.build()
+
+    def add(self, pattern: str, value: Any) -> None:
+        """插入模式串（同一模式可对应多个值）；插入后需重新 build()"""
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            node = nxt
+        self._own[node].append((len(pattern), value))
+        self._built = False
+
+    def build(self) -> None:
+        """BFS 建立失配指针，并把失配链上的输出合并到当前节点（可重复调用）"""
+        self._out = [list(own) for own in self._own]
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._own[child] + self._out[self._fail[child]]
+        self._built = True
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """所有匹配：(起始位置, 结束位置, 值)，按结束位置递增"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, value in out[node]:
+                yield i + 1 - length, i + 1, value
+
+    def longest(self, text: str) -> List[Tuple[int, int, Any]]:
+        """
+        从左到右、同一起点取最长、互不重叠的匹配（同一模式有多个值时取第一个）
+        - 从每个起点沿字典树向前走到无法继续，记下最后一个模式结尾；不需要失配指针，也不生成全部匹配再排序，
+          模式串较短（地名、关键词）时比 iter() + 排序快得多
+        """
+        goto, own = self._goto, self._own
+        root = goto[0]
+        result = []
+        i, n = 0, len(text)
+        while i < n:
+            node = root.get(text[i])
+            end = best = 0
+            j = i + 1
+            while node is not None:
+                if own[node]:
+                    end, best = j, node
+                if j >= n:
+                    break
+                node = goto[node].get(text[j])
+                j += 1
+            if end:
+                result.append((i, end, own[best][0][1]))
+                i = end
+            else:
+                i += 1
+        return result
+
+    def __len__(self) -> int:
+        return len(self._goto)
@@ -0,0 +1,90 @@
+"""
+本地节日日期表（只收录下列节日与节假日安排，不是通用的农历历法）
+- LUNAR_FESTIVALS：春节 / 端午 / 中秋在 2024–2035 年的公历日期（按年份查表）；除夕、元宵由春节推算
+- SOLAR_TERM_FESTIVALS：按节气确定的节日（清明）
+- FIXED_FESTIVALS：公历固定日期的节日
+- HOLIDAYS：国务院办公厅发布的法定节假日安排（放假区间 + 调休上班日）
+- FESTIVAL_ALIASES：节日名 -> 用户常用说法
+不做农历与公历的换算：表外的农历日期（如“农历三月初三是几号”）和未收录的年份
+无法在本地回答，返回 None，由模型 / 搜索处理
+"""
+
+# 农历节日：节日名 -> (农历日期说明, {年份: "MM-DD"})
+LUNAR_FESTIVALS = {
+    "春节": ("农历正月初一", {
+        2024: "02-10", 2025: "01-29", 2026: "02-17", 2027: "02-06", 2028: "01-26", 2029: "02-13",
+        2030: "02-03", 2031: "01-23", 2032: "02-11", 2033: "01-31", 2034: "02-19", 2035: "02-08",
+    }),
+    "端午节": ("农历五月初五", {
+        2024: "06-10", 2025: "05-31", 2026: "06-19", 2027: "06-09", 2028: "05-28", 2029: "06-16",
+        2030: "06-05", 2031: "06-24", 2032: "06-12", 2033: "06-01", 2034: "06-20", 2035: "06-10",
+    }),
+    "中秋节": ("农历八月十五", {
+        2024: "09-17", 2025: "10-06", 2026: "09-25", 2027: "09-15", 2028: "10-03", 2029: "09-22",
+        2030: "09-12", 2031: "10-01", 2032: "09-19", 2033: "09-08", 2034: "09-27", 2035: "09-16",
+    }),
+}
+
+# 由春节推算的农历节日：节日名 -> (农历日期说明, 相对春节的天数)
+LUNAR_OFFSETS = {
+    "除夕": ("农历腊月最后一天", -1),
+    "元宵节": ("农历正月十五", 14),
+}
+
+SOLAR_TERM_FESTIVALS = {
+    "清明节": ("清明节气", {
+        2024: "04-04", 2025: "04-04", 2026: "04-05", 2027: "04-05", 2028: "04-04", 2029: "04-04",
+        2030: "04-05", 2031: "04-05", 2032: "04-04", 2033: "04-04", 2034: "04-05", 2035: "04-05",
+    }),
+}
+
+FIXED_FESTIVALS = {
+    "元旦": "01-01",
+    "情人节": "02-14",
+    "妇女节": "03-08",
+    "劳动节": "05-01",
+    "儿童节": "06-01",
+    "教师节": "09-10",
+    "国庆节": "10-01",
+    "圣诞节": "12-25",
+}
+
+# 法定节假日：年份 -> [(节日名, 放假开始, 放假结束, 调休上班日)]
+# 同一段假期合并多个节日时（2025 年国庆、中秋）节日名写成元组
+HOLIDAYS = {
+    2025: [
+        ("元旦", "01-01", "01-01", ()),
+        ("春节", "01-28", "02-04", ("01-26", "02-08")),
+        ("清明节", "04-04", "04-06", ()),
+        ("劳动节", "05-01", "05-05", ("04-27",)),
+        ("端午节", "05-31", "06-02", ()),
+        (("国庆节", "中秋节"), "10-01", "10-08", ("09-28", "10-11")),
+    ],
+    2026: [
+        ("元旦", "01-01", "01-03", ("01-04",)),
+        ("春节", "02-15", "02-23", ("02-14", "02-28")),
+        ("清明节", "04-04", "04-06", ()),
+        ("劳动节", "05-01", "05-05", ("05-09",)),
+        ("端午节", "06-19", "06-21", ()),
+        ("中秋节", "09-25", "09-27", ()),
+        ("国庆节", "10-01", "10-07", ("09-20", "10-10")),
+    ],
+}
+
+# “十一”“五一”“六一”单独出现时歧义较大（十一点、五一路），只收录带上下文的说法
+FESTIVAL_ALIASES = {
+    "元旦": ["元旦"],
+    "除夕": ["除夕", "大年三十", "年三十"],
+    "春节": ["春节", "过年", "大年初一", "农历新年", "新春"],
+    "元宵节": ["元宵"],
+    "情人节": ["情人节"],
+    "妇女节": ["妇女节", "三八节"],
+    "清明节": ["清明"],
+    "劳动节": ["劳动节", "五一假期", "五一放假", "五一长假", "五一小长假", "五一节", "五一黄金周"],
+    "儿童节": ["儿童节", "六一节"],
+    "端午节": ["端午"],
+    "教师节": ["教师节"],
+    "中秋节": ["中秋"],
+    "国庆节": ["国庆", "十一假期", "十一放假", "十一长假", "十一黄金周"],
+    "圣诞节": ["圣诞"],
+}
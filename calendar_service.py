@@ -0,0 +1,289 @@
+"""
+本地日历服务：节日日期、法定节假日 / 调休、倒计时
+- 数据来自 calendar_data 中的节日日期表与节假日安排，不依赖搜索；不支持任意农历日期换算
+- answer(text)：识别 节日日期 / 倒计时 / 放假安排 / 某天是否上班 等问法，返回预先计算好的事实文本，
+  作为 system 信息注入，避免模型猜日期或为此调用一次付费搜索
+- is_self_contained(text)：问题除日历内容外没有其他诉求，可以跳过 search 直接回答
+"""
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+from aho_corasick import AhoCorasick
+from calendar_data import (
+    FESTIVAL_ALIASES,
+    FIXED_FESTIVALS,
+    HOLIDAYS,
+    LUNAR_FESTIVALS,
+    LUNAR_OFFSETS,
+    SOLAR_TERM_FESTIVALS,
+)
+
+WEEKDAYS = ("星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日")
+
+
+class Holiday(NamedTuple):
+    names: Tuple[str, ...]
+    start: date
+    end: date
+    workdays: Tuple[date, ...]   # 调休上班日
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+
+def _md(year: int, mmdd: str) -> date:
+    month, day = mmdd.split("-")
+    return date(year, int(month), int(day))
+
+
+def _load_holidays():
+    holidays = {}
+    for year, entries in HOLIDAYS.items():
+        holidays[year] = [
+            Holiday(
+                names=names if isinstance(names, tuple) else (names,),
+                start=_md(year, start),
+                end=_md(year, end),
+                workdays=tuple(_md(year, d) for d in workdays),
+            )
+            for names, start, end, workdays in entries
+        ]
+    return holidays
+
+
+_holidays = _load_holidays()
+# 全体公民放假的节日（除夕随春节放假）
+_STATUTORY = {name for entries in _holidays.values() for h in entries for name in h.names}
+_HOLIDAY_OF = {"除夕": "春节"}
+
+
+# ==================== 日期计算 ====================
+
+def lunar_label(name: str) -> Optional[str]:
+    if name in LUNAR_FESTIVALS:
+        return LUNAR_FESTIVALS[name][0]
+    if name in LUNAR_OFFSETS:
+        return LUNAR_OFFSETS[name][0]
+    return None
+
+
+def festival_date(name: str, year: int) -> Optional[date]:
+    """节日在某年的公历日期；农历节日超出节日日期表的年份范围时返回 None"""
+    if name in FIXED_FESTIVALS:
+        return _md(year, FIXED_FESTIVALS[name])
+    if name in LUNAR_OFFSETS:
+        # 除夕在春节前一天：year 年的除夕对应 year 年春节；元宵同理
+        spring = festival_date("春节", year)
+        return spring + timedelta(days=LUNAR_OFFSETS[name][1]) if spring else None
+    for table in (LUNAR_FESTIVALS, SOLAR_TERM_FESTIVALS):
+        if name in table:
+            mmdd = table[name][1].get(year)
+            return _md(year, mmdd) if mmdd else None
+    return None
+
+
+def next_festival(name: str, today: date) -> Optional[date]:
+    """今天及以后最近一次的节日日期"""
+    d = festival_date(name, today.year)
+    if d is not None and d >= today:
+        return d
+    return festival_date(name, today.year + 1)
+
+
+def holiday_of(name: str, year: int) -> Optional[Holiday]:
+    """某年某节日的放假安排；该年未收录或不是放假节日返回 None"""
+    name = _HOLIDAY_OF.get(name, name)
+    for h in _holidays.get(year, ()):
+        if name in h.names:
+            return h
+    return None
+
+
+def day_status(d: date) -> Tuple[bool, str]:
+    """返回 (是否上班, 说明)"""
+    for h in _holidays.get(d.year, ()):
+        if h.start <= d <= h.end:
+            return False, f"{'、'.join(h.names)}假期，放假休息"
+        if d in h.workdays:
+            return True, f"{'、'.join(h.names)}调休上班日，需要上班"
+    if d.weekday() >= 5:
+        reason = "周末，休息"
+    else:
+        reason = "工作日，正常上班"
+    if d.year not in _holidays:
+        reason += f"（{d.year}年放假安排本地未收录，仅按星期判断）"
+    return d.weekday() < 5, reason
+
+
+# ==================== 问法识别 ====================
+
+def _build_aliases() -> AhoCorasick:
+    return AhoCorasick(
+        (alias, name) for name, aliases in FESTIVAL_ALIASES.items() for alias in aliases
+    )
+
+
+_festival_automaton = _build_aliases()
+
+_YEAR_RE = re.compile(r"(\d{4})年(?!\d{1,2}月)|今年|明年|去年")
+_MONTH_DAY_RE = re.compile(r"(?:(\d{4})年)?(\d{1,2})月(\d{1,2})[日号]")
+_REL_DAY_RE = re.compile(r"大后天|后天|明天|明日|今天|今日")
+_REL_DAYS = {"今天": 0, "今日": 0, "明天": 1, "明日": 1, "后天": 2, "大后天": 3}
+_WEEKDAY_RE = re.compile(r"(这|本|下)?(?:周|星期|礼拜)([一二三四五六日天])")
+_WEEKDAY_INDEX = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+
+# 放假安排
+_HOLIDAY_RE = re.compile(r"放假安排|假期安排|放假|放几天|休几天|休息几天|假期|调休|补班|连休|上班")
+# 日期 / 倒计时
+_ASK_RE = re.compile(
+    r"(还有|还剩|剩|差)(多少|几)天|多少天|几天|多久|倒计时|哪天|哪一天|几号|几月几[号日]?|"
+    r"什么时候|啥时候|日期|星期几|周几|礼拜几"
+)
+# 某天是否上班
+_WORK_RE = re.compile(r"上班|上学|上课|工作日|补班|调休|休息|放假")
+_COUNTDOWN_RE = re.compile(r"(还有|还剩|剩|差)(多少|几)天|多少天|多久|倒计时")
+_YEAR_LEFT_RE = re.compile(r"今年(还有|还剩|剩)(多少|几)天")
+# 问句中的虚词，判断问题是否只问日历
+_FILLER_RE = re.compile(
+    r"请问|告诉我|你知道|查一下|查询|帮我|一下|距离|离|到|还|是|要|需要|会|的|了|吗|呢|啊|呀|吧|嘛|不|我们|我|咱|"
+    r"[\s\W_]"
+)
+
+
+def _festivals_in(text: str) -> List[Tuple[str, Tuple[int, int]]]:
+    found, seen = [], set()
+    for start, end, name in _festival_automaton.longest(text):
+        if name not in seen:
+            seen.add(name)
+            found.append((name, (start, end)))
+    return found
+
+
+def _explicit_year(text: str, today: date) -> Optional[int]:
+    m = _YEAR_RE.search(text)
+    if m is None:
+        return None
+    if m.group(1):
+        return int(m.group(1))
+    return today.year + {"今年": 0, "明年": 1, "去年": -1}[m.group(0)]
+
+
+def _dates_in(text: str, today: date) -> List[date]:
+    days = []
+    for m in _MONTH_DAY_RE.finditer(text):
+        try:
+            days.append(date(int(m.group(1) or today.year), int(m.group(2)), int(m.group(3))))
+        except ValueError:
+            continue
+    for m in _REL_DAY_RE.finditer(text):
+        days.append(today + timedelta(days=_REL_DAYS[m.group(0)]))
+    for m in _WEEKDAY_RE.finditer(text):
+        d = today + timedelta(days=_WEEKDAY_INDEX[m.group(2)] - today.weekday())
+        if m.group(1) == "下" or (m.group(1) is None and d < today):
+            d += timedelta(days=7)
+        days.append(d)
+    return list(dict.fromkeys(days))
+
+
+# ==================== 文本 ====================
+
+def _fmt(d: date) -> str:
+    return f"{d.isoformat()}（{WEEKDAYS[d.weekday()]}）"
+
+
+def _md_fmt(d: date) -> str:
+    return f"{d.month}月{d.day}日"
+
+
+def _festival_line(name: str, d: date, today: date) -> str:
+    delta = (d - today).days
+    if delta > 0:
+        when = f"距今天还有 {delta} 天"
+    elif delta == 0:
+        when = "就是今天"
+    else:
+        when = f"已过去 {-delta} 天"
+    label = lunar_label(name)
+    return f"- {d.year}年{name}：{_fmt(d)}{'，' + label if label else ''}，{when}"
+
+
+def _holiday_line(h: Holiday) -> str:
+    names = "、".join(h.names)
+    if h.days == 1:
+        line = f"- {h.start.year}年{names}放假安排：{_md_fmt(h.start)}放假，共 1 天"
+    else:
+        line = f"- {h.start.year}年{names}放假安排：{_md_fmt(h.start)}至{_md_fmt(h.end)}放假调休，共 {h.days} 天"
+    if h.workdays:
+        line += "；" + "、".join(f"{_md_fmt(d)}（{WEEKDAYS[d.weekday()]}）" for d in h.workdays) + "上班"
+    else:
+        line += "；不调休"
+    return line
+
+
+@lru_cache(maxsize=1024)
+def _answer(text: str, today: date) -> Optional[str]:
+    lines: List[str] = []
+    festivals = _festivals_in(text)
+    holiday_intent = bool(_HOLIDAY_RE.search(text))
+
+    if festivals and (holiday_intent or _ASK_RE.search(text)):
+        year = _explicit_year(text, today)
+        for name, _ in festivals[:3]:
+            d = festival_date(name, year) if year else next_festival(name, today)
+            if d is None:
+                # 超出本地节日日期表范围，交给模型 / 搜索
+                return None
+            lines.append(_festival_line(name, d, today))
+            if not holiday_intent:
+                continue
+            if _HOLIDAY_OF.get(name, name) not in _STATUTORY:
+                lines.append(f"- {name}不在全体公民放假的法定节假日之列")
+                continue
+            h = holiday_of(name, d.year)
+            if h is None:
+                # 放假安排尚未公布或本地未收录，需要搜索
+                return None
+            lines.append(_holiday_line(h))
+    elif _YEAR_LEFT_RE.search(text):
+        left = (date(today.year, 12, 31) - today).days
+        lines.append(f"- {today.year}年还剩 {left} 天（不含今天）")
+    else:
+        days = _dates_in(text, today)
+        if days and _WORK_RE.search(text):
+            for d in days[:3]:
+                _, reason = day_status(d)
+                lines.append(f"- {_fmt(d)}：{reason}")
+        elif days and _COUNTDOWN_RE.search(text):
+            for d in days[:3]:
+                lines.append(f"- 距离 {_fmt(d)} 还有 {(d - today).days} 天")
+
+    if not lines:
+        return None
+    return (
+        f"【本地日历】以下内容由服务器本地日历表计算（今天是 {_fmt(today)}），准确可靠，"
+        "可直接作为事实回答，无需调用 search：\n" + "\n".join(lines)
+    )
+
+
+def answer(text: str, today: Optional[date] = None) -> Optional[str]:
+    """日期 / 节日 / 倒计时 / 放假安排问法返回事实文本，其他问题返回 None"""
+    if not text:
+        return None
+    return _answer(text, today or date.today())
+
+
+def is_self_contained(text: str) -> bool:
+    """
+    问题是否只问日历：去掉节日名、日期、问法词和虚词后几乎不剩内容
+    （“国庆放假几天” 是；“国庆假期去哪玩” 不是，后者仍需走原流程）
+    """
+    rest = text
+    for _, (start, end) in reversed(_festivals_in(text)):
+        rest = rest[:start] + " " + rest[end:]
+    for pattern in (_MONTH_DAY_RE, _YEAR_RE, _REL_DAY_RE, _WEEKDAY_RE, _HOLIDAY_RE, _ASK_RE,
+                    _WORK_RE, _YEAR_LEFT_RE, _FILLER_RE):
+        rest = pattern.sub("", rest)
+    return len(rest) <= 2
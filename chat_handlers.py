@@ -3,22 +3,167 @@
 """
 import json
 import uuid
+import asyncio
 import logging
-from typing import AsyncGenerator, List, Dict, Any, Optional
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Callable, List, Dict, Any, Optional
 
-from openai import AsyncOpenAI
+import httpx
+from openai import APITimeoutError
 
-from config import client, LOCAL_CFG
+from config import (
+    LOCAL_CFG, TOOL_CALL_CONCURRENCY, TOOL_CALL_TIMEOUT,
+    TOOL_STREAM_EARLY_START, TOOL_STREAM_IDLE_CHUNKS, SPECULATIVE_SEARCH_ENABLED,
+    ROUTER_ENABLED, CALENDAR_ENABLED, WEATHER_CACHE_ENABLED,
+)
 from schema import (
-    FALLBACK_SYSTEM, LANGUAGE_MATCH_SYSTEM, TOOLS_DESC, Message, TOOL_RULE_SYSTEM, DATA_ACCURACY_SYSTEM,
-    get_datatime_now
+    TOOLS_DESC, Message, TOOL_RULE_SYSTEM, STATIC_RULES_PREFIX, DEADLINE_NOTE_SYSTEM,
+    SEARCH_SKIPPED_RESULT, get_datatime_now
 )
-from utils import split_messages_by_role, truncate_by_rounds_and_chars
+from utils import build_prompt_messages
 from query_utils import build_search_query, extract_province_city, optimize_search_query, is_weather_query
-from search import search_baidu
+from search_service import run_search
+from tool_stream import ToolCallAssembler
+from weather_cache import weather_cache
+from speculation import Speculation
+from request_budget import RequestBudget
+from llm_pool import pool
+import calendar_service
+import metrics
+import search_router
 
 logger = logging.getLogger(__name__)
 
+DEADLINE_MESSAGE = "请求超时（超出时间预算）"
+
+
+def _failure(e: BaseException) -> str:
+    """阶段失败的结果分类"""
+    if isinstance(e, (APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError)):
+        return "timeout"
+    return "error"
+
+
+async def _execute_tool_call(
+    tc: Dict[str, Any],
+    build_query: Callable[[str], str],
+    speculation: Optional[Speculation] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    执行单个工具调用，返回 {"success", "result"}
+    - build_query: 搜索 query 的构建函数（非流式 build_search_query / 流式 optimize_search_query）
+    - speculation: 本请求的投机搜索，query 足够相似时直接复用其结果
+    - deadline: 工具调用截止时间（time.monotonic() 时间点），限制搜索限流排队
+    """
+    name = tc["function"]["name"]
+    try:
+        args = json.loads(tc["function"]["arguments"] or "{}")
+        if name == "search":
+            raw_query = args.get("query", "")
+            # 纯日历问题（节日日期、放假安排、倒计时）由本地日历回答，不走搜索
+            if CALENDAR_ENABLED and calendar_service.is_self_contained(raw_query):
+                fact = calendar_service.answer(raw_query)
+                if fact is not None:
+                    metrics.incr("calendar_tool_short_circuits")
+                    return {"success": True, "result": fact}
+            final_query = build_query(raw_query)
+            search_res = None
+            if speculation is not None:
+                search_res = await speculation.take(final_query)
+            if search_res is None:
+                search_res = await run_search(final_query, deadline)
+            return {
+                "success": search_res.get("code") == 200,
+                "result": search_res.get("msg", ""),
+            }
+        return {"success": False, "result": f"Unknown tool: {name}"}
+
+    except Exception as e:
+        return {"success": False, "result": f"Tool failed: {str(e)}"}
+
+
+def _start_tool_call(
+    tc: Dict[str, Any],
+    build_query: Callable[[str], str],
+    sem: asyncio.Semaphore,
+    budget: RequestBudget,
+    speculation: Optional[Speculation] = None,
+) -> "asyncio.Task[Dict[str, Any]]":
+    """
+    以 task 形式启动单个工具调用（受并发上限和超时约束）
+    - 超时取 TOOL_CALL_TIMEOUT 与请求剩余预算（扣除回答预留时间）中较小者
+    - 剩余预算不够 搜索 + 回答时跳过，告诉模型带提示回答
+    """
+    async def run_one() -> Dict[str, Any]:
+        async with sem:
+            started = time.monotonic()
+            if not budget.can_search():
+                budget.record("search", "skipped", started)
+                return {"success": False, "result": SEARCH_SKIPPED_RESULT}
+            deadline = min(started + TOOL_CALL_TIMEOUT, budget.search_deadline())
+            try:
+                outcome = await asyncio.wait_for(
+                    _execute_tool_call(tc, build_query, speculation, deadline), deadline - started
+                )
+            except asyncio.TimeoutError:
+                budget.record("search", "timeout", started)
+                return {"success": False, "result": "Tool timeout"}
+            except asyncio.CancelledError:
+                budget.record("search", "cancelled", started)
+                raise
+            budget.record("search", "ok" if outcome["success"] else "error", started)
+            return outcome
+
+    return asyncio.create_task(run_one())
+
+
+async def _run_tool_calls(
+    tool_calls: List[Dict[str, Any]],
+    build_query: Callable[[str], str],
+    budget: RequestBudget,
+    speculation: Optional[Speculation] = None,
+) -> List[Dict[str, Any]]:
+    """
+    并发执行同一轮的所有工具调用
+    - 单请求并发上限 TOOL_CALL_CONCURRENCY，单个调用超时 TOOL_CALL_TIMEOUT（不超过剩余预算）
+    - 返回结果与 tool_calls 顺序一致，单个失败不影响其他调用
+    """
+    sem = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+    return await asyncio.gather(*[
+        _start_tool_call(tc, build_query, sem, budget, speculation) for tc in tool_calls
+    ])
+
+
+def _tool_message(tc: Dict[str, Any], outcome: Dict[str, Any]) -> Dict[str, Any]:
+    """把工具结果（含"失败语义"）包装成 tool 消息"""
+    return {
+        "role": "tool",
+        "tool_call_id": tc["id"],
+        "content": json.dumps(
+            {"success": outcome["success"], "result": outcome["result"]},
+            ensure_ascii=False
+        ),
+    }
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            return msg.get("content") or ""
+    return ""
+
+
+def _calendar_fact(messages: List[Dict[str, Any]]) -> Optional[str]:
+    """最后一条用户消息是日期 / 节假日 / 倒计时问题时，返回本地日历计算的事实"""
+    if not CALENDAR_ENABLED:
+        return None
+    fact = calendar_service.answer(_last_user_text(messages))
+    if fact is not None:
+        metrics.incr("calendar_facts")
+    return fact
+
 
 async def chat_completion(
     messages: List[Message],
@@ -27,30 +172,60 @@ async def chat_completion(
     top_p: float = 0.95,
     max_tokens: int = 3000,
     location: Optional[str] = None,
+    budget: Optional[RequestBudget] = None,
 ) -> str:
     """
     非流式聊天补全
+    - budget: 请求时间预算，未传入时使用服务端默认值
     """
+    budget = budget or RequestBudget()
     openai_messages = []
     for msg in messages:
         d = msg.model_dump(exclude_none=True)
         d["content"] = d.get("content") or ""
         openai_messages.append(d)
 
+    if WEATHER_CACHE_ENABLED:
+        weather_cache.note_location(location)
+
     openai_messages.append(get_datatime_now())
     openai_messages.append(TOOL_RULE_SYSTEM)
+    calendar_fact = _calendar_fact(openai_messages)
+    if calendar_fact is not None:
+        openai_messages.append({"role": "system", "content": calendar_fact})
+
+    # 投机搜索：与第一轮同时发起
+    speculation = Speculation.start(openai_messages) if SPECULATIVE_SEARCH_ENABLED else None
+    try:
+        return await _chat_completion_rounds(
+            openai_messages, temperature, top_p, max_tokens, speculation, budget
+        )
+    finally:
+        if speculation is not None:
+            speculation.finish()
+        logger.info("request budget: %s", budget.summary())
+
+
+async def _chat_completion_rounds(
+    openai_messages: List[Dict[str, Any]],
+    temperature: float,
+    top_p: float,
+    max_tokens: int,
+    speculation: Optional[Speculation],
+    budget: RequestBudget,
+) -> str:
+    """非流式：第一轮 →（工具）→ 第二轮"""
+    # ========== 剩余预算不够 搜索 + 回答：不带工具，带提示直接回答 ==========
+    if not budget.can_search():
+        budget.record("search", "skipped", time.monotonic())
+        openai_messages.append(DEADLINE_NOTE_SYSTEM)
+        resp = await _completion("first", budget, openai_messages, temperature, top_p, max_tokens)
+        return resp.choices[0].message.content or ""
 
     # ========== 第一轮 ==========
-    first_resp = await client.chat.completions.create(
-        model=LOCAL_CFG["model"],
-        messages=openai_messages,
-        tools=TOOLS_DESC,
-        temperature=temperature,
-        top_p=top_p,
-        max_tokens=max_tokens,
-        stream=False,
-        extra_body={"chat_template_kwargs": {"enable_thinking": False}},
-    ) # type: ignore
+    first_resp = await _completion(
+        "first", budget, openai_messages, temperature, top_p, max_tokens, tools=TOOLS_DESC
+    )
 
     assistant_msg = first_resp.choices[0].message
 
@@ -75,115 +250,165 @@ async def chat_completion(
         ]
     })
 
-    # ========== 执行工具（安全） ==========
-    for tc in assistant_msg.tool_calls:
-        tool_result = ""
-        success = True
-
-        try:
-            args = json.loads(tc.function.arguments or "{}")
-            if tc.function.name == "search":
-                raw_query = args.get("query", "")
-                final_query = build_search_query(raw_query)
-                search_res = search_baidu(final_query)
-                tool_result = search_res.get("msg", "")
-                if search_res.get("code") != 200:
-                    success = False
-            else:
-                success = False
-                tool_result = f"Unknown tool: {tc.function.name}"
-
-        except Exception as e:
-            success = False
-            tool_result = f"Tool execution failed: {str(e)}"
-
+    # ========== 执行工具（并发、安全） ==========
+    tool_calls = openai_messages[-1]["tool_calls"]
+    outcomes = await _run_tool_calls(tool_calls, build_search_query, budget, speculation)
+    for tc, outcome in zip(tool_calls, outcomes):
         # 把"失败语义"明确告诉模型
-        openai_messages.append({
-            "role": "tool",
-            "tool_call_id": tc.id,
-            "content": json.dumps({
-                "success": success,
-                "result": tool_result
-            }, ensure_ascii=False)
-        })
+        openai_messages.append(_tool_message(tc, outcome))
 
     # ========== 第二轮 ==========
-    second_resp = await client.chat.completions.create(
-        model=LOCAL_CFG["model"],
-        messages=openai_messages,
-        temperature=temperature,
-        top_p=top_p,
-        max_tokens=max_tokens,
-        stream=False,
-        extra_body={"chat_template_kwargs": {"enable_thinking": False}},
-    )
+    second_resp = await _completion("second", budget, openai_messages, temperature, top_p, max_tokens)
 
     return second_resp.choices[0].message.content or "抱歉，我暂时无法给出可靠回答。"
 
 
+async def _completion(
+    stage: str,
+    budget: RequestBudget,
+    openai_messages: List[Dict[str, Any]],
+    temperature: float,
+    top_p: float,
+    max_tokens: int,
+    **kwargs: Any,
+) -> Any:
+    """非流式请求：以剩余预算为超时，按剩余时间截短 max_tokens，记录阶段结果"""
+    started = time.monotonic()
+    try:
+        resp = await pool.create(
+            model=LOCAL_CFG["model"],
+            messages=openai_messages,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=budget.cap_tokens(max_tokens),
+            stream=False,
+            timeout=budget.remaining(),
+            extra_body={"chat_template_kwargs": {"enable_thinking": False}},
+            **kwargs,
+        ) # type: ignore
+    except Exception as e:
+        budget.record(stage, _failure(e), started)
+        raise
+    budget.record(stage, "ok", started)
+    return resp
+
+
 async def chat_completion_stream(
     messages: List[Message],
     temperature: float = 0.3,
     top_p: float = 0.95,
     max_tokens: int = 3000,
     location: Optional[str] = None,
+    budget: Optional[RequestBudget] = None,
 ) -> AsyncGenerator[Dict[str, Any], None]:
     """
     流式聊天补全
+    - budget: 请求时间预算，未传入时使用服务端默认值
     """
+    budget = budget or RequestBudget()
     # ---------- 1. 消息转换和优化 ----------
-    openai_messages = []
+    client_messages = []
     for msg in messages:
         d = msg.model_dump(exclude_none=True)
         d["content"] = d.get("content") or ""
-        openai_messages.append(d)
-    
+        client_messages.append(d)
+
+    logger.info(f"openai_messages {client_messages}")
+
+    # 易变信息（时间精确到分钟、位置提示）放在 prompt 尽量靠后的位置
+    volatile_contents = [get_datatime_now(granularity="minute")["content"]]
+
+    # 统计常见用户城市，供天气缓存预取
+    if WEATHER_CACHE_ENABLED:
+        weather_cache.note_location(location)
+
+    # 日期 / 节假日 / 倒计时问题：注入本地日历计算结果
+    calendar_fact = _calendar_fact(client_messages)
+    if calendar_fact is not None:
+        volatile_contents.append(calendar_fact)
 
-    
-    logger.info(f"openai_messages {openai_messages}")
-    openai_messages.append(LANGUAGE_MATCH_SYSTEM)
-    openai_messages.append(FALLBACK_SYSTEM)
-    openai_messages.append(DATA_ACCURACY_SYSTEM)
-    openai_messages.append(TOOL_RULE_SYSTEM)
-    openai_messages.append(get_datatime_now())
-    
-    
     # 在第一轮构建query时优化问题：如果最后一条用户消息涉及天气且有location，添加提示
-    if location and openai_messages:
+    location_city = None
+    if location and client_messages:
         last_user_msg = None
-        for msg in reversed(openai_messages):
+        for msg in reversed(client_messages):
             if msg.get("role") == "user":
                 last_user_msg = msg
                 break
         location_city = extract_province_city(location)
         if last_user_msg and is_weather_query(last_user_msg.get("content", "")):
             # 检查用户消息中是否已经包含location
-            location_hint = {
-                "role": "system",
-                "content": f"【用户所在地信息】用户当前所在位置：{location_city}。\n"
-                            "当查询天气相关问题时，如果用户问题中没有明确指定地点，\n"
-                            "请在search工具的query参数中包含此位置信息中的城市名称（注意忽略街道信息）。\n"
-            }
-            openai_messages.append(location_hint)
-
-    
-    system_msg, history = split_messages_by_role(openai_messages)
-
-    # ---------- 截断历史 ----------
-    history = truncate_by_rounds_and_chars(
-        history,
+            volatile_contents.append(
+                f"【用户所在地信息】用户当前所在位置：{location_city}。\n"
+                "当查询天气相关问题时，如果用户问题中没有明确指定地点，\n"
+                "请在search工具的query参数中包含此位置信息中的城市名称（注意忽略街道信息）。\n"
+            )
+
+    # ---------- 组装 prompt（静态规则前缀 → 人设 → 历史 → 易变信息 → 最后一条 user） ----------
+    openai_messages = build_prompt_messages(
+        client_messages,
+        STATIC_RULES_PREFIX,
+        volatile_contents,
         max_rounds=5,
         max_chars=8000,
     )
 
-    openai_messages = [
-        system_msg,
-        *history
-    ]
-
+    speculation = None
+    if not budget.can_search():
+        # 剩余预算不够 搜索 + 回答：不带工具，带提示直接回答
+        budget.record("search", "skipped", time.monotonic())
+        openai_messages.append(DEADLINE_NOTE_SYSTEM)
+        rounds = _plain_stream(openai_messages, temperature, top_p, max_tokens, "first", budget)
+    elif calendar_fact is not None and calendar_service.is_self_contained(_last_user_text(client_messages)):
+        # 只问日历的问题：事实已注入，直接回答（不带工具）
+        metrics.incr("calendar_short_circuits")
+        rounds = _plain_stream(openai_messages, temperature, top_p, max_tokens, "first", budget)
+    else:
+        # 本地路由：置信度高时跳过第一轮
+        decision = search_router.route(openai_messages, location_city) if ROUTER_ENABLED else None
+        if decision is not None and decision.action == "answer":
+            rounds = _plain_stream(openai_messages, temperature, top_p, max_tokens, "first", budget)
+        elif decision is not None and decision.action == "search":
+            rounds = _routed_search_stream(
+                openai_messages, decision.query, temperature, top_p, max_tokens, budget
+            )
+        else:
+            # 投机搜索：与第一轮同时发起
+            speculation = Speculation.start(openai_messages, location_city) if SPECULATIVE_SEARCH_ENABLED else None
+            rounds = _chat_completion_stream_rounds(
+                openai_messages, temperature, top_p, max_tokens, speculation, budget
+            )
+
+    # 客户端断开时生成器被关闭（GeneratorExit）或 task 被取消（CancelledError）：
+    # 逐层关闭内部生成器，由它们关闭上游流、取消工具调用
+    try:
+        async with aclosing(rounds):
+            async for item in rounds:
+                yield item
+    except (GeneratorExit, asyncio.CancelledError):
+        if speculation is not None:
+            speculation.cancel()
+        raise
+    finally:
+        if speculation is not None:
+            speculation.finish()
+        logger.info("request budget: %s", budget.summary())
+
+
+async def _chat_completion_stream_rounds(
+    openai_messages: List[Dict[str, Any]],
+    temperature: float,
+    top_p: float,
+    max_tokens: int,
+    speculation: Optional[Speculation],
+    budget: RequestBudget,
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """流式：第一轮 →（工具）→ 第二轮"""
     # ---------- 2. 第一轮（流式） ----------
+    started = time.monotonic()
+    max_tokens = budget.cap_tokens(max_tokens)
     try:
-        first_resp = await client.chat.completions.create(
+        first_resp = await pool.create(
             model=LOCAL_CFG["model"],
             messages=openai_messages,
             tools=TOOLS_DESC,
@@ -191,10 +416,12 @@ async def chat_completion_stream(
             top_p=top_p,
             max_tokens=max_tokens,
             stream=True,
+            timeout=budget.remaining(),
             extra_body={"chat_template_kwargs": {"enable_thinking": False}},
         ) # type: ignore
     except Exception as e:
         # 创建请求就失败
+        budget.record("first", _failure(e), started)
         yield {
             "type": "error",
             "stage": "create_first_completion",
@@ -203,12 +430,32 @@ async def chat_completion_stream(
         return
 
     assistant_content = ""
-    tool_call_buffers: Dict[int, Dict[str, Any]] = {}
+    assembler = ToolCallAssembler()
+    sem = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+    # 参数闭合即提前启动的工具调用：index -> task
+    tool_tasks: Dict[int, asyncio.Task] = {}
+    idle_chunks = 0
+    received = 0
+    finished = False
+
+    def start_tools(indices: List[int]) -> None:
+        for idx in indices:
+            tool_tasks[idx] = _start_tool_call(
+                assembler.buffers[idx], optimize_search_query, sem, budget, speculation
+            )
 
     try:
         async for chunk in first_resp:
+            received += 1
+            if budget.expired():
+                # 超出时间预算：关闭上游流，不再继续
+                _cancel_pending(tool_tasks.values())
+                await _abort_deadline(first_resp, "first", budget, started)
+                yield {"type": "error", "stage": "deadline", "message": DEADLINE_MESSAGE}
+                return
             if not chunk.choices:
                 continue
+            finished = finished or bool(chunk.choices[0].finish_reason)
 
             delta = chunk.choices[0].delta
 
@@ -216,37 +463,52 @@ async def chat_completion_stream(
             if delta.content:
                 assistant_content += delta.content
 
-            # ---- 工具调用（增量拼接）----
+            # ---- 工具调用（增量拼接，参数闭合即启动）----
             if delta.tool_calls:
-                for tc in delta.tool_calls:
-                    idx = tc.index
-
-                    if idx not in tool_call_buffers:
-                        tool_call_buffers[idx] = {
-                            "id": tc.id or f"call_{uuid.uuid4()}",
-                            "type": "function",
-                            "function": {"name": "", "arguments": ""},
-                        }
-
-                    if tc.function and tc.function.name:
-                        tool_call_buffers[idx]["function"]["name"] = tc.function.name
-
-                    if tc.function and tc.function.arguments:
-                        tool_call_buffers[idx]["function"]["arguments"] += tc.function.arguments
+                idle_chunks = 0
+                if TOOL_STREAM_EARLY_START:
+                    start_tools(assembler.feed(delta.tool_calls))
+                else:
+                    assembler.feed(delta.tool_calls)
+            elif (delta.content or "").strip():
+                # 工具调用之后模型仍在输出文本：重新计数
+                idle_chunks = 0
+            elif assembler.all_complete:
+                idle_chunks += 1
 
             # 原样把模型 chunk 透传给前端
             yield chunk.model_dump()
 
+            # 工具调用都已完成，模型之后没有有效输出：提前关闭第一轮，释放 vLLM 资源
+            if (
+                TOOL_STREAM_EARLY_START
+                and idle_chunks >= TOOL_STREAM_IDLE_CHUNKS
+                and not chunk.choices[0].finish_reason
+            ):
+                logger.info("first stream closed early after tool calls")
+                await first_resp.close()
+                break
+
+    except (GeneratorExit, asyncio.CancelledError):
+        # 客户端断开：已提前启动的工具调用一并取消
+        _cancel_pending(tool_tasks.values())
+        budget.record("first", "cancelled", started)
+        if not finished:
+            await _abort_stream(first_resp, received, max_tokens, "first")
+        raise
     except Exception as e:
+        _cancel_pending(tool_tasks.values())
+        budget.record("first", _failure(e), started)
         yield {
             "type": "error",
             "stage": "first_stream",
             "message": str(e),
         }
         return
+    budget.record("first", "ok", started)
 
     # ---------- 3. 第一轮结束：是否需要工具 ----------
-    if not tool_call_buffers:
+    if not assembler:
         # 没有 tool，第一轮已经是最终答案
         return
 
@@ -254,92 +516,184 @@ async def chat_completion_stream(
     assistant_msg = {
         "role": "assistant",
         "content": assistant_content,
-        "tool_calls": [
-            tool_call_buffers[i] for i in sorted(tool_call_buffers.keys())
-        ],
+        "tool_calls": assembler.tool_calls(),
     }
     openai_messages.append(assistant_msg)
 
-    # ---------- 5. 执行工具（非流式，但安全） ----------
-    for tc in assistant_msg["tool_calls"]:
-        success = True
-        result = ""
+    # ---------- 5. 执行工具（并发，按原顺序回填） ----------
+    # 流结束时仍未启动的工具调用在这里补启动
+    start_tools(assembler.finish())
+    async with aclosing(_collect_tool_results(
+        openai_messages,
+        assistant_msg["tool_calls"],
+        [tool_tasks[idx] for idx in sorted(assembler.buffers)],
+    )) as results:
+        async for item in results:
+            yield item
 
-        try:
-            # 参数解析
-            try:
-                args = json.loads(tc["function"]["arguments"] or "{}")
-            except json.JSONDecodeError:
-                args = {}
-
-            # 调用 search
-            if tc["function"]["name"] == "search":
-                raw_query = args.get("query", "")
-                # 优化查询：如果是天气查询且没有location，添加location
-                final_query = optimize_search_query(raw_query)
-
-                search_res = search_baidu(final_query)
-
-                result = search_res.get("msg", "")
-                if search_res.get("code") != 200:
-                    success = False
-                    # 把错误以 stream 形式返回给前端
-                    yield {
-                        "type": "tool_error",
-                        "tool": "search",
-                        "message": result,
-                    }
-            else:
-                success = False
-                result = f"Unknown tool: {tc['function']['name']}"
-
-        except Exception as e:
-            success = False
-            result = f"Tool failed: {str(e)}"
+    # ---------- 6. 第二轮（流式） ----------
+    async with aclosing(_plain_stream(openai_messages, temperature, top_p, max_tokens, "second", budget)) as second:
+        async for item in second:
+            yield item
 
+
+def _cancel_pending(tasks) -> None:
+    """取消仍在执行的工具调用（gather 被取消时子任务已被取消，这里只计数）"""
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            continue
+        metrics.incr("tool_calls_cancelled")
+
+
+async def _abort_stream(resp: Any, received: int, max_tokens: int, stage: str) -> None:
+    """
+    客户端已断开：关闭上游流，vLLM 随连接关闭中止该请求，释放 decode 槽位
+    - 模型可能远早于 max_tokens 结束，max_tokens 减去已收到的 chunk 数只是省下 token 数的上限，
+      按上限单独记录，同时记录中止前已收到的 chunk 数
+    - 关闭操作 shield 起来，所在 task 正被取消时也能完成
+    """
+    metrics.incr("client_disconnect_aborts")
+    metrics.incr("decode_chunks_before_abort", received)
+    metrics.incr("decode_tokens_avoided_upper_bound", max(0, max_tokens - received))
+    logger.info("client disconnected, aborting %s stream after %s chunks", stage, received)
+    try:
+        await asyncio.shield(resp.close())
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.warning("close %s stream error: %s", stage, e)
+
+
+async def _abort_deadline(resp: Any, stage: str, budget: RequestBudget, started: float) -> None:
+    """超出时间预算：关闭上游流，记录阶段结果"""
+    budget.record(stage, "deadline", started)
+    logger.info("request deadline exceeded during %s stream", stage)
+    try:
+        await resp.close()
+    except Exception as e:
+        logger.warning("close %s stream error: %s", stage, e)
+
+
+async def _routed_search_stream(
+    openai_messages: List[Dict[str, Any]],
+    query: str,
+    temperature: float,
+    top_p: float,
+    max_tokens: int,
+    budget: RequestBudget,
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """路由判定需要搜索：跳过第一轮，直接 搜索 + 第二轮"""
+    tc = {
+        "id": f"call_{uuid.uuid4()}",
+        "type": "function",
+        "function": {
+            "name": "search",
+            "arguments": json.dumps({"query": query}, ensure_ascii=False),
+        },
+    }
+    openai_messages.append({"role": "assistant", "content": "", "tool_calls": [tc]})
+
+    sem = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+    async with aclosing(_collect_tool_results(
+        openai_messages, [tc], [_start_tool_call(tc, optimize_search_query, sem, budget)]
+    )) as results:
+        async for item in results:
+            yield item
+
+    async with aclosing(_plain_stream(openai_messages, temperature, top_p, max_tokens, "second", budget)) as second:
+        async for item in second:
+            yield item
+
+
+async def _collect_tool_results(
+    openai_messages: List[Dict[str, Any]],
+    tool_calls: List[Dict[str, Any]],
+    tasks: List["asyncio.Task[Dict[str, Any]]"],
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """等待工具执行结果，按原顺序回填 tool 消息"""
+    try:
+        outcomes = await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        # 客户端断开：搜索结果不再需要
+        _cancel_pending(tasks)
+        raise
+    for tc, outcome in zip(tool_calls, outcomes):
+        if not outcome["success"]:
+            # 把错误以 stream 形式返回给前端
             yield {
                 "type": "tool_error",
                 "tool": tc["function"]["name"],
-                "message": result,
+                "message": outcome["result"],
             }
 
         # 无论成功失败，都要把 tool 结果告诉模型
-        openai_messages.append({
-            "role": "tool",
-            "tool_call_id": tc["id"],
-            "content": json.dumps(
-                {"success": success, "result": result},
-                ensure_ascii=False
-            ),
-        })
+        openai_messages.append(_tool_message(tc, outcome))
 
-    # ---------- 6. 第二轮（流式） ----------
+
+async def _plain_stream(
+    openai_messages: List[Dict[str, Any]],
+    temperature: float,
+    top_p: float,
+    max_tokens: int,
+    stage: str,
+    budget: RequestBudget,
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    不带工具的流式请求，chunk 原样透传（第二轮 / 路由判定直接回答）
+    - 以剩余预算为超时，按剩余时间截短 max_tokens
+    """
+    started = time.monotonic()
+    if budget.expired():
+        budget.record(stage, "skipped", started)
+        yield {"type": "error", "stage": "deadline", "message": DEADLINE_MESSAGE}
+        return
+    max_tokens = budget.cap_tokens(max_tokens)
     try:
-        second_resp = await client.chat.completions.create(
+        resp = await pool.create(
             model=LOCAL_CFG["model"],
             messages=openai_messages,
             temperature=temperature,
             top_p=top_p,
             max_tokens=max_tokens,
             stream=True,
+            timeout=budget.remaining(),
             extra_body={"chat_template_kwargs": {"enable_thinking": False}},
         ) # type: ignore
     except Exception as e:
+        budget.record(stage, _failure(e), started)
         yield {
             "type": "error",
-            "stage": "create_second_completion",
+            "stage": f"create_{stage}_completion",
             "message": str(e),
         }
         return
 
+    received = 0
+    finished = False
     try:
-        async for chunk in second_resp:
+        async for chunk in resp:
+            received += 1
+            if budget.expired():
+                await _abort_deadline(resp, stage, budget, started)
+                yield {"type": "error", "stage": "deadline", "message": DEADLINE_MESSAGE}
+                return
+            if chunk.choices and chunk.choices[0].finish_reason:
+                finished = True
             yield chunk.model_dump()
 
+    except (GeneratorExit, asyncio.CancelledError):
+        budget.record(stage, "cancelled", started)
+        if not finished:
+            await _abort_stream(resp, received, max_tokens, stage)
+        raise
     except Exception as e:
+        budget.record(stage, _failure(e), started)
         yield {
             "type": "error",
-            "stage": "second_stream",
+            "stage": f"{stage}_stream",
             "message": str(e),
         }
         return
+    budget.record(stage, "ok", started)
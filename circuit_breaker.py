@@ -0,0 +1,122 @@
+"""
+熔断器（每个搜索服务商一个）
+- closed：正常放行，统计最近窗口内的失败率和慢调用比例
+- open：失败率或慢调用比例超过阈值后熔断，直接拒绝请求，冷却一段时间
+- half_open：冷却结束后放行少量探测请求，全部成功则恢复，任一失败则重新熔断
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, Dict
+
+from config import (
+    BREAKER_ERROR_RATE,
+    BREAKER_HALF_OPEN_PROBES,
+    BREAKER_MIN_CALLS,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_SLOW_CALL_RATE,
+    BREAKER_SLOW_CALL_SECONDS,
+    BREAKER_WINDOW,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        # 最近 BREAKER_WINDOW 次调用：(是否成功, 是否慢调用)
+        self._window: deque = deque(maxlen=BREAKER_WINDOW)
+        self._opened_at = 0.0
+        self._probes = 0           # half_open 状态下已放行的探测请求数
+        self._probe_successes = 0
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """是否放行本次请求"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < BREAKER_OPEN_SECONDS:
+                self.rejected += 1
+                return False
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._probes >= BREAKER_HALF_OPEN_PROBES:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+
+    def available(self) -> bool:
+        """不占用探测名额地判断当前是否可能放行（用于选择服务商）"""
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at >= BREAKER_OPEN_SECONDS
+        if self.state == HALF_OPEN:
+            return self._probes < BREAKER_HALF_OPEN_PROBES
+        return True
+
+    def release(self) -> None:
+        """放行的请求被取消、没有结果时调用，归还 half_open 的探测名额"""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record(self, ok: bool, latency: float) -> None:
+        """记录一次调用结果"""
+        slow = latency >= BREAKER_SLOW_CALL_SECONDS
+
+        if self.state == HALF_OPEN:
+            if not ok or slow:
+                self._trip()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= BREAKER_HALF_OPEN_PROBES:
+                self._transition(CLOSED)
+            return
+
+        if self.state == OPEN:
+            # 熔断前已发出的请求晚到的结果，不影响状态
+            return
+
+        self._window.append((ok, slow))
+        if len(self._window) < BREAKER_MIN_CALLS:
+            return
+        error_rate = sum(1 for o, _ in self._window if not o) / len(self._window)
+        slow_rate = sum(1 for _, s in self._window if s) / len(self._window)
+        if error_rate >= BREAKER_ERROR_RATE or slow_rate >= BREAKER_SLOW_CALL_RATE:
+            self._trip()
+
+    def _trip(self) -> None:
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning("circuit breaker %s: %s -> %s", self.name, self.state, state)
+        self.state = state
+        self._probes = 0
+        self._probe_successes = 0
+        if state == CLOSED:
+            self._window.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        n = len(self._window)
+        data = {
+            "state": self.state,
+            "window_calls": n,
+            "error_rate": round(sum(1 for o, _ in self._window if not o) / n, 4) if n else 0.0,
+            "slow_rate": round(sum(1 for _, s in self._window if s) / n, 4) if n else 0.0,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+        if self.state == OPEN:
+            data["retry_in"] = round(max(BREAKER_OPEN_SECONDS - (time.monotonic() - self._opened_at), 0), 1)
+        return data
@@ -5,6 +5,188 @@ BOCHA_API_KEY = "sk-"
 BAIDU_URL = "https://qianfan.baidubce.com/v2/ai_search/web_search"
 BAIDU_API_KEY = ""
 
+ZHIPU_URL = "https://open.bigmodel.cn/api/paas/v4/web_search"
+ZHIPU_API_KEY = ""
+
+# ========== 搜索连接池配置（每个搜索服务商一个常驻连接池） ==========
+# - max_connections: 最大连接数
+# - max_keepalive_connections: 最多保持的空闲长连接数
+# - keepalive_expiry: 空闲长连接保活时间（秒）
+# - http2: 服务商支持时启用 HTTP/2（需安装 h2，未安装时自动降级为 HTTP/1.1）
+# - warmup_connections: 启动预热时提前建立的连接数（HTTP/2 下请求复用同一条连接，只预热 1 条）
+SEARCH_POOL_CFG = {
+    "baidu": {
+        "base_url": "https://qianfan.baidubce.com",
+        "max_connections": 50,
+        "max_keepalive_connections": 20,
+        "keepalive_expiry": 120,
+        "http2": False,               # 百度支持 HTTP/2，开启前需安装 h2（pip install h2）
+        "warmup_connections": 4,
+    },
+    "bocha": {
+        "base_url": "https://api.bochaai.com",
+        "max_connections": 20,
+        "max_keepalive_connections": 10,
+        "keepalive_expiry": 60,
+        "http2": False,
+        "warmup_connections": 0,
+    },
+    "zhipu": {
+        "base_url": "https://open.bigmodel.cn",
+        "max_connections": 20,
+        "max_keepalive_connections": 10,
+        "keepalive_expiry": 60,
+        "http2": False,
+        "warmup_connections": 0,
+    },
+}
+
+# ========== 多服务商搜索与对冲请求 ==========
+# 主服务商超过其 p95 延迟仍未返回时，向备用服务商发起对冲请求，取先成功返回的结果
+SEARCH_PRIMARY = "baidu"
+SEARCH_SECONDARY = "bocha"       # None 表示不对冲
+HEDGE_DEFAULT_DELAY = 2.0        # 样本不足时的对冲等待时间（秒）
+HEDGE_MIN_DELAY = 0.3            # 对冲等待时间下限（秒）
+HEDGE_MAX_DELAY = 8.0            # 对冲等待时间上限（秒）
+HEDGE_MIN_SAMPLES = 20           # 至少多少个延迟样本后才使用 p95
+
+# ========== 熔断与自适应超时 ==========
+# 每个服务商一个熔断器：最近窗口内失败率或慢调用比例过高时熔断，冷却后放行少量探测请求
+BREAKER_WINDOW = 50              # 统计窗口（最近多少次调用）
+BREAKER_MIN_CALLS = 10           # 窗口内至少多少次调用才判断是否熔断
+BREAKER_ERROR_RATE = 0.5         # 失败率阈值
+BREAKER_SLOW_CALL_SECONDS = 10.0 # 超过该耗时视为慢调用（秒）
+BREAKER_SLOW_CALL_RATE = 0.8     # 慢调用比例阈值
+BREAKER_OPEN_SECONDS = 30.0      # 熔断冷却时间（秒）
+BREAKER_HALF_OPEN_PROBES = 2     # 半开状态放行的探测请求数
+# 单次搜索超时 = 最近延迟 p99 × 倍数，限制在上下限之间；样本不足时用默认值
+SEARCH_TIMEOUT_DEFAULT = 15.0
+SEARCH_TIMEOUT_MIN = 2.0
+SEARCH_TIMEOUT_MAX = 30.0
+SEARCH_TIMEOUT_MULTIPLIER = 2.0
+SEARCH_FALLBACKS = ["zhipu"]     # 主/备用服务商都熔断时依次尝试的服务商
+SEARCH_STALE_MAX_AGE = 86400     # 所有服务商不可用时，可返回过期多久以内的缓存结果（秒）
+
+# ========== 搜索服务商限流 ==========
+# 令牌桶：qps 为令牌生成速率，burst 为桶容量，max_queue 为等待队列上限；未配置的服务商不限流
+SEARCH_RATE_LIMIT = {
+    "baidu": {"qps": 5, "burst": 10, "max_queue": 50},
+    "bocha": {"qps": 5, "burst": 5, "max_queue": 20},
+    "zhipu": {"qps": 3, "burst": 5, "max_queue": 20},
+}
+SEARCH_RATE_LIMIT_MAX_WAIT = 3.0 # 调用方未给出截止时间时，最多排队多久（秒）
+
+# ========== 搜索结果格式化 ==========
+SEARCH_RESULT_TOKEN_BUDGET = 1200   # 单次搜索结果回填给模型的 token 预算
+SEARCH_DEDUP_THRESHOLD = 0.8        # 引用内容 3-gram Jaccard ≥ 该值视为近似重复
+
+# ========== 搜索结果缓存 ==========
+SEARCH_CACHE_MAX_ENTRIES = 2048
+# 按主题分类的缓存时间（秒）
+# - realtime: 天气、股价、汇率等（REALTIME_TOPICS）
+# - daily: 其他时效性主题或带时间词的问题（DATE_SENSITIVE_TOPICS / TIME_WORDS）
+# - stable: 百科、数量统计等
+SEARCH_CACHE_TTL = {
+    "realtime": 300,
+    "daily": 3600,
+    "stable": 86400,
+}
+# 过期后的宽限时间（秒）：宽限期内直接返回旧结果，同时在后台刷新
+SEARCH_CACHE_GRACE = {
+    "realtime": 120,
+    "daily": 1800,
+    "stable": 43200,
+}
+
+# ========== 热点查询提前刷新 ==========
+# 定期挑选访问最多的 top-K 查询，剩余 TTL 不足一定比例时提前刷新
+SEARCH_REFRESH_AHEAD_ENABLED = True
+SEARCH_REFRESH_TOP_K = 20
+SEARCH_REFRESH_INTERVAL = 10       # 调度周期（秒）
+SEARCH_REFRESH_AHEAD_RATIO = 0.2   # 剩余 TTL 少于该比例时刷新
+SEARCH_REFRESH_MIN_TOKENS = 2      # 服务商令牌桶至少剩余多少令牌才刷新，给用户请求留余量
+SEARCH_HOT_KEY_DECAY = 0.8         # 每个调度周期热度衰减系数
+SEARCH_HOT_KEYS_MAX = 1000         # 最多跟踪的查询数
+
+# ========== 近似重复查询缓存 ==========
+# 精确缓存未命中时，按规范化后的 2-gram Jaccard 相似度查找措辞不同、意图相同的已缓存查询
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_MAX_ENTRIES = 4096
+SEMANTIC_CACHE_BANDS = 16          # LSH 分段数（64 个哈希 / 16 段 = 每段 4 行）
+# 按主题分类的相似度阈值（1-gram + 2-gram Jaccard）
+# 同义改写通常在 0.7 以上，换一个城市 / 标的通常在 0.5 左右；
+# stable 类缓存时间最长，误命中影响最久，阈值最高
+SEMANTIC_CACHE_THRESHOLDS = {
+    "realtime": 0.65,
+    "daily": 0.7,
+    "stable": 0.75,
+}
+
+# ========== 持久化搜索缓存 ==========
+# SQLite（WAL 模式）缓存层，位于内存缓存之后，重启后仍然有效，多个 worker 进程共享
+SEARCH_DISK_CACHE_ENABLED = True
+SEARCH_DISK_CACHE_PATH = "search_cache.db"
+SEARCH_DISK_CACHE_MAX_BYTES = 200 * 1024 * 1024   # 缓存内容总大小上限（字节）
+SEARCH_DISK_CACHE_COMPACT_INTERVAL = 300          # 后台压缩周期（秒）
+
+# ========== 天气缓存 ==========
+# “某城市某一天的天气”按 (规范城市, 日期) 缓存，TTL 内不请求上游；
+# 后台定期预取请求 location 中最常见城市当天的天气（只在服务商令牌桶有余量时进行）
+WEATHER_CACHE_ENABLED = True
+WEATHER_CACHE_TTL = 1800            # 秒
+WEATHER_CACHE_MAX_ENTRIES = 2048
+WEATHER_CITIES_MAX = 500            # 最多跟踪的 location 城市数
+WEATHER_PREFETCH_ENABLED = True
+WEATHER_PREFETCH_TOP_K = 20
+WEATHER_PREFETCH_INTERVAL = 300     # 预取周期（秒）；剩余 TTL 少于 SEARCH_REFRESH_AHEAD_RATIO 时预取
+
+# ========== 工具调用 ==========
+# 同一轮 assistant 消息中的多个工具调用并发执行
+TOOL_CALL_CONCURRENCY = 4   # 单个请求内最大并发工具调用数
+TOOL_CALL_TIMEOUT = 30      # 单个工具调用超时（秒）
+# 流式第一轮中，工具调用参数闭合后立即执行，与第一轮流的剩余部分重叠
+TOOL_STREAM_EARLY_START = True
+# 工具调用全部完成后，连续多少个无有效内容的 chunk 即提前关闭第一轮流
+TOOL_STREAM_IDLE_CHUNKS = 8
+
+# ========== 请求时间预算 ==========
+# 每个请求的端到端截止时间：请求字段 timeout 或请求头 X-Request-Timeout（秒），没有时使用默认值
+# 各阶段（第一轮、搜索、第二轮）以剩余预算为超时，预算不足时跳过搜索或截短 max_tokens
+REQUEST_DEADLINE_DEFAULT = 120.0
+REQUEST_DEADLINE_MAX = 300.0
+REQUEST_DEADLINE_HEADER = "X-Request-Timeout"
+DEADLINE_MIN_SEARCH_SECONDS = 3.0        # 搜索至少需要的时间，不够则跳过搜索
+DEADLINE_ANSWER_RESERVE = 8.0            # 搜索结束后给回答预留的时间
+DEADLINE_DECODE_TOKENS_PER_SECOND = 30   # 估算的单请求解码速度，用于截短 max_tokens
+DEADLINE_MIN_MAX_TOKENS = 64             # 截短后 max_tokens 的下限
+
+# ========== 准入控制 ==========
+# /v1/chat/completions 最多同时处理 ADMISSION_MAX_INFLIGHT 个请求，超出的排队，队列满或等待超时返回 503 + Retry-After
+# CoDel 式：队列持续非空超过 ADMISSION_INTERVAL 后，排队最多等 ADMISSION_TARGET_DELAY；否则最多等 ADMISSION_MAX_WAIT
+ADMISSION_ENABLED = True
+ADMISSION_MAX_INFLIGHT = 32
+ADMISSION_MAX_QUEUE = 64
+ADMISSION_TARGET_DELAY = 0.5      # 秒
+ADMISSION_INTERVAL = 5.0          # 秒
+ADMISSION_MAX_WAIT = 10.0         # 秒
+ADMISSION_RETRY_AFTER_MAX = 30    # Retry-After 上限（秒）
+
+# ========== 投机搜索 ==========
+# 按用户问题启发式地与第一轮 LLM 同时发起搜索，模型实际 query 足够相似时复用
+SPECULATIVE_SEARCH_ENABLED = False
+SPECULATION_MATCH_THRESHOLD = 0.5   # query 相似度阈值（字符 bigram Dice 系数）
+
+# ========== 本地搜索路由 ==========
+# 在第一轮 LLM 之前判断是否需要搜索，置信度高时跳过第一轮
+ROUTER_ENABLED = False
+ROUTER_MODEL_PATH = "router_model.json"   # 线性模型权重（test/eval_router.py --train 生成），不存在时仅用规则
+ROUTER_SEARCH_THRESHOLD = 0.85            # 得分 ≥ 该值：直接搜索 + 回答
+ROUTER_ANSWER_THRESHOLD = 0.15            # 得分 ≤ 该值：直接回答（不带工具）
+
+# ========== 本地日历 ==========
+# 节日日期、法定节假日 / 调休、倒计时问题由本地日历表计算后注入；只问日历时直接回答，不调用 search
+CALENDAR_ENABLED = True
+
 # ========== LLM 配置 ==========
 LOCAL_CFG = {
     "api_key": "EMPTY",
@@ -12,9 +194,40 @@ LOCAL_CFG = {
     "model": "Qwen3-30B-A3B-Instruct-2507-AWQ",
 }
 
-from openai import AsyncOpenAI
+# ========== LLM 后端池 ==========
+# 多个 OpenAI 兼容后端（如多台 vLLM），每个后端一个 AsyncOpenAI 客户端
+LLM_BACKENDS = [
+    {"name": "vllm-0", "base_url": LOCAL_CFG["base_url"], "api_key": LOCAL_CFG["api_key"]},
+    # {"name": "vllm-1", "base_url": "http://10.0.0.2:30001/v1", "api_key": "EMPTY"},
+]
+LLM_ROUTING = "least_outstanding"   # least_outstanding / ewma_ttft
+LLM_EWMA_ALPHA = 0.3                # 首 token 延迟滑动平均的平滑系数
+# 会话粘性：同一对话固定到同一后端，保持前缀缓存命中；
+# 粘性后端的进行中请求数比最空闲后端多出超过 LLM_STICKY_MAX_EXTRA 时放弃粘性
+LLM_STICKY = True
+LLM_STICKY_MAX_EXTRA = 8
+# 健康检查：连续失败 LLM_EJECT_FAILURES 次摘除，摘除后连续探测成功 LLM_READMIT_SUCCESSES 次恢复
+LLM_HEALTH_CHECK_ENABLED = True
+LLM_HEALTH_INTERVAL = 5.0           # 探测周期（秒）
+LLM_HEALTH_TIMEOUT = 2.0            # 探测超时（秒）
+LLM_EJECT_FAILURES = 3
+LLM_READMIT_SUCCESSES = 2
+LLM_FAILOVER_ATTEMPTS = 1           # 创建请求失败时换后端重试的次数
 
-client = AsyncOpenAI(
-    api_key=LOCAL_CFG["api_key"],
-    base_url=LOCAL_CFG["base_url"],
-)
+# ========== LLM HTTP 连接池 ==========
+# 每个 LLM 后端一个显式配置的 httpx 连接池（替代 openai 默认的连接数和超时）
+# - 连接数与准入控制的最大并发匹配（每个请求同一时刻最多一个 LLM 调用），另留少量给健康探测
+# - keepalive_expiry 必须小于后端的 keep-alive 时间（vLLM 默认 5 秒，可用 VLLM_HTTP_TIMEOUT_KEEP_ALIVE 调大），
+#   否则会复用已被服务端关闭的连接；两边一起调整
+# - 超时分阶段：连接、两次读之间（流式即两个 chunk 之间）、写、等待空闲连接；总时间由请求时间预算控制
+LLM_HTTP_CFG = {
+    "max_connections": ADMISSION_MAX_INFLIGHT + 4,
+    "max_keepalive_connections": ADMISSION_MAX_INFLIGHT + 4,
+    "keepalive_expiry": 4.0,
+    "http2": False,              # vLLM 只支持 HTTP/1.1；后端前有支持 h2 的网关时可开启（需安装 h2）
+    "connect_timeout": 3.0,
+    "read_timeout": 60.0,
+    "write_timeout": 10.0,
+    "pool_timeout": 5.0,
+    "warmup_connections": 8,     # 启动时每个后端预先建立的连接数
+}
@@ -0,0 +1,196 @@
+"""
+搜索结果持久化缓存（SQLite，WAL 模式）
+- 位于进程内 TTLCache 之后：内存未命中时查磁盘，命中后回填内存
+- 服务重启、发布后缓存仍然有效，避免重启后集中请求搜索服务商
+- 同一台机器上多个 uvicorn worker 进程共享同一个数据库文件：
+  WAL 模式下读写互不阻塞，写入冲突由 busy_timeout 等待
+- 过期时间使用墙钟时间（time.time()），跨进程、跨重启一致
+- 后台定期压缩：删除过期过久的条目，超出容量上限时按过期时间从早到晚淘汰
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    SEARCH_DISK_CACHE_COMPACT_INTERVAL,
+    SEARCH_DISK_CACHE_ENABLED,
+    SEARCH_DISK_CACHE_MAX_BYTES,
+    SEARCH_DISK_CACHE_PATH,
+    SEARCH_STALE_MAX_AGE,
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_search_cache_expires ON search_cache (expires_at);
+"""
+
+
+class DiskCache:
+
+    def __init__(self, path: str, max_bytes: int, keep_stale: float = SEARCH_STALE_MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep_stale = keep_stale
+        self._conn: Optional[sqlite3.Connection] = None
+        # 连接在线程池中使用，同一进程内串行访问
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+        self.compactions = 0
+        self.compacted_rows = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # ---------- 同步接口（在线程池中执行） ----------
+
+    def get_sync(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (value, expires_at)，不存在或过期过久返回 None"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM search_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time() - self.keep_stale),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def set_sync(self, key: str, value: Any, ttl: float) -> None:
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, expires_at, size) VALUES (?, ?, ?, ?)",
+                (key, data, time.time() + ttl, len(data.encode("utf-8"))),
+            )
+        self.writes += 1
+
+    def compact_sync(self) -> int:
+        """删除过期过久的条目；总大小超过上限时，按过期时间从早到晚淘汰到上限的 90%"""
+        with self._lock:
+            conn = self._connect()
+            # IMMEDIATE：多个进程同时压缩时只有一个能拿到写锁，其余等待后看到的是已压缩的结果
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = conn.execute(
+                    "DELETE FROM search_cache WHERE expires_at <= ?", (time.time() - self.keep_stale,)
+                ).rowcount
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+                if total > self.max_bytes:
+                    target = total - int(self.max_bytes * 0.9)
+                    cutoff = conn.execute(
+                        "SELECT expires_at FROM (SELECT expires_at, SUM(size) OVER (ORDER BY expires_at) AS acc "
+                        "FROM search_cache) WHERE acc >= ? ORDER BY expires_at LIMIT 1",
+                        (target,),
+                    ).fetchone()
+                    if cutoff is not None:
+                        removed += conn.execute(
+                            "DELETE FROM search_cache WHERE expires_at <= ?", (cutoff[0],)
+                        ).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.compactions += 1
+        self.compacted_rows += removed
+        return removed
+
+    # ---------- 异步接口 ----------
+
+    async def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        try:
+            return await asyncio.to_thread(self.get_sync, key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("disk cache get error: %s", e)
+            return None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            await asyncio.to_thread(self.set_sync, key, value, ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("disk cache set error: %s", e)
+
+    async def compact(self) -> int:
+        try:
+            return await asyncio.to_thread(self.compact_sync)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("disk cache compaction error: %s", e)
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "writes": self.writes,
+            "errors": self.errors,
+            "compactions": self.compactions,
+            "compacted_rows": self.compacted_rows,
+        }
+
+
+# 进程级持久化缓存（未启用时为 None）
+disk_cache: Optional[DiskCache] = (
+    DiskCache(SEARCH_DISK_CACHE_PATH, SEARCH_DISK_CACHE_MAX_BYTES) if SEARCH_DISK_CACHE_ENABLED else None
+)
+_compactor: Optional[asyncio.Task] = None
+
+
+async def _compact_loop() -> None:
+    while True:
+        await asyncio.sleep(SEARCH_DISK_CACHE_COMPACT_INTERVAL)
+        removed = await disk_cache.compact()
+        if removed:
+            logger.info("disk cache compacted, removed %s rows", removed)
+
+
+def start_compaction() -> None:
+    """启动后台压缩（服务启动时调用）"""
+    global _compactor
+    if disk_cache is not None and _compactor is None:
+        _compactor = asyncio.create_task(_compact_loop())
+
+
+async def stop_compaction() -> None:
+    """停止后台压缩并关闭数据库连接（服务退出时调用）"""
+    global _compactor
+    if _compactor is not None:
+        _compactor.cancel()
+        await asyncio.gather(_compactor, return_exceptions=True)
+        _compactor = None
+    if disk_cache is not None:
+        disk_cache.close()
@@ -0,0 +1,203 @@
+"""
+基于地名表的地址解析
+- 启动时把省 / 地级市 / 直辖市的区的全称和别名载入一个 Aho-Corasick 自动机
+- 解析时对地址单次扫描，取从左到右的最长匹配，O(len) 得到 省 / 市 / 区
+- 只出现市名时，由地名表反查所属省份
+- 两个字以内的市 / 区别名需要省份上下文或词边界（“阿里巴巴”不是阿里地区）
+- 同一用户每次请求带同样的 location，解析结果按文本做 LRU 缓存
+- 规范名：canonical（"广西壮族自治区钦州市"，与原 extract_province_city 输出一致）
+  和 key（"广西钦州"，用作缓存 key）
+"""
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from aho_corasick import AhoCorasick
+from gazetteer_data import CITIES, EXTRA_ALIASES, MUNICIPALITIES, MUNICIPALITY_DISTRICTS, PROVINCES
+from schema import KEYWORD_TABLE
+
+_ETHNIC = (
+    "朝鲜族", "土家族", "苗族", "藏族", "羌族", "彝族", "布依族", "侗族", "哈尼族", "壮族",
+    "傣族", "白族", "景颇族", "傈僳族", "回族", "蒙古族", "蒙古", "柯尔克孜", "哈萨克",
+)
+_CITY_SUFFIX_RE = re.compile(r"(自治州|地区|林区|盟)$")
+_SHORT_SUFFIX_RE = re.compile(r"(壮族自治区|回族自治区|维吾尔自治区|自治区|特别行政区|省|市|新区|区)$")
+
+PROVINCE = "province"
+CITY = "city"
+DISTRICT = "district"
+
+
+class Location(NamedTuple):
+    province: Optional[str] = None
+    city: Optional[str] = None
+    district: Optional[str] = None
+
+    @property
+    def canonical(self) -> Optional[str]:
+        """省 + 市全称；直辖市只返回市名"""
+        if self.province in MUNICIPALITIES:
+            return self.province
+        if self.province and self.city:
+            return self.province + self.city
+        return self.province or self.city
+
+    @property
+    def key(self) -> Optional[str]:
+        """去掉行政区划后缀的短名，用作缓存 key：广西钦州 / 北京海淀"""
+        parts = [p for p in (self.province, self.city, self.district) if p]
+        if not parts:
+            return None
+        return "".join(short_name(p) for p in parts)
+
+
+def short_name(name: str) -> str:
+    """去行政区划后缀：广西壮族自治区 -> 广西，延边朝鲜族自治州 -> 延边"""
+    stem = _CITY_SUFFIX_RE.sub("", name)
+    if stem != name:
+        changed = True
+        while changed:
+            changed = False
+            for ethnic in _ETHNIC:
+                if stem.endswith(ethnic) and len(stem) > len(ethnic) + 1:
+                    stem = stem[:-len(ethnic)]
+                    changed = True
+        return stem
+    short = _SHORT_SUFFIX_RE.sub("", name)
+    return short if len(short) >= 2 else name
+
+
+# 条目：(级别, 省, 市, 区)
+Entry = Tuple[str, str, Optional[str], Optional[str]]
+
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+# 地名后常见的字和词：短别名后面紧跟这些时视为词边界（钦州天气、钦州的房价、大连今天）
+_FOLLOW_CHARS = frozenset("市县区的人和与跟及到在是有今明昨后本这近最周天气温下去附")
+_FOLLOW_WORDS = tuple(dict.fromkeys(w for words in KEYWORD_TABLE.values() for w in words))
+
+
+def _build() -> Tuple[AhoCorasick, Dict[str, List[Entry]], FrozenSet[str]]:
+    names: Dict[str, List[Entry]] = {}
+    short_aliases = set()
+
+    def add(name: str, entry: Entry) -> None:
+        names.setdefault(name, [])
+        if entry not in names[name]:
+            names[name].append(entry)
+
+    province_aliases = set()
+    for province, aliases in PROVINCES.items():
+        add(province, (PROVINCE, province, None, None))
+        for alias in aliases:
+            add(alias, (PROVINCE, province, None, None))
+            province_aliases.add(alias)
+
+    def add_alias(alias: str, entry: Entry) -> None:
+        add(alias, entry)
+        if len(alias) <= 2:
+            short_aliases.add(alias)
+
+    def add_with_aliases(name: str, entry: Entry) -> None:
+        add(name, entry)
+        for alias in {short_name(name), *EXTRA_ALIASES.get(name, [])}:
+            # 与省级简称相同的别名（吉林、海南）归省级，市级只认全称
+            if alias != name and len(alias) >= 2 and alias not in province_aliases:
+                add_alias(alias, entry)
+
+    for province, cities in CITIES.items():
+        for city in cities:
+            add_with_aliases(city, (CITY, province, city, None))
+
+    for municipality, districts in MUNICIPALITY_DISTRICTS.items():
+        for district in districts:
+            # 区名简称（朝阳、河北、和平……）与其他地名、普通词冲突太多，只认全称
+            entry = (DISTRICT, municipality, None, district)
+            add(district, entry)
+            for alias in EXTRA_ALIASES.get(district, []):
+                add_alias(alias, entry)
+
+    # 全称本身也是短名的（如 沙市）不受限制
+    official = {e[2] or e[3] for entries in names.values() for e in entries if e[0] != PROVINCE}
+    return AhoCorasick(names.items()), names, frozenset(short_aliases - official)
+
+
+_automaton, _names, _short_aliases = _build()
+
+
+def _at_boundary(text: str, end: int) -> bool:
+    """短别名之后是否为词边界：文本结束、非汉字、常见后续字词"""
+    if end >= len(text) or not _CJK_RE.match(text[end]):
+        return True
+    return text[end] in _FOLLOW_CHARS or text.startswith(_FOLLOW_WORDS, end)
+
+
+@lru_cache(maxsize=4096)
+def locate(text: str) -> Tuple[Location, Tuple[Tuple[int, int], ...]]:
+    """
+    解析文本中的 省 / 市 / 区（取最靠前的匹配），同时返回被采用的地名在文本中的位置
+    - 同名地名（如 朝阳市 与 朝阳区）优先选与已识别省份一致的条目
+    - 两个字以内的市 / 区别名（阿里、钦州）只在属于已识别的省份、或后面是词边界时采用，
+      避免“阿里巴巴”被解析为阿里地区
+    """
+    if not text:
+        return Location(), ()
+
+    matches = _automaton.longest(text)
+    province = None
+    for _, _, entries in matches:
+        for entry in entries:
+            if entry[0] == PROVINCE:
+                province = entry[1]
+                break
+        if province:
+            break
+
+    # 各级别的第一个候选，以及第一个与省份一致的候选：(条目, 位置)
+    first: Dict[str, Tuple[Entry, Tuple[int, int]]] = {}
+    same: Dict[str, Tuple[Entry, Tuple[int, int]]] = {}
+    spans = []
+    for start, end, entries in matches:
+        short = end - start <= 2 and text[start:end] in _short_aliases
+        boundary = None
+        for entry in entries:
+            level = entry[0]
+            if level == PROVINCE:
+                if entry[1] == province:
+                    spans.append((start, end))
+                continue
+            if short and entry[1] != province:
+                if boundary is None:
+                    boundary = _at_boundary(text, end)
+                if not boundary:
+                    continue
+            first.setdefault(level, (entry, (start, end)))
+            if province and entry[1] == province:
+                same.setdefault(level, (entry, (start, end)))
+
+    city = same.get(CITY) or first.get(CITY)
+    district = same.get(DISTRICT) or first.get(DISTRICT)
+    if province is None:
+        found = city or district
+        province = found[0][1] if found else None
+    elif city and city[0][1] != province:
+        # 市与省不一致（地址本身有误），以省为准
+        city = None
+    if district and district[0][1] != province:
+        district = None
+
+    spans += [c[1] for c in (city, district) if c]
+    location = Location(
+        province=province,
+        city=city[0][2] if city else None,
+        district=district[0][3] if district else None,
+    )
+    return location, tuple(sorted(set(spans)))
+
+
+def resolve(text: str) -> Location:
+    """解析文本中的 省 / 市 / 区"""
+    return locate(text)[0]
+
+
+def size() -> Dict[str, int]:
+    return {"names": len(_names), "nodes": len(_automaton)}
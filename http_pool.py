@@ -0,0 +1,183 @@
+"""
+搜索服务商的进程级 HTTP 连接池
+- 每个服务商一个常驻 httpx.AsyncClient，复用 TCP/TLS 连接
+- 支持连接数、长连接保活时间、HTTP/2 配置
+- 启动时预热，避免首个工具调用承担 TLS 握手（HTTP/1.1 预热多条连接，HTTP/2 只需一条）
+- InstrumentedTransport：带连接池使用统计的 transport（LLM 后端客户端使用）
+"""
+import asyncio
+import importlib.util
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import httpx
+
+from config import SEARCH_POOL_CFG
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 依赖 h2，未安装时降级为 HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2(cfg: Dict[str, Any], name: str) -> bool:
+    http2 = bool(cfg.get("http2", False))
+    if http2 and not HTTP2_AVAILABLE:
+        logger.warning("h2 未安装，%s 连接池降级为 HTTP/1.1", name)
+        http2 = False
+    return http2
+
+
+def _limits(cfg: Dict[str, Any]) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=cfg.get("max_connections", 50),
+        max_keepalive_connections=cfg.get("max_keepalive_connections", 20),
+        keepalive_expiry=cfg.get("keepalive_expiry", 60),
+    )
+
+
+def _build_client(provider: str) -> httpx.AsyncClient:
+    """按配置创建服务商的连接池"""
+    cfg = SEARCH_POOL_CFG.get(provider, {})
+    return httpx.AsyncClient(limits=_limits(cfg), http2=_http2(cfg, provider))
+
+
+class _ClosingStream(httpx.AsyncByteStream):
+    """响应体关闭时回调（流式响应读完或被关闭才算请求结束）"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for part in self._stream:
+            yield part
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    带连接池使用统计的 transport
+    - in_flight：已发出、响应体尚未关闭的请求数（流式请求持续到流结束）
+    - connections / idle_connections：连接池中的连接数和空闲连接数
+    - pool_timeouts：等待空闲连接超时的次数，出现即说明连接池偏小
+    - headers_latency：发出请求到收到响应头的耗时（含等待连接、建连）
+    """
+
+    def __init__(self, name: str, cfg: Dict[str, Any]):
+        self.name = name
+        self.limits = _limits(cfg)
+        self.http2 = _http2(cfg, name)
+        self._transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.pool_timeouts = 0
+        self.connect_errors = 0
+        self.headers_latency = LatencyHistogram()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        closed = False
+
+        def done() -> None:
+            nonlocal closed
+            if not closed:
+                closed = True
+                self.in_flight -= 1
+
+        started = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as e:
+            done()
+            if isinstance(e, httpx.PoolTimeout):
+                self.pool_timeouts += 1
+            elif isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                self.connect_errors += 1
+            raise
+        self.headers_latency.observe(time.monotonic() - started)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ClosingStream(response.stream, done),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        connections = list(getattr(getattr(self._transport, "_pool", None), "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        max_connections = self.limits.max_connections
+        return {
+            "http2": self.http2,
+            "max_connections": max_connections,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilization": round(self.in_flight / max_connections, 3) if max_connections else None,
+            "requests": self.requests,
+            "pool_timeouts": self.pool_timeouts,
+            "connect_errors": self.connect_errors,
+            "headers_latency": self.headers_latency.stats(),
+        }
+
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """获取服务商的共享连接池（首次使用时创建）"""
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = _build_client(provider)
+        _clients[provider] = client
+    return client
+
+
+async def _warmup_one(provider: str) -> None:
+    cfg = SEARCH_POOL_CFG.get(provider, {})
+    base_url = cfg.get("base_url")
+    n = cfg.get("warmup_connections", 0)
+    if not base_url or n <= 0:
+        return
+
+    if bool(cfg.get("http2")) and HTTP2_AVAILABLE:
+        # HTTP/2 的并发请求复用同一条连接，并发预热也只会建立一条
+        n = 1
+    client = get_client(provider)
+
+    async def ping():
+        # 任意响应都说明 TCP + TLS 已建立，连接会留在池中复用
+        try:
+            await client.head(base_url, timeout=10)
+        except Exception as e:
+            logger.warning("连接池预热失败 provider=%s error=%s", provider, e)
+
+    await asyncio.gather(*[ping() for _ in range(n)])
+    logger.info("连接池预热完成 provider=%s connections=%s", provider, n)
+
+
+async def warmup(providers: Optional[Iterable[str]] = None) -> None:
+    """启动时预热连接池"""
+    providers = list(providers) if providers is not None else list(SEARCH_POOL_CFG)
+    await asyncio.gather(*[_warmup_one(p) for p in providers])
+
+
+async def close_all() -> None:
+    """关闭所有连接池（服务退出时调用）"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
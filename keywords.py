@@ -0,0 +1,55 @@
+"""
+查询关键词分类
+- schema.KEYWORD_TABLE 中所有分类的关键词编译成一个 Aho-Corasick 自动机
+- classify(text) 一次扫描返回命中的全部分类；同一请求内多处判断共用结果（LRU 缓存）
+- 语义与 any(w in text for w in words) 一致（子串匹配，重叠的关键词都会命中）
+"""
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List
+
+from aho_corasick import AhoCorasick
+from schema import KEYWORD_TABLE
+
+DATE_SENSITIVE = "date_sensitive"
+REALTIME = "realtime"
+TIME_WORD = "time_word"
+WEATHER = "weather"
+SEARCH_RULE = "search_rule"
+
+_table: Dict[str, List[str]] = {category: list(words) for category, words in KEYWORD_TABLE.items()}
+_automaton: AhoCorasick
+
+
+def _build() -> None:
+    global _automaton
+    patterns: Dict[str, set] = {}
+    for category, words in _table.items():
+        for word in words:
+            patterns.setdefault(word, set()).add(category)
+    _automaton = AhoCorasick((word, frozenset(cats)) for word, cats in patterns.items())
+    classify.cache_clear()
+
+
+def extend(category: str, words: Iterable[str]) -> None:
+    """向分类追加关键词（模块导入阶段调用，如路由从 TOOL_RULE_SYSTEM 解析出的关键词）"""
+    existing = _table.setdefault(category, [])
+    existing.extend(w for w in words if w and w not in existing)
+    _build()
+
+
+@lru_cache(maxsize=4096)
+def classify(text: str) -> FrozenSet[str]:
+    """返回 text 命中的所有分类"""
+    if not text:
+        return frozenset()
+    found = set()
+    for _, _, categories in _automaton.iter(text):
+        found |= categories
+    return frozenset(found)
+
+
+def has(text: str, category: str) -> bool:
+    return category in classify(text)
+
+
+_build()
@@ -0,0 +1,399 @@
+"""
+LLM 后端池（多个 OpenAI 兼容后端，如多台 vLLM）
+- 每个后端一个 AsyncOpenAI 客户端
+- 路由策略：
+  - least_outstanding：进行中请求数最少
+  - ewma_ttft：按首 token 延迟的指数滑动平均 ×（进行中请求数 + 1）加权
+- 会话粘性：按对话前缀（system + 第一条历史消息）做 rendezvous 哈希，同一对话固定到同一后端，
+  保持 vLLM 前缀缓存命中；该后端明显比最空闲的后端更忙时放弃粘性
+- 健康检查：
+  - 被动：连接失败、超时、5xx 连续 LLM_EJECT_FAILURES 次即摘除
+  - 主动：定期请求 /models，摘除的后端连续 LLM_READMIT_SUCCESSES 次探测成功后恢复
+  - 全部摘除时仍在全部后端中选择（fail open）
+- 创建请求就失败（连接失败、5xx）时换一个后端重试
+- 每个后端的 HTTP 连接池按 LLM_HTTP_CFG 显式配置（连接数、保活、HTTP/2、分阶段超时），启动时预热
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+import metrics
+from config import (
+    DEADLINE_DECODE_TOKENS_PER_SECOND,
+    LLM_BACKENDS,
+    LLM_EJECT_FAILURES,
+    LLM_EWMA_ALPHA,
+    LLM_FAILOVER_ATTEMPTS,
+    LLM_HEALTH_CHECK_ENABLED,
+    LLM_HEALTH_INTERVAL,
+    LLM_HEALTH_TIMEOUT,
+    LLM_HTTP_CFG,
+    LLM_READMIT_SUCCESSES,
+    LLM_ROUTING,
+    LLM_STICKY,
+    LLM_STICKY_MAX_EXTRA,
+)
+from http_pool import InstrumentedTransport
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+LEAST_OUTSTANDING = "least_outstanding"
+EWMA_TTFT = "ewma_ttft"
+
+
+def is_backend_failure(e: BaseException) -> bool:
+    """后端自身的问题（连接失败、超时、5xx）；4xx 等请求问题、本地连接池等待超时不计入"""
+    if isinstance(e, httpx.PoolTimeout) or isinstance(e.__cause__, httpx.PoolTimeout):
+        return False
+    return isinstance(e, (openai.APIConnectionError, openai.InternalServerError, httpx.TransportError))
+
+
+def affinity_key(messages: Sequence[Dict[str, Any]]) -> Optional[str]:
+    """
+    对话粘性 key：system（静态前缀 + 人设）+ 第一条非 system 消息
+    同一对话后续轮次的 prompt 以相同内容开头，对应后端上的前缀缓存
+    """
+    head = [m for m in messages if m.get("role") == "system"][:1]
+    head += [m for m in messages if m.get("role") != "system"][:1]
+    if not head:
+        return None
+    h = hashlib.md5()
+    for m in head:
+        h.update(str(m.get("content") or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def request_timeout(total: Optional[float] = None, cfg: Dict[str, Any] = LLM_HTTP_CFG,
+                    stream: bool = True, max_tokens: Optional[int] = None) -> httpx.Timeout:
+    """
+    分阶段超时；total 为剩余的总时间，每个阶段都不超过它
+    - 流式：read 是两个 chunk 之间的最长间隔（read_timeout）
+    - 非流式：vLLM 生成完才返回响应，read 要覆盖整个生成过程：有 total 时取 total，
+      否则按 max_tokens / DEADLINE_DECODE_TOKENS_PER_SECOND 估算（不少于 read_timeout）
+    """
+    def cap(seconds: float) -> float:
+        return seconds if total is None else min(seconds, total)
+
+    read = cfg.get("read_timeout", 60.0)
+    if not stream:
+        if total is not None:
+            read = total
+        elif max_tokens:
+            read = max(read, max_tokens / DEADLINE_DECODE_TOKENS_PER_SECOND)
+    return httpx.Timeout(
+        connect=cap(cfg.get("connect_timeout", 5.0)),
+        read=cap(read),
+        write=cap(cfg.get("write_timeout", 10.0)),
+        pool=cap(cfg.get("pool_timeout", 5.0)),
+    )
+
+
+def _can_failover(e: BaseException) -> bool:
+    """
+    连接失败、等待连接超时、5xx 可以换后端重试；
+    读超时说明后端已在处理但太慢（或时间预算已耗尽），不再重试
+    """
+    if isinstance(e, openai.APITimeoutError):
+        return isinstance(e.__cause__, (httpx.ConnectTimeout, httpx.PoolTimeout))
+    return is_backend_failure(e)
+
+
+def _rendezvous(key: str, name: str) -> int:
+    return int.from_bytes(hashlib.md5(f"{key}|{name}".encode("utf-8")).digest()[:8], "big")
+
+
+class Backend:
+
+    def __init__(self, name: str, base_url: str, api_key: str = "EMPTY",
+                 client: Optional[AsyncOpenAI] = None, http_cfg: Dict[str, Any] = LLM_HTTP_CFG):
+        self.name = name
+        self.base_url = base_url
+        self.http_cfg = http_cfg
+        self.transport: Optional[InstrumentedTransport] = None
+        if client is None:
+            self.transport = InstrumentedTransport(name, http_cfg)
+            timeout = request_timeout(cfg=http_cfg)
+            # 失败时由池换后端重试，客户端自身不重试
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                timeout=timeout,
+                http_client=httpx.AsyncClient(transport=self.transport, timeout=timeout),
+            )
+        self.client = client
+        self.outstanding = 0
+        self.ewma_ttft: Optional[float] = None
+        self.ttft = LatencyHistogram()
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.probe_successes = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def begin(self) -> float:
+        self.outstanding += 1
+        self.requests += 1
+        return time.monotonic()
+
+    def end(self, failed: bool) -> None:
+        self.outstanding -= 1
+        if failed:
+            self.record_failure()
+        else:
+            self.consecutive_failures = 0
+
+    def observe_ttft(self, seconds: float) -> None:
+        self.ttft.observe(seconds)
+        if self.ewma_ttft is None:
+            self.ewma_ttft = seconds
+        else:
+            self.ewma_ttft = LLM_EWMA_ALPHA * seconds + (1 - LLM_EWMA_ALPHA) * self.ewma_ttft
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.probe_successes = 0
+        if self.healthy and self.consecutive_failures >= LLM_EJECT_FAILURES:
+            self.healthy = False
+            self.ejections += 1
+            metrics.incr("llm_backend_ejections")
+            logger.warning("LLM backend ejected: %s after %s failures", self.name, self.consecutive_failures)
+
+    def record_probe(self, ok: bool) -> None:
+        if not ok:
+            self.record_failure()
+            return
+        self.consecutive_failures = 0
+        if not self.healthy:
+            self.probe_successes += 1
+            if self.probe_successes >= LLM_READMIT_SUCCESSES:
+                self.healthy = True
+                self.probe_successes = 0
+                metrics.incr("llm_backend_readmissions")
+                logger.info("LLM backend readmitted: %s", self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "ewma_ttft": round(self.ewma_ttft, 4) if self.ewma_ttft is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+            "ttft": self.ttft.stats(),
+            "http_pool": self.transport.stats() if self.transport is not None else None,
+        }
+
+
+class _TrackedStream:
+    """包装上游流：记录首 token 延迟，流结束 / 关闭 / 出错时释放后端计数"""
+
+    def __init__(self, stream: Any, backend: Backend, started: float):
+        self._stream = stream
+        self._backend = backend
+        self._started = started
+        self._ended = False
+
+    def _end(self, failed: bool) -> None:
+        if not self._ended:
+            self._ended = True
+            self._backend.end(failed)
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        first = True
+        try:
+            async for chunk in self._stream:
+                if first:
+                    first = False
+                    self._backend.observe_ttft(time.monotonic() - self._started)
+                yield chunk
+        except Exception as e:
+            self._end(is_backend_failure(e))
+            raise
+        finally:
+            self._end(False)
+
+    async def close(self) -> None:
+        self._end(False)
+        await self._stream.close()
+
+
+class LLMPool:
+
+    def __init__(self, backends: List[Backend], routing: str = LLM_ROUTING, sticky: bool = LLM_STICKY):
+        if not backends:
+            raise ValueError("LLM backend pool is empty")
+        self.backends = backends
+        self.routing = routing
+        self.sticky = sticky
+        self.sticky_hits = 0
+        self.sticky_overflows = 0
+        self.failovers = 0
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _score(self, backend: Backend, default_ttft: float) -> tuple:
+        if self.routing == EWMA_TTFT:
+            ttft = backend.ewma_ttft if backend.ewma_ttft is not None else default_ttft
+            return (ttft * (backend.outstanding + 1), random.random())
+        return (backend.outstanding, random.random())
+
+    def pick(self, affinity: Optional[str] = None, exclude: Sequence[Backend] = ()) -> Backend:
+        """选择后端：优先健康的；对话粘性后端不比最空闲的后端忙太多时使用粘性后端"""
+        candidates = [b for b in self.backends if b not in exclude] or list(self.backends)
+        healthy = [b for b in candidates if b.healthy]
+        if not healthy:
+            metrics.incr("llm_all_backends_ejected")
+            healthy = candidates
+
+        sampled = [b.ewma_ttft for b in healthy if b.ewma_ttft is not None]
+        default_ttft = sum(sampled) / len(sampled) if sampled else 1.0
+        best = min(healthy, key=lambda b: self._score(b, default_ttft))
+        if not self.sticky or affinity is None:
+            return best
+
+        home = max(healthy, key=lambda b: _rendezvous(affinity, b.name))
+        if home.outstanding - best.outstanding <= LLM_STICKY_MAX_EXTRA:
+            self.sticky_hits += 1
+            return home
+        self.sticky_overflows += 1
+        return best
+
+    async def create(self, **kwargs: Any) -> Any:
+        """
+        chat.completions.create 的路由版本，参数相同
+        - stream=True 时返回包装后的流（支持 async for 和 close()）
+        - timeout 传数字时视为剩余总时间：拆成分阶段超时，并以它为整个调用（含换后端重试）的截止时间，
+          超出时抛 APITimeoutError；流式请求只限制到收到响应头，之后由调用方按预算关闭流
+        - 非流式请求未指定 timeout 时，read 超时按 max_tokens 估算
+        """
+        total = kwargs.get("timeout")
+        stream = bool(kwargs.get("stream"))
+        deadline = time.monotonic() + total if isinstance(total, (int, float)) else None
+        affinity = affinity_key(kwargs.get("messages") or [])
+        tried: List[Backend] = []
+        while True:
+            backend = self.pick(affinity, exclude=tried)
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0.0)
+            if deadline is not None or (total is None and not stream):
+                kwargs["timeout"] = request_timeout(remaining, backend.http_cfg, stream, kwargs.get("max_tokens"))
+            started = backend.begin()
+            try:
+                resp = await asyncio.wait_for(backend.client.chat.completions.create(**kwargs), remaining)
+            except asyncio.CancelledError:
+                backend.end(False)
+                raise
+            except asyncio.TimeoutError as e:
+                # 调用方的时间预算耗尽，不代表后端故障
+                backend.end(False)
+                request = httpx.Request("POST", f"{backend.base_url.rstrip('/')}/chat/completions")
+                raise openai.APITimeoutError(request=request) from e
+            except Exception as e:
+                failed = is_backend_failure(e)
+                backend.end(failed)
+                tried.append(backend)
+                if _can_failover(e) and len(tried) <= LLM_FAILOVER_ATTEMPTS and len(tried) < len(self.backends):
+                    self.failovers += 1
+                    logger.warning("LLM backend %s failed (%s), failing over", backend.name, e)
+                    continue
+                raise
+            if kwargs.get("stream"):
+                return _TrackedStream(resp, backend, started)
+            backend.end(False)
+            return resp
+
+    async def _probe(self, backend: Backend) -> None:
+        try:
+            await backend.client.models.list(timeout=LLM_HEALTH_TIMEOUT)
+        except Exception as e:
+            logger.debug("LLM backend probe failed: %s %s", backend.name, e)
+            backend.record_probe(False)
+            return
+        backend.record_probe(True)
+
+    async def probe_once(self) -> None:
+        """对所有后端做一次健康探测"""
+        await asyncio.gather(*[self._probe(b) for b in self.backends])
+
+    async def warmup(self) -> None:
+        """启动时为每个后端并发建立 warmup_connections 个连接（HTTP/2 为一个），留在连接池中复用"""
+        async def warm(backend: Backend) -> None:
+            n = backend.http_cfg.get("warmup_connections", 0)
+            if backend.transport is None or n <= 0:
+                return
+            if backend.transport.http2:
+                # HTTP/2 的并发请求复用同一条连接，只需预热一条
+                n = 1
+            results = await asyncio.gather(
+                *[backend.client.models.list(timeout=LLM_HEALTH_TIMEOUT) for _ in range(n)],
+                return_exceptions=True,
+            )
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                logger.warning("LLM 连接池预热失败 backend=%s error=%s", backend.name, errors[0])
+            logger.info("LLM 连接池预热完成 backend=%s connections=%s", backend.name,
+                        backend.transport.stats()["connections"])
+
+        await asyncio.gather(*[warm(b) for b in self.backends])
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(LLM_HEALTH_INTERVAL)
+            try:
+                await self.probe_once()
+            except Exception as e:
+                logger.exception("LLM health check error: %s", e)
+
+    def start_health_checks(self) -> None:
+        """启动后台健康探测（服务启动时调用）"""
+        if LLM_HEALTH_CHECK_ENABLED and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop_health_checks(self) -> None:
+        """停止健康探测，关闭各后端客户端（服务退出时调用）"""
+        task, self._health_task = self._health_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        for backend in self.backends:
+            await backend.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routing": self.routing,
+            "sticky": self.sticky,
+            "sticky_hits": self.sticky_hits,
+            "sticky_overflows": self.sticky_overflows,
+            "failovers": self.failovers,
+            "backends": {b.name: b.stats() for b in self.backends},
+        }
+
+
+def _build_pool() -> LLMPool:
+    backends = [
+        Backend(cfg.get("name") or f"backend-{i}", cfg["base_url"], cfg.get("api_key", "EMPTY"))
+        for i, cfg in enumerate(LLM_BACKENDS)
+    ]
+    return LLMPool(backends)
+
+
+# 进程级 LLM 后端池
+pool = _build_pool()
+metrics.register_collector("llm_backends", lambda: pool.stats())
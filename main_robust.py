@@ -2,18 +2,29 @@
 OpenAI 格式的服务
 支持工具调用和流式/非流式响应
 """
+import asyncio
 import json
 import time
 import logging
 from logging.handlers import TimedRotatingFileHandler
+from typing import Optional
 
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from openai import APITimeoutError
 
-from config import LOCAL_CFG
+from config import ADMISSION_ENABLED, LOCAL_CFG, REQUEST_DEADLINE_HEADER
 from schema import ChatCompletionRequest
 from chat_handlers import chat_completion, chat_completion_stream
+from admission import Overloaded, admission
+import http_pool
+from llm_pool import pool as llm_pool
+import metrics
+from request_budget import RequestBudget, parse_timeout
+import disk_cache
+import search_providers
+import search_service
 
 # -------------------- 配置日志 --------------------
 log_handler = TimedRotatingFileHandler(
@@ -45,26 +56,101 @@ logger = logging.getLogger(__name__)
 app = FastAPI(title="OpenAI-Compatible API")
 
 
+@app.on_event("startup")
+async def on_startup():
+    # 预热搜索连接池和 LLM 连接池，避免首个请求承担建连开销
+    await asyncio.gather(http_pool.warmup(), llm_pool.warmup())
+    # LLM 后端健康探测
+    llm_pool.start_health_checks()
+    # 热点查询提前刷新
+    search_service.start_refresh_ahead()
+    # 持久化搜索缓存后台压缩
+    disk_cache.start_compaction()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await search_service.stop_refresh_ahead()
+    await disk_cache.stop_compaction()
+    await llm_pool.stop_health_checks()
+    # 关闭搜索 HTTP 连接池
+    await http_pool.close_all()
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """流式响应结束（包括客户端断开、task 被取消）后归还准入名额"""
+
+    def __init__(self, *args, admitted_at: Optional[float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.admitted_at = admitted_at
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.admitted_at is not None:
+                admission.release(self.admitted_at)
+
+
+async def _admit(budget: RequestBudget) -> Optional[float]:
+    """
+    准入控制：排队等待处理名额，返回处理开始时间（未启用准入控制时返回 None）
+    排队时间作为单独的阶段（queue）记入时间预算；被拒绝时返回 503 + Retry-After
+    """
+    if not ADMISSION_ENABLED:
+        return None
+    started = time.monotonic()
+    try:
+        await admission.acquire(budget.deadline)
+    except Overloaded as e:
+        budget.record("queue", "shed", started)
+        logger.warning("request shed: %s, retry after %ss", e.reason, e.retry_after)
+        raise HTTPException(503, "Server overloaded", headers={"Retry-After": str(e.retry_after)})
+    budget.record("queue", "ok", started)
+    return time.monotonic()
+
+
 @app.post("/v1/chat/completions")
-async def chat_completions(req: ChatCompletionRequest):
+async def chat_completions(req: ChatCompletionRequest, request: Request):
     """
     OpenAI 兼容的聊天补全接口
     """
     if req.model != LOCAL_CFG["model"]:
         raise HTTPException(400, f"Model not supported: {LOCAL_CFG['model']}")
-    
+
+    # 端到端时间预算：请求字段优先，其次请求头，都没有时使用服务端默认值
+    budget = RequestBudget(
+        parse_timeout(req.timeout) or parse_timeout(request.headers.get(REQUEST_DEADLINE_HEADER))
+    )
+    admitted_at = await _admit(budget)
+    # 流式响应创建后由响应负责归还名额
+    release = admitted_at is not None
+
     try:
         if req.stream:
             async def sse():
+                # 客户端断开的两种表现：
+                # - 发送每个 chunk 前检查 is_disconnected，发现断开即停止
+                # - 服务端直接取消本 task（CancelledError），或生成器被关闭（GeneratorExit）
+                # 两种情况都要关闭 chat_completion_stream，由它关闭上游 vLLM 流、取消搜索
+                stream = chat_completion_stream(
+                    messages=req.messages,
+                    temperature=req.temperature,
+                    top_p=req.top_p,
+                    max_tokens=req.max_tokens,
+                    location=req.location,
+                    budget=budget,
+                )
                 try:
-                    async for chunk in chat_completion_stream(
-                        messages=req.messages,
-                        temperature=req.temperature,
-                        top_p=req.top_p,
-                        max_tokens=req.max_tokens,
-                        location=req.location,
-                    ):
+                    async for chunk in stream:
+                        if await request.is_disconnected():
+                            metrics.incr("client_disconnects")
+                            logger.info("client disconnected, stop streaming")
+                            return
                         yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                except (GeneratorExit, asyncio.CancelledError):
+                    metrics.incr("client_disconnects")
+                    raise
                 except Exception as e:
                     # ⚠️ 流式兜底，保证客户端能结束
                     data = {
@@ -73,16 +159,20 @@ async def chat_completions(req: ChatCompletionRequest):
                     }
                     yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
                 finally:
-                    yield "data: [DONE]\n\n"
+                    await stream.aclose()
+                yield "data: [DONE]\n\n"
 
-            return StreamingResponse(
+            response = AdmittedStreamingResponse(
                 sse(),
+                admitted_at=admitted_at,
                 media_type="text/event-stream",
                 headers={
                     "Cache-Control": "no-cache",
                     "Connection": "keep-alive",
                 },
             )
+            release = False
+            return response
 
         else:
             result = await chat_completion(
@@ -92,6 +182,7 @@ async def chat_completions(req: ChatCompletionRequest):
                 top_p=req.top_p,
                 max_tokens=req.max_tokens,
                 location=req.location,
+                budget=budget,
             )
 
             return {
@@ -106,9 +197,14 @@ async def chat_completions(req: ChatCompletionRequest):
                 }],
                 "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
             }
+    except APITimeoutError:
+        raise HTTPException(504, "Request timeout")
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(500, f"Internal error: {str(e)}")
+    finally:
+        if release:
+            admission.release(admitted_at)
 
 
 @app.get("/health")
@@ -116,6 +212,17 @@ async def health_check():
     return {"status": "healthy", "timestamp": time.time()}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+
+@app.get("/search/breakers")
+async def get_search_breakers():
+    """各搜索服务商的熔断器状态"""
+    return search_providers.breaker_states()
+
+
 @app.get("/v1/models")
 async def list_models():
     return {
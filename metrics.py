@@ -0,0 +1,85 @@
+"""
+进程内指标
+- 简单计数器：incr / get
+- 采集函数：各组件注册一个返回 dict 的函数，snapshot 时统一汇总
+- 延迟直方图：累计分桶计数 + 最近窗口内的分位数
+"""
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, Optional
+
+_counters: Dict[str, float] = defaultdict(float)
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    """计数器累加"""
+    _counters[name] += value
+
+
+def get(name: str) -> float:
+    return _counters.get(name, 0)
+
+
+def register_collector(name: str, fn: Callable[[], Dict[str, Any]]) -> None:
+    """注册组件指标采集函数（同名覆盖）"""
+    _collectors[name] = fn
+
+
+def snapshot() -> Dict[str, Any]:
+    """汇总所有指标"""
+    data: Dict[str, Any] = {"counters": dict(_counters)}
+    for name, fn in _collectors.items():
+        data[name] = fn()
+    return data
+
+
+class LatencyHistogram:
+    """
+    延迟直方图（秒）
+    - buckets：累计分桶计数，用于导出
+    - 最近 window 个样本用于计算分位数（p50 / p95 / p99），反映当前状态
+    """
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+    def __init__(self, window: int = 500):
+        self._recent: deque = deque(maxlen=window)
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self._recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """最近窗口内的分位数，p 取 0~100；没有样本时返回 None"""
+        if not self._recent:
+            return None
+        data = sorted(self._recent)
+        idx = min(len(data) - 1, max(0, int(round(p / 100 * (len(data) - 1)))))
+        return data[idx]
+
+    def stats(self) -> Dict[str, Any]:
+        def r(v):
+            return round(v, 4) if v is not None else None
+
+        labels = [f"le_{b}" for b in self.BUCKETS] + ["le_inf"]
+        return {
+            "count": self.count,
+            "avg": r(self.total / self.count) if self.count else None,
+            "p50": r(self.percentile(50)),
+            "p95": r(self.percentile(95)),
+            "p99": r(self.percentile(99)),
+            "buckets": dict(zip(labels, self.bucket_counts)),
+        }
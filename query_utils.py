@@ -5,7 +5,8 @@ import re
 from datetime import datetime
 from typing import Optional
 
-from schema import DATE_SENSITIVE_TOPICS, TIME_WORDS
+import keywords
+from gazetteer import resolve as resolve_location
 
 
 def today_str() -> str:
@@ -20,18 +21,15 @@ def should_append_date(query: str) -> bool:
     - 或明确包含时间指示词
     才追加日期
     """
-    return (
-        any(t in query for t in DATE_SENSITIVE_TOPICS)
-        or any(w in query for w in TIME_WORDS)
-    )
+    categories = keywords.classify(query)
+    return keywords.DATE_SENSITIVE in categories or keywords.TIME_WORD in categories
 
 
 def is_weather_query(query: str) -> bool:
     """
     判断是否是天气相关的查询（使用关键词判断）
     """
-    weather_keywords = ["天气", "气温", "温度", "下雨", "下雪", "晴天", "阴天", "多云", "降雨", "降雪", "台风", "暴雨"]
-    return any(keyword in query for keyword in weather_keywords)
+    return keywords.has(query, keywords.WEATHER)
 
 
 def build_search_query(user_query: str) -> str:
@@ -42,29 +40,30 @@ def build_search_query(user_query: str) -> str:
         return f"{user_query}，（今日日期：{today_str()}）"
     return user_query
 
-def extract_province_city(location: str) -> str | None:
+# 地名表未覆盖时的兜底规则（预编译）
+_PROVINCE_RE = re.compile(
+    r'(北京市|天津市|上海市|重庆市|'
+    r'[^省]+省|'
+    r'[^自治区]+自治区|'
+    r'香港特别行政区|澳门特别行政区)'
+)
+_CITY_RE = re.compile(r'([^省自治区]+市)')
+
+
+def _extract_province_city_regex(location: str) -> str | None:
     """
-    从地址中提取 '省/自治区/直辖市 + 市' 级别信息
+    正则解析（旧实现，地名表未匹配时兜底）
     """
-    if not location:
-        return None
-
     province = None
     city = None
 
     # 1️⃣ 提取省 / 自治区 / 特别行政区
-    province_pattern = (
-        r'(北京市|天津市|上海市|重庆市|'
-        r'[^省]+省|'
-        r'[^自治区]+自治区|'
-        r'香港特别行政区|澳门特别行政区)'
-    )
-    province_match = re.search(province_pattern, location)
+    province_match = _PROVINCE_RE.search(location)
     if province_match:
         province = province_match.group(1)
 
     # 2️⃣ 提取市
-    city_match = re.search(r'([^省自治区]+市)', location)
+    city_match = _CITY_RE.search(location)
     if city_match:
         city = city_match.group(1)
 
@@ -80,7 +79,19 @@ def extract_province_city(location: str) -> str | None:
     return province or city
 
 
+def extract_province_city(location: str) -> str | None:
+    """
+    从地址中提取 '省/自治区/直辖市 + 市' 级别信息
+    - 优先用地名表（Aho-Corasick 最长匹配），只有市名时反查省份
+    - 地名表未匹配时退回正则解析
+    """
+    if not location:
+        return None
 
+    canonical = resolve_location(location).canonical
+    if canonical:
+        return canonical
+    return _extract_province_city_regex(location)
 
 
 def optimize_search_query(query: str, location: Optional[str] = None) -> str:
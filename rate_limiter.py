@@ -0,0 +1,90 @@
+"""
+令牌桶限流（每个搜索服务商一个）
+- qps：令牌生成速率；burst：桶容量，允许的瞬时突发
+- 令牌不足时进入有界等待队列，按到达顺序依次获得令牌
+- 调用方带截止时间：预计等待超过剩余时间、或队列已满时立即拒绝，由调用方走过期缓存或快速失败
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from metrics import LatencyHistogram
+
+
+class TokenBucket:
+
+    def __init__(self, name: str, qps: float, burst: int, max_queue: int):
+        self.name = name
+        self.qps = qps
+        self.burst = burst
+        self.max_queue = max_queue
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self.queue_depth = 0
+        self.wait = LatencyHistogram()
+        self.acquired = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.qps)
+        self._updated = now
+
+    async def acquire(self, deadline: Optional[float] = None) -> bool:
+        """
+        获取一个令牌，成功返回 True
+        - deadline: time.monotonic() 时间点，等不到就返回 False
+        令牌采用预占方式：先扣减（可为负数），再等待负数部分补齐，天然保证先到先得
+        """
+        now = time.monotonic()
+        self._refill(now)
+
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.acquired += 1
+            self.wait.observe(0.0)
+            return True
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected_queue_full += 1
+            return False
+
+        wait = (1 - self._tokens) / self.qps
+        if deadline is not None and now + wait > deadline:
+            self.rejected_deadline += 1
+            return False
+
+        self._tokens -= 1
+        self.queue_depth += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # 放弃排队，归还预占的令牌
+            self._refill(time.monotonic())
+            self._tokens = min(self.burst, self._tokens + 1)
+            raise
+        finally:
+            self.queue_depth -= 1
+
+        self.acquired += 1
+        self.wait.observe(time.monotonic() - now)
+        return True
+
+    def headroom(self) -> float:
+        """当前可用令牌数（排队请求已预占，可能为负数）"""
+        self._refill(time.monotonic())
+        return self._tokens
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill(time.monotonic())
+        return {
+            "qps": self.qps,
+            "burst": self.burst,
+            "tokens": round(self._tokens, 2),
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "acquired": self.acquired,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_deadline": self.rejected_deadline,
+            "wait": self.wait.stats(),
+        }
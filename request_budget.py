@@ -0,0 +1,94 @@
+"""
+单个请求的端到端时间预算
+- 截止时间来自请求字段 timeout 或请求头 X-Request-Timeout（秒），都没有时使用服务端默认值
+- 每个阶段（第一轮 LLM、每次搜索、第二轮 LLM）以剩余预算作为超时
+- 预算不足时降级：
+  - 剩余时间不够 搜索 + 回答：跳过搜索，带提示直接回答
+  - 剩余时间不够按 max_tokens 解码完：按估算的解码速度截短 max_tokens
+- 每个阶段的结果（ok / error / timeout / deadline / skipped / cancelled）和耗时按阶段汇总到 /metrics
+"""
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from config import (
+    DEADLINE_ANSWER_RESERVE,
+    DEADLINE_DECODE_TOKENS_PER_SECOND,
+    DEADLINE_MIN_MAX_TOKENS,
+    DEADLINE_MIN_SEARCH_SECONDS,
+    REQUEST_DEADLINE_DEFAULT,
+    REQUEST_DEADLINE_MAX,
+)
+
+# 阶段 -> 结果 -> 次数；阶段 -> 耗时直方图
+_outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+_latency: Dict[str, metrics.LatencyHistogram] = defaultdict(metrics.LatencyHistogram)
+
+
+def parse_timeout(value: Any) -> Optional[float]:
+    """解析请求中的超时秒数，无效值返回 None"""
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return seconds if seconds > 0 else None
+
+
+class RequestBudget:
+
+    def __init__(self, seconds: Optional[float] = None):
+        if seconds is None:
+            seconds = REQUEST_DEADLINE_DEFAULT
+        self.seconds = min(seconds, REQUEST_DEADLINE_MAX)
+        self.started = time.monotonic()
+        self.deadline = self.started + self.seconds
+        self.stages: List[Tuple[str, str, float]] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def can_search(self) -> bool:
+        """剩余时间是否够 搜索 + 回答"""
+        return self.remaining() >= DEADLINE_MIN_SEARCH_SECONDS + DEADLINE_ANSWER_RESERVE
+
+    def search_deadline(self) -> float:
+        """搜索的截止时间（time.monotonic() 时间点）：给之后的回答预留时间"""
+        return self.deadline - DEADLINE_ANSWER_RESERVE
+
+    def cap_tokens(self, max_tokens: int) -> int:
+        """按剩余时间和估算的解码速度截短 max_tokens"""
+        cap = max(DEADLINE_MIN_MAX_TOKENS, int(self.remaining() * DEADLINE_DECODE_TOKENS_PER_SECOND))
+        if cap < max_tokens:
+            metrics.incr("deadline_max_tokens_cut")
+            return cap
+        return max_tokens
+
+    def record(self, stage: str, outcome: str, started: float) -> None:
+        """记录阶段结果；started 为阶段开始的 time.monotonic()"""
+        elapsed = time.monotonic() - started
+        self.stages.append((stage, outcome, round(elapsed, 3)))
+        _outcomes[stage][outcome] += 1
+        _latency[stage].observe(elapsed)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "budget": self.seconds,
+            "elapsed": round(time.monotonic() - self.started, 3),
+            "stages": self.stages,
+        }
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        stage: {"outcomes": dict(_outcomes[stage]), "latency": _latency[stage].stats()}
+        for stage in _outcomes
+    }
+
+
+metrics.register_collector("request_stages", stats)
@@ -19,6 +19,8 @@ class ChatCompletionRequest(BaseModel):
     max_tokens: int = 3000
     stream: bool = False
     location: Optional[str] = None
+    # 端到端超时（秒），也可用请求头 X-Request-Timeout 指定；都没有时使用服务端默认值
+    timeout: Optional[float] = None
 
 
 
@@ -61,15 +63,19 @@ DATA_ACCURACY_SYSTEM = {
 
 
 # 今日基准时间
-def get_datatime_now():
+def get_datatime_now(granularity: str = "second"):
+    """
+    granularity: "second" 精确到秒；"minute" 精确到分钟（一分钟内内容不变，利于 vLLM 前缀缓存）
+    """
     now = datetime.now()
+    time_fmt = "%H:%M" if granularity == "minute" else "%H:%M:%S"
     TIME_SYSTEM = {
         "role": "system",
         "content": (
             "【今日基准时间】: 时间信息（服务器北京时间）,用于时间推理，不得机械复述。\n"
             f"今日日期：{now.strftime('%Y-%m-%d')}\n"
             f"星期：{now.strftime('%A')}\n"
-            f"当前时间：{now.strftime('%H:%M:%S')}\n "
+            f"当前时间：{now.strftime(time_fmt)}\n "
         ),
     }
     return TIME_SYSTEM
@@ -93,6 +99,16 @@ TOOL_RULE_SYSTEM = {
     ),
 }
 
+# 请求时间预算不足、跳过搜索时的提示
+DEADLINE_NOTE_SYSTEM = {
+    "role": "system",
+    "content": (
+        "【时间预算不足】本次请求剩余时间不足，未进行联网搜索。"
+        "若问题涉及实时或近期信息，请基于已有知识简要回答，并明确告知用户该信息未经实时搜索核实、可能不是最新。"
+    ),
+}
+SEARCH_SKIPPED_RESULT = "剩余时间不足，已跳过搜索。请基于已有知识简要回答，并告知用户该信息未经实时搜索核实、可能不是最新。"
+
 # 工具描述
 TOOLS_DESC = [
     {
@@ -118,31 +134,71 @@ TOOLS_DESC = [
 ]
 
 
-# 明确“会随时间变化的主题”
-DATE_SENSITIVE_TOPICS = [
-    "天气", "新闻", "价格", "股价", "汇率",
-    "油价", "黄金", "指数", "现任",
-    "发布", "疫情", "比赛", "票房",
-    "现在", "领导人", "首相", "总统"
+# 静态规则前缀：导入时拼接一次，每个请求字节完全一致，放在 prompt 最前面以命中 vLLM 前缀缓存
+STATIC_SYSTEM_RULES = [
+    LANGUAGE_MATCH_SYSTEM,
+    FALLBACK_SYSTEM,
+    DATA_ACCURACY_SYSTEM,
+    TOOL_RULE_SYSTEM,
 ]
+STATIC_RULES_PREFIX = "\n\n".join(m["content"] for m in STATIC_SYSTEM_RULES)
+
+
+# ==================== 关键词表 ====================
+# 所有按关键词做的查询分类共用这一张表，由 keywords.py 编译成一个 Aho-Corasick 自动机，一次扫描得到全部分类
+KEYWORD_TABLE = {
+    # 明确“会随时间变化的主题”
+    "date_sensitive": [
+        "天气", "新闻", "价格", "股价", "汇率",
+        "油价", "黄金", "指数", "现任",
+        "发布", "疫情", "比赛", "票房",
+        "现在", "领导人", "首相", "总统"
+    ],
+    # 变化很快的主题（搜索结果缓存 TTL 最短），是 date_sensitive 的子集
+    "realtime": [
+        "天气", "股价", "汇率", "油价", "黄金", "指数", "价格", "比赛"
+    ],
+    # 明确“时间指示词”
+    "time_word": [
+        # 今天
+        "今天", "今日", "当日", "当天",
+        # 昨天
+        "昨天", "昨日",
+        # 明天
+        "明天", "明日",
+        # 近期
+        "最近", "近期", "近来", "这几天",
+        # 周
+        "本周", "这周", "上周", "下周",
+        # 月
+        "本月", "这个月", "上个月", "下个月",
+        # 年
+        "今年", "去年", "明年",
+    ],
+    # 天气查询
+    "weather": [
+        "天气", "气温", "温度", "下雨", "下雪", "晴天", "阴天", "多云", "降雨", "降雪", "台风", "暴雨"
+    ],
+    # 本地路由：需要搜索（对应 TOOL_RULE_SYSTEM 第 1 条；只收录几乎只出现在实时事实类问题中的词，
+    # “现在 / 最新 / 统计 / 排名 / 事件”等泛用词会误判闲聊和编程问题，不收录）
+    "search_rule": [
+        # 金融数据
+        "股价", "收盘", "开盘", "汇率", "金价", "油价", "房价", "股市", "大盘", "涨停", "跌停",
+        # 政治人物、现任职位
+        "现任", "领导人", "总统", "首相", "总理",
+        # 体育赛事
+        "赛果", "比分", "晋级", "冠军",
+        # 人物所属关系
+        "效力于", "属于哪",
+        # 新闻、近期事件
+        "新闻", "疫情", "票房",
+    ],
+}
 
-# 明确“时间指示词”
-TIME_WORDS = [
-    # 今天
-    "今天", "今日", "当日", "当天",
-    # 昨天
-    "昨天", "昨日",
-    # 明天
-    "明天", "明日",
-    # 近期
-    "最近", "近期", "近来", "这几天",
-    # 周
-    "本周", "这周", "上周", "下周",
-    # 月
-    "本月", "这个月", "上个月", "下个月",
-    # 年
-    "今年", "去年", "明年",
-]
+# 兼容旧的引用
+DATE_SENSITIVE_TOPICS = KEYWORD_TABLE["date_sensitive"]
+REALTIME_TOPICS = KEYWORD_TABLE["realtime"]
+TIME_WORDS = KEYWORD_TABLE["time_word"]
 
 
 if __name__ == "__main__":
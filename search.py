@@ -4,28 +4,44 @@ import os
 import time
 import requests
 from typing import Literal
-from config import BAIDU_URL, BAIDU_API_KEY, BOCHA_API_KEY, BOCHA_URL
+from config import BAIDU_URL, BAIDU_API_KEY, BOCHA_API_KEY, BOCHA_URL, ZHIPU_URL, ZHIPU_API_KEY
+from http_pool import get_client
+from search_format import format_references
 logger = logging.getLogger(__name__) 
 
-def search_bocha(query: str) -> dict:
-    """
-    搜索并返回简洁文本摘要
-    注意：count 固定为 3，外部入参会被忽略
-    """
-    url = BOCHA_URL
+
+def _bocha_request(query: str) -> tuple[dict, dict]:
+    """构造博查搜索请求头和请求体"""
     headers = {
         "Authorization": f"Bearer {BOCHA_API_KEY}",
         "Content-Type": "application/json",
     }
     payload = {"query": query, "freshness": "noLimit", "summary": True, "count": 5}
-    resp = requests.post(url, headers=headers, json=payload, timeout=30)
-    resp.raise_for_status()
-    pages = resp.json()["data"]["webPages"]["value"]
+    return headers, payload
+
+
+# 没有可用的搜索结果：不是成功结果，不缓存；服务商本身正常，不计入熔断
+NO_RESULT = {"code": 404, "msg": "未找到相关结果"}
+
+
+def _formatted_result(refs: list) -> dict:
+    """格式化引用，格式化后为空时返回 NO_RESULT"""
+    msg = format_references(refs)
+    if not msg:
+        return dict(NO_RESULT)
+    return {"code": 200, "msg": msg}
+
+
+def _parse_bocha_response(data: dict) -> dict:
+    """解析博查搜索返回，生成简洁文本摘要"""
+    pages = data["data"]["webPages"]["value"]
     texts = []
     for i, p in enumerate(pages, 1):
         texts.append(
             f"【引用{i}】\n标题：{p['name']}\n摘要：{p['summary']}\n"
         )
+    if not texts:
+        return dict(NO_RESULT)
     res = { 
             "code": 200,
             "msg": "\n".join(texts)
@@ -35,13 +51,29 @@ def search_bocha(query: str) -> dict:
     return res
 
 
-def search_baidu(query: str) -> dict:
+def search_bocha(query: str) -> dict:
     """
-    调用百度 Web Search 接口
-    - 正常：返回 filtered 的字符串
-    - 任意异常：返回提示信息字符串
+    搜索并返回简洁文本摘要
+    注意：count 固定为 3，外部入参会被忽略
+    """
+    headers, payload = _bocha_request(query)
+    resp = requests.post(BOCHA_URL, headers=headers, json=payload, timeout=30)
+    resp.raise_for_status()
+    return _parse_bocha_response(resp.json())
+
+
+async def async_search_bocha(query: str) -> dict:
+    """
+    search_bocha 的异步版本，使用博查的常驻连接池，不阻塞事件循环
     """
+    headers, payload = _bocha_request(query)
+    resp = await get_client("bocha").post(BOCHA_URL, headers=headers, json=payload, timeout=30)
+    resp.raise_for_status()
+    return _parse_bocha_response(resp.json())
+
 
+def _baidu_request(query: str) -> tuple[dict, bytes]:
+    """构造百度搜索请求头和请求体"""
     HEADERS = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {BAIDU_API_KEY}",
@@ -58,85 +90,177 @@ def search_baidu(query: str) -> dict:
             {"type": "aladdin", "top_k": 0},
         ],
     }
+    return HEADERS, json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def _parse_baidu_response(query: str, status_code: int, text: str, data_fn, latency: float) -> dict:
+    """
+    解析百度搜索返回（同步/异步共用）
+    - data_fn: 延迟解析 JSON 的函数，只有状态码正常时才调用
+    """
+    # ---------- 状态码判断 ----------
+    if status_code != 200:
+        res = { 
+            "code": 400,
+            "msg": "搜索繁忙"
+        }
+
+        logger.error(
+            "Baidu search failed\n"
+            "query: %s\n"
+            "status_code: %s\n"
+            "response_text: %s",
+            query,
+            status_code,
+            text
+        )
+        return res
+    
+    data = data_fn()
+    refs = data.get("references", [])
+
+    filtered = [
+        {
+            "index": r.get("id"),
+            "标题": r.get("title"),
+            "内容": r.get("content"),
+            "日期": r.get("date"),
+            "rerank_score": r.get("rerank_score"),
+            "authority_score": r.get("authority_score"),
+        }
+        for r in refs
+    ]
+
+    # 日志（保留延迟，仅用于观测）
+    logger.info(
+        json.dumps(
+            {
+                "query": query,
+                "latency_sec": round(latency, 3),
+                "status_code": status_code,
+                "response": filtered,
+            },
+            ensure_ascii=False,
+            indent=2
+        )
+    )
+    return _formatted_result(filtered)
+
+
+def _baidu_error(query: str, e: Exception) -> dict:
+    """所有异常统一兜底"""
+    res = { 
+        "code": 400,
+        "msg": "搜索异常"
+    }
+
+    logger.exception(
+        "Baidu search error\nquery: %s\nerror: %s",
+        query,
+        e
+    )
+
+    return res
 
+
+def search_baidu(query: str) -> dict:
+    """
+    调用百度 Web Search 接口
+    - 正常：返回 filtered 的字符串
+    - 任意异常：返回提示信息字符串
+    """
+    headers, body = _baidu_request(query)
     start_time = time.time()
 
     try:
         response = requests.post(
             BAIDU_URL,
-            headers=HEADERS,
-            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers=headers,
+            data=body,
             timeout=60
         )
         latency = time.time() - start_time
         response.encoding = "utf-8"
-        # ---------- 状态码判断 ----------
-        if response.status_code != 200:
-            res = { 
-                "code": 400,
-                "msg": "搜索繁忙"
-            }
+        return _parse_baidu_response(query, response.status_code, response.text, response.json, latency)
+
+    except Exception as e:
+        return _baidu_error(query, e)
+
+
+async def async_search_baidu(query: str) -> dict:
+    """
+    search_baidu 的异步版本
+    - 使用百度的常驻连接池（http_pool），复用 TCP/TLS 连接，不阻塞事件循环
+    - 返回结构与 search_baidu 一致：{"code", "msg"}
+    """
+    headers, body = _baidu_request(query)
+    start_time = time.time()
+
+    try:
+        response = await get_client("baidu").post(
+            BAIDU_URL,
+            headers=headers,
+            content=body,
+            timeout=60
+        )
+        latency = time.time() - start_time
+        response.encoding = "utf-8"
+        return _parse_baidu_response(query, response.status_code, response.text, response.json, latency)
+
+    except Exception as e:
+        return _baidu_error(query, e)
+
 
+async def async_search_zhipu(query: str) -> dict:
+    """
+    调用智谱 Web Search 接口（异步），结果格式与百度一致
+    """
+    headers = {
+        "Authorization": f"Bearer {ZHIPU_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    payload = {
+        "search_query": query,
+        "search_engine": "search_std",
+        "search_intent": False,
+        "count": 5,
+        "search_recency_filter": "noLimit",
+        "content_size": "medium",
+    }
+    start_time = time.time()
+
+    try:
+        resp = await get_client("zhipu").post(ZHIPU_URL, headers=headers, json=payload, timeout=30)
+        latency = time.time() - start_time
+        if resp.status_code != 200:
             logger.error(
-                "Baidu search failed\n"
-                "query: %s\n"
-                "status_code: %s\n"
-                "response_text: %s",
-                query,
-                response.status_code,
-                response.text
+                "Zhipu search failed\nquery: %s\nstatus_code: %s\nresponse_text: %s",
+                query, resp.status_code, resp.text
             )
-            return res
-        
-        data = response.json()
-        refs = data.get("references", [])
+            return {"code": 400, "msg": "搜索繁忙"}
 
+        results = resp.json().get("search_result") or []
         filtered = [
             {
-                "index": r.get("id"),
+                "index": i,
                 "标题": r.get("title"),
                 "内容": r.get("content"),
-                "日期": r.get("date"),
-                "rerank_score": r.get("rerank_score"),
-                "authority_score": r.get("authority_score"),
+                "日期": r.get("publish_date"),
             }
-            for r in refs
+            for i, r in enumerate(results, 1)
         ]
-
-        # 日志（保留延迟，仅用于观测）
         logger.info(
             json.dumps(
-                {
-                    "query": query,
-                    "latency_sec": round(latency, 3),
-                    "status_code": response.status_code,
-                    "response": filtered,
-                },
+                {"query": query, "provider": "zhipu", "latency_sec": round(latency, 3), "response": filtered},
                 ensure_ascii=False,
                 indent=2
             )
         )
-        res = {
-            "code": 200,
-            "msg": json.dumps(filtered, ensure_ascii=False, indent=2)
-        }
-
-        return res
+        return _formatted_result(filtered)
 
     except Exception as e:
-        # 所有异常统一兜底
-        res = { 
-            "code": 400,
-            "msg": "搜索异常"
-        }
-
-        logger.exception(
-            "Baidu search error\nquery: %s\nerror: %s",
-            query,
-            e
-        )
-
-        return res
+        logger.exception("Zhipu search error\nquery: %s\nerror: %s", query, e)
+        return {"code": 400, "msg": "搜索异常"}
 
 
 def main():
@@ -0,0 +1,186 @@
+"""
+搜索结果缓存（进程内 LRU + TTL）
+- key：经过 build_search_query / optimize_search_query 处理后的查询（再做空白归一化）
+- TTL：按主题分类（realtime 短，date_sensitive / time_word 中，其余长，见 schema.KEYWORD_TABLE）
+- 过期后的宽限期内仍可返回旧结果（stale-while-revalidate），由调用方在后台刷新
+- 统计：命中 / 未命中 / 淘汰 / 过期
+- HotKeys：按衰减计数跟踪热点查询，用于提前刷新
+"""
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    SEARCH_CACHE_GRACE,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_TTL,
+    SEARCH_HOT_KEY_DECAY,
+    SEARCH_HOT_KEYS_MAX,
+)
+import keywords
+from query_utils import should_append_date
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """缓存 key 归一化：去首尾空白、合并连续空白（含全角空格）、英文小写"""
+    return _WS_RE.sub(" ", query.replace("　", " ")).strip().lower()
+
+
+def ttl_class(query: str) -> str:
+    """按主题判断缓存时间分类"""
+    if keywords.has(query, keywords.REALTIME):
+        return "realtime"
+    if should_append_date(query):
+        return "daily"
+    return "stable"
+
+
+def ttl_for_query(query: str) -> float:
+    return SEARCH_CACHE_TTL[ttl_class(query)]
+
+
+def grace_for_query(query: str) -> float:
+    return SEARCH_CACHE_GRACE[ttl_class(query)]
+
+
+class TTLCache:
+    """
+    LRU + TTL 缓存
+    - 每个条目有独立的过期时间
+    - 超出容量时淘汰最久未使用的条目
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.grace_hits = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            # 过期条目保留到被 LRU 淘汰，供 get_stale 兜底使用
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_or_stale(self, key: str, grace: float) -> Tuple[Optional[Any], bool]:
+        """
+        返回 (value, is_stale)
+        - 未过期：(value, False)，计为命中
+        - 过期不超过 grace 秒：(value, True)，计为宽限命中，调用方应在后台刷新
+        - 否则：(None, False)
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, False
+        item = self._data.get(key)
+        if item is None or time.monotonic() - item[1] > grace:
+            return None, False
+        self._data.move_to_end(key)
+        self.grace_hits += 1
+        return item[0], True
+
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        """剩余有效时间（秒），已过期为负数，不存在返回 None"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        return item[1] - time.monotonic()
+
+    def get_stale(self, key: str, max_stale: float) -> Optional[Any]:
+        """返回过期不超过 max_stale 秒的条目（上游不可用时兜底）"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if time.monotonic() - expires_at > max_stale:
+            return None
+        self.stale_hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_hits": self.stale_hits,
+            "grace_hits": self.grace_hits,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class HotKeys:
+    """
+    热点查询跟踪：每次访问计 1 分，decay() 时整体按系数衰减
+    - 同时记录 key 对应的原始查询，提前刷新时用原始查询请求上游
+    - 最多跟踪 max_keys 个 key，已满时新 key 替换热度最低的 key（不依赖 decay() 是否运行）
+    """
+
+    def __init__(self, max_keys: int = SEARCH_HOT_KEYS_MAX, decay: float = SEARCH_HOT_KEY_DECAY):
+        self.max_keys = max_keys
+        self.decay_factor = decay
+        self._scores: Dict[str, float] = {}
+        self._queries: Dict[str, str] = {}
+
+    def touch(self, key: str, query: str) -> None:
+        if key not in self._scores and len(self._scores) >= self.max_keys:
+            coldest = min(self._scores, key=self._scores.get)
+            del self._scores[coldest]
+            del self._queries[coldest]
+        self._scores[key] = self._scores.get(key, 0.0) + 1
+        self._queries[key] = query
+
+    def decay(self) -> None:
+        """衰减热度，丢弃冷 key；超出上限时只保留最热的一半"""
+        self._scores = {k: v * self.decay_factor for k, v in self._scores.items() if v * self.decay_factor >= 0.05}
+        if len(self._scores) > self.max_keys:
+            keep = sorted(self._scores, key=self._scores.get, reverse=True)[:self.max_keys // 2]
+            self._scores = {k: self._scores[k] for k in keep}
+        self._queries = {k: self._queries[k] for k in self._scores}
+
+    def top(self, k: int) -> List[Tuple[str, str]]:
+        """最热的 k 个 (key, query)"""
+        keys = sorted(self._scores, key=self._scores.get, reverse=True)[:k]
+        return [(key, self._queries[key]) for key in keys]
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+# 进程级搜索结果缓存
+search_cache = TTLCache(SEARCH_CACHE_MAX_ENTRIES)
+hot_keys = HotKeys()
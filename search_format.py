@@ -0,0 +1,126 @@
+"""
+搜索结果格式化（紧凑、按 token 预算裁剪）
+- 按 rerank_score / authority_score / 日期 排序
+- 去掉重复和近似重复的引用（标题相同或内容 3-gram Jaccard 过高）
+- 按 token 预算裁剪每条摘要，输出紧凑的引用格式：
+    [1] 标题（日期）
+    内容
+"""
+import re
+from typing import Any, Dict, List
+
+from config import SEARCH_RESULT_TOKEN_BUDGET, SEARCH_DEDUP_THRESHOLD
+
+_CJK_RE = re.compile(r"[　-〿㐀-鿿豈-﫿＀-￯]")
+_WS_RE = re.compile(r"\s+")
+_SENTENCE_END = "。！？；!?;"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符及全角符号约 1 token / 字，其余约 4 字符 / token"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    text = _WS_RE.sub("", text)
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _rank_key(ref: Dict[str, Any]):
+    return (
+        ref.get("rerank_score") or 0,
+        ref.get("authority_score") or 0,
+        ref.get("日期") or "",
+    )
+
+
+def dedupe(refs: List[Dict[str, Any]], threshold: float = SEARCH_DEDUP_THRESHOLD) -> List[Dict[str, Any]]:
+    """去重：保留排序靠前的条目"""
+    kept: List[Dict[str, Any]] = []
+    kept_titles = set()
+    kept_shingles: List[set] = []
+
+    for ref in refs:
+        title = _WS_RE.sub("", ref.get("标题") or "")
+        content = ref.get("内容") or ""
+        if not content.strip():
+            continue
+        if title and title in kept_titles:
+            continue
+        sh = _shingles(content)
+        if any(_jaccard(sh, other) >= threshold for other in kept_shingles):
+            continue
+
+        kept.append(ref)
+        kept_titles.add(title)
+        kept_shingles.append(sh)
+    return kept
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """按 token 预算截断，尽量在句末截断"""
+    text = _WS_RE.sub(" ", text).strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    used = 0
+    cut = 0
+    for i, ch in enumerate(text):
+        used += 1 if _CJK_RE.match(ch) else 0.25
+        if used > max_tokens:
+            break
+        cut = i + 1
+
+    head = text[:cut]
+    # 截断点之前 30% 范围内有句末标点，则在句末截断
+    end = max(head.rfind(p) for p in _SENTENCE_END)
+    if end >= int(cut * 0.7):
+        return head[:end + 1]
+    return head + "…"
+
+
+def _allocate(sizes: List[int], budget: int) -> List[int]:
+    """按“注水”方式分配预算：短摘要完整保留，剩余预算平分给长摘要"""
+    alloc = [0] * len(sizes)
+    remaining = budget
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for pos, i in enumerate(order):
+        share = remaining // (len(sizes) - pos)
+        alloc[i] = min(sizes[i], share)
+        remaining -= alloc[i]
+    return alloc
+
+
+def format_references(refs: List[Dict[str, Any]], token_budget: int = SEARCH_RESULT_TOKEN_BUDGET) -> str:
+    """
+    refs: search_baidu 中 filtered 结构（标题 / 内容 / 日期 / rerank_score / authority_score）
+    """
+    ranked = dedupe(sorted(refs, key=_rank_key, reverse=True))
+    if not ranked:
+        return ""
+
+    headers = []
+    for i, ref in enumerate(ranked, 1):
+        date = (ref.get("日期") or "")[:10]
+        title = _WS_RE.sub(" ", ref.get("标题") or "").strip()
+        headers.append(f"[{i}] {title}（{date}）" if date else f"[{i}] {title}")
+
+    # 标题行优先，剩余预算分给摘要
+    body_budget = max(token_budget - sum(estimate_tokens(h) + 1 for h in headers), 0)
+    contents = [_WS_RE.sub(" ", ref.get("内容") or "").strip() for ref in ranked]
+    alloc = _allocate([estimate_tokens(c) for c in contents], body_budget)
+
+    blocks = []
+    for header, content, n in zip(headers, contents, alloc):
+        snippet = trim_to_tokens(content, n) if n > 0 else ""
+        blocks.append(f"{header}\n{snippet}" if snippet else header)
+    return "\n\n".join(blocks)
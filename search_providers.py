@@ -0,0 +1,161 @@
+"""
+搜索服务商抽象与注册表
+- 所有服务商实现统一的异步接口 search(query) -> {"code", "msg"}
+- 每个服务商记录自己的延迟直方图（只含成功请求），用于自动计算对冲等待时间和单次请求超时
+- 每个服务商一个熔断器，熔断期间直接快速失败
+- 每个服务商一个令牌桶限流器，排队时间受调用方截止时间约束
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from circuit_breaker import CircuitBreaker
+from config import (
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MAX_DELAY,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+    SEARCH_TIMEOUT_DEFAULT,
+    SEARCH_TIMEOUT_MAX,
+    SEARCH_TIMEOUT_MIN,
+    SEARCH_RATE_LIMIT,
+    SEARCH_RATE_LIMIT_MAX_WAIT,
+    SEARCH_TIMEOUT_MULTIPLIER,
+)
+from metrics import LatencyHistogram
+from rate_limiter import TokenBucket
+from search import NO_RESULT, async_search_baidu, async_search_bocha, async_search_zhipu
+
+logger = logging.getLogger(__name__)
+
+
+class SearchProvider:
+    """搜索服务商：包装一个异步搜索函数，统一异常处理、超时、熔断、限流和延迟统计"""
+
+    def __init__(self, name: str, fn: Callable[[str], Awaitable[dict]], rate_limit: Optional[dict] = None):
+        self.name = name
+        self._fn = fn
+        # 成功请求的延迟，用于对冲等待时间和超时；失败（超时、异常）单独统计，不拉高 p95
+        self.latency = LatencyHistogram()
+        self.error_latency = LatencyHistogram()
+        self.breaker = CircuitBreaker(name)
+        rate_limit = rate_limit if rate_limit is not None else SEARCH_RATE_LIMIT.get(name)
+        self.limiter = TokenBucket(name, **rate_limit) if rate_limit else None
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def available(self) -> bool:
+        return self.breaker.available()
+
+    async def search(self, query: str, deadline: Optional[float] = None) -> dict:
+        """
+        deadline: 调用方的截止时间（time.monotonic() 时间点），用于限制排队和请求超时
+        """
+        if not self.breaker.allow():
+            return {"code": 503, "msg": "搜索服务熔断"}
+
+        if deadline is None:
+            deadline = time.monotonic() + SEARCH_RATE_LIMIT_MAX_WAIT + self.timeout()
+        if self.limiter is not None:
+            try:
+                acquired = await self.limiter.acquire(deadline)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            if not acquired:
+                # 本地限流拒绝，不代表服务商故障，不计入熔断统计
+                self.breaker.release()
+                return {"code": 429, "msg": "搜索繁忙"}
+
+        self.calls += 1
+        start = time.monotonic()
+        timeout = self.timeout()
+        deadline_bound = deadline - start < timeout
+        try:
+            res = await asyncio.wait_for(self._fn(query), timeout=max(min(timeout, deadline - start), 0))
+        except asyncio.TimeoutError:
+            logger.warning("%s search timeout\nquery: %s", self.name, query)
+            self.timeouts += 1
+            if deadline_bound:
+                # 调用方时间不够导致的超时，不计入熔断和延迟统计
+                self.breaker.release()
+                return {"code": 504, "msg": "搜索超时"}
+            res = {"code": 504, "msg": "搜索超时"}
+        except asyncio.CancelledError:
+            # 对冲请求中被取消的一方，不计入统计，归还探测名额
+            self.breaker.release()
+            raise
+        except Exception as e:
+            logger.exception("%s search error\nquery: %s\nerror: %s", self.name, query, e)
+            res = {"code": 400, "msg": "搜索异常"}
+
+        latency = time.monotonic() - start
+        # 无结果是服务商的正常应答，不计入熔断和错误统计
+        ok = res.get("code") in (200, NO_RESULT["code"])
+        self.breaker.record(ok, latency)
+        if ok:
+            self.latency.observe(latency)
+        else:
+            self.error_latency.observe(latency)
+            self.errors += 1
+        return res
+
+    def timeout(self) -> float:
+        """自适应超时：最近延迟 p99 的若干倍（样本不足时用默认值），限制在上下限之间"""
+        p99 = self.latency.percentile(99) if len(self.latency) >= HEDGE_MIN_SAMPLES else None
+        timeout = p99 * SEARCH_TIMEOUT_MULTIPLIER if p99 is not None else SEARCH_TIMEOUT_DEFAULT
+        return min(max(timeout, SEARCH_TIMEOUT_MIN), SEARCH_TIMEOUT_MAX)
+
+    def hedge_delay(self) -> float:
+        """对冲等待时间：最近延迟的 p95（样本不足时用默认值），限制在上下限之间"""
+        p95 = self.latency.percentile(95) if len(self.latency) >= HEDGE_MIN_SAMPLES else None
+        delay = p95 if p95 is not None else HEDGE_DEFAULT_DELAY
+        return min(max(delay, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "timeout": round(self.timeout(), 3),
+            "hedge_delay": round(self.hedge_delay(), 3),
+            "breaker": self.breaker.stats(),
+            "rate_limit": self.limiter.stats() if self.limiter is not None else None,
+            "latency": self.latency.stats(),
+            "error_latency": self.error_latency.stats(),
+        }
+
+
+_registry: Dict[str, SearchProvider] = {}
+
+
+def register_provider(provider: SearchProvider) -> SearchProvider:
+    """注册服务商（同名覆盖）"""
+    _registry[provider.name] = provider
+    return provider
+
+
+def get_provider(name: str) -> SearchProvider:
+    try:
+        return _registry[name]
+    except KeyError:
+        raise ValueError(f"Unknown search provider: {name}")
+
+
+def list_providers() -> List[str]:
+    return list(_registry)
+
+
+def breaker_states() -> Dict[str, dict]:
+    return {name: p.breaker.stats() for name, p in _registry.items()}
+
+
+def stats() -> Dict[str, dict]:
+    return {name: p.stats() for name, p in _registry.items()}
+
+
+register_provider(SearchProvider("baidu", async_search_baidu))
+register_provider(SearchProvider("bocha", async_search_bocha))
+register_provider(SearchProvider("zhipu", async_search_zhipu))
@@ -0,0 +1,199 @@
+"""
+本地搜索必要性路由
+- 在第一轮 LLM 之前，对最后一条用户消息打分，判断是否需要 search
+  1. 规则：关键词表 search_rule 分类（人工挑选）加少量正则（数量类问法、无需搜索的整句），
+     命中需要搜索的规则只是弱信号，单独不足以直接搜索
+  2. 线性模型：字符 n-gram 哈希特征 + 逻辑回归（纯 CPU，可离线训练）
+- 最近 5 轮对话中已调用过 search 时不直接搜索，交给模型按 TOOL_RULE_SYSTEM 第 2 条判断是否复用
+- 置信度高：直接 搜索 + 回答，或直接回答（不带工具）
+- 置信度低：回退到原有的两轮流程
+"""
+import json
+import logging
+import math
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import keywords
+import metrics
+from config import ROUTER_MODEL_PATH, ROUTER_SEARCH_THRESHOLD, ROUTER_ANSWER_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== 规则 ====================
+# 关键词表 search_rule 分类是人工挑选的、只在实时事实类问题中出现的词（见 schema.KEYWORD_TABLE）；
+# 规则只是弱信号：命中时得分低于 ROUTER_SEARCH_THRESHOLD，需要模型同样判断为搜索才会直接搜索
+RULE_SEARCH_SCORE = 0.75
+RULE_ANSWER_SCORE = 0.1
+
+# 关键词表无法表达的数量类问法
+SEARCH_PATTERN_RE = re.compile(r"多少[个家座种所条]|几[个家座]")
+
+# 询问时间 / 日期 / 星期、打招呼、致谢等：直接回答（TOOL_RULE_SYSTEM 第 3 条）
+NO_SEARCH_RULE_RE = re.compile(
+    r"^\s*(现在|今天|明天|昨天)?(是)?(几点|几号|星期几|周几|礼拜几|什么日子|(几月)?几日|(什么)?(时间|日期|星期))"
+    r"[了呀啊吗？?。！!]*\s*$"
+    r"|^\s*(你好|您好|嗨|hi|hello|在吗|在不在|谢谢|多谢|好的|嗯|哈哈|再见|拜拜)[呀啊吗！!。，,~～]*\s*$",
+    re.IGNORECASE,
+)
+
+
+def rule_score(text: str) -> Optional[float]:
+    """规则打分：命中需要搜索返回 RULE_SEARCH_SCORE，命中无需搜索返回 RULE_ANSWER_SCORE，都未命中返回 None"""
+    if NO_SEARCH_RULE_RE.search(text):
+        return RULE_ANSWER_SCORE
+    categories = keywords.classify(text)
+    if keywords.SEARCH_RULE in categories or keywords.WEATHER in categories or SEARCH_PATTERN_RE.search(text):
+        return RULE_SEARCH_SCORE
+    return None
+
+
+# ==================== 线性模型 ====================
+
+class LinearRouter:
+    """
+    字符 n-gram 哈希特征 + 逻辑回归
+    - 特征：1~3 字符 n-gram，哈希到 n_features 维
+    - 训练：SGD，纯 Python，样本量在万级以内足够快
+    """
+
+    def __init__(self, n_features: int = 1 << 16, ngram: int = 3):
+        self.n_features = n_features
+        self.ngram = ngram
+        self.weights: Dict[int, float] = {}
+        self.bias = 0.0
+
+    def features(self, text: str) -> Dict[int, float]:
+        text = text.strip().lower()
+        feats: Dict[int, float] = {}
+        for n in range(1, self.ngram + 1):
+            for i in range(len(text) - n + 1):
+                h = zlib.crc32(text[i:i + n].encode("utf-8")) % self.n_features
+                feats[h] = feats.get(h, 0.0) + 1.0
+        # 长度归一化，避免长文本得分偏大
+        norm = math.sqrt(sum(v * v for v in feats.values())) or 1.0
+        return {k: v / norm for k, v in feats.items()}
+
+    def predict_proba(self, text: str) -> float:
+        z = self.bias + sum(self.weights.get(k, 0.0) * v for k, v in self.features(text).items())
+        z = max(-30.0, min(30.0, z))
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def fit(self, samples: Iterable[Tuple[str, int]], epochs: int = 10, lr: float = 0.5, l2: float = 1e-5) -> None:
+        data = [(self.features(t), y) for t, y in samples]
+        for _ in range(epochs):
+            for feats, y in data:
+                z = self.bias + sum(self.weights.get(k, 0.0) * v for k, v in feats.items())
+                z = max(-30.0, min(30.0, z))
+                grad = 1.0 / (1.0 + math.exp(-z)) - y
+                self.bias -= lr * grad
+                for k, v in feats.items():
+                    w = self.weights.get(k, 0.0)
+                    self.weights[k] = w - lr * (grad * v + l2 * w)
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "n_features": self.n_features,
+                "ngram": self.ngram,
+                "bias": self.bias,
+                "weights": {str(k): round(v, 6) for k, v in self.weights.items() if abs(v) > 1e-6},
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearRouter":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        model = cls(data["n_features"], data["ngram"])
+        model.bias = data["bias"]
+        model.weights = {int(k): v for k, v in data["weights"].items()}
+        return model
+
+
+def _load_model() -> Optional[LinearRouter]:
+    if not ROUTER_MODEL_PATH or not os.path.exists(ROUTER_MODEL_PATH):
+        return None
+    try:
+        return LinearRouter.load(ROUTER_MODEL_PATH)
+    except Exception as e:
+        logger.warning("路由模型加载失败 path=%s error=%s", ROUTER_MODEL_PATH, e)
+        return None
+
+
+linear_model = _load_model()
+
+
+# ==================== 路由决策 ====================
+
+@dataclass
+class RouteDecision:
+    action: str              # "search" | "answer" | "fallback"
+    score: float             # 需要搜索的概率
+    query: Optional[str] = None
+
+
+def last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            return (msg.get("content") or "").strip()
+    return ""
+
+
+def recent_search(messages: List[Dict[str, Any]], rounds: int = 5) -> bool:
+    """最后一条用户消息之前的最近 rounds 轮对话中是否调用过 search"""
+    seen_users = 0
+    for msg in reversed(messages):
+        role = msg.get("role")
+        if role == "user":
+            seen_users += 1
+            if seen_users > rounds:
+                return False
+        elif seen_users and (role == "tool" or msg.get("tool_calls")):
+            return True
+    return False
+
+
+def score(text: str, model: Optional[LinearRouter] = None) -> Optional[float]:
+    """综合打分：规则与模型取平均；都没有信号时返回 None"""
+    model = model if model is not None else linear_model
+    scores = []
+    r = rule_score(text)
+    if r is not None:
+        scores.append(r)
+    if model is not None:
+        scores.append(model.predict_proba(text))
+    if not scores:
+        return None
+    return sum(scores) / len(scores)
+
+
+def route(
+    messages: List[Dict[str, Any]],
+    location_city: Optional[str] = None,
+    model: Optional[LinearRouter] = None,
+) -> RouteDecision:
+    """对最后一条用户消息做路由决策"""
+    text = last_user_text(messages)
+    p = score(text, model) if text else None
+
+    if p is None:
+        decision = RouteDecision("fallback", 0.5)
+    elif p >= ROUTER_SEARCH_THRESHOLD and recent_search(messages):
+        # 最近已搜索过：是否复用已有结果由模型判断
+        decision = RouteDecision("fallback", p)
+    elif p >= ROUTER_SEARCH_THRESHOLD:
+        query = text
+        if location_city and keywords.has(text, keywords.WEATHER) and location_city not in text:
+            query = f"{location_city} {text}"
+        decision = RouteDecision("search", p, query)
+    elif p <= ROUTER_ANSWER_THRESHOLD:
+        decision = RouteDecision("answer", p)
+    else:
+        decision = RouteDecision("fallback", p)
+
+    metrics.incr(f"router_{decision.action}")
+    return decision
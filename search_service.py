@@ -0,0 +1,344 @@
+"""
+搜索服务入口（聊天处理逻辑只调用这里）
+- 先查内存缓存，内存未命中或已过期时再查持久化缓存（SQLite，多 worker 共享），都未命中再请求搜索服务商
+- 相同查询的并发请求合并为一次上游调用（singleflight）
+- 主服务商超过 p95 延迟未返回时，对冲请求备用服务商，取先成功的结果
+- 服务商限流排队受调用方截止时间约束，等不及时与失败一样走过期缓存
+- 熔断中的服务商跳过，依次改用备用服务商；全部不可用时返回过期缓存或快速失败
+- 精确缓存未命中时，查找措辞不同、意图相同的已缓存查询（近似重复缓存）
+- 只缓存成功结果
+- 缓存过期后宽限期内先返回旧结果，后台刷新（stale-while-revalidate）
+- 后台定期提前刷新最热的 top-K 查询，只在服务商令牌桶有余量时进行
+- “某城市某一天的天气”按 (城市, 日期) 走天气缓存，后台预取常见 location 城市当天的天气
+"""
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Optional, Set
+
+import metrics
+import search_providers
+from disk_cache import disk_cache
+from config import (
+    SEARCH_FALLBACKS,
+    SEARCH_PRIMARY,
+    SEARCH_REFRESH_AHEAD_ENABLED,
+    SEARCH_REFRESH_AHEAD_RATIO,
+    SEARCH_REFRESH_INTERVAL,
+    SEARCH_REFRESH_MIN_TOKENS,
+    SEARCH_REFRESH_TOP_K,
+    SEARCH_SECONDARY,
+    SEARCH_STALE_MAX_AGE,
+    SEMANTIC_CACHE_ENABLED,
+    WEATHER_CACHE_ENABLED,
+    WEATHER_CACHE_TTL,
+    WEATHER_PREFETCH_ENABLED,
+    WEATHER_PREFETCH_INTERVAL,
+    WEATHER_PREFETCH_TOP_K,
+)
+from search_cache import grace_for_query, hot_keys, normalize_query, search_cache, ttl_for_query
+from semantic_cache import semantic_index
+from singleflight import SingleFlight
+from weather_cache import WeatherKey, weather_cache, weather_key
+
+logger = logging.getLogger(__name__)
+
+# 进程级的搜索请求合并
+search_flight = SingleFlight()
+
+# 后台刷新任务（持有引用，避免被回收）
+_background: Set[asyncio.Task] = set()
+_refresher: Optional[asyncio.Task] = None
+_weather_prefetcher: Optional[asyncio.Task] = None
+
+
+def _pick_providers():
+    """按 主 -> 备用 -> 兜底 的顺序，选出前两个未熔断的服务商"""
+    names = [SEARCH_PRIMARY, SEARCH_SECONDARY, *SEARCH_FALLBACKS]
+    chosen = []
+    for name in dict.fromkeys(n for n in names if n):
+        provider = search_providers.get_provider(name)
+        if provider.available():
+            chosen.append(provider)
+        if len(chosen) == 2:
+            break
+    return chosen
+
+
+async def hedged_search(query: str, deadline: Optional[float] = None) -> dict:
+    """
+    对冲请求：
+    - 先请求主服务商，等待其 p95 延迟
+    - 仍未返回则同时请求备用服务商，取先成功返回的结果，取消另一个
+    - 主服务商提前失败时直接改用备用服务商
+    - 熔断中的服务商被跳过，由后面的服务商顶上
+    - deadline: 调用方截止时间（time.monotonic() 时间点），传给各服务商用于限流排队和超时
+    """
+    providers = _pick_providers()
+    if not providers:
+        metrics.incr("search_all_breakers_open")
+        return {"code": 503, "msg": "搜索服务熔断"}
+    if len(providers) == 1 or not SEARCH_SECONDARY:
+        return await providers[0].search(query, deadline)
+    primary, secondary = providers
+
+    primary_task = asyncio.create_task(primary.search(query, deadline))
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=primary.hedge_delay())
+    except asyncio.CancelledError:
+        # 调用方在对冲等待期间被取消：主服务商请求不能留在后台
+        primary_task.cancel()
+        raise
+    if primary_task in done:
+        res = primary_task.result()
+        if res.get("code") == 200:
+            return res
+        metrics.incr("hedge_failover")
+        return await secondary.search(query, deadline)
+
+    metrics.incr("hedge_fired")
+    tasks = {
+        primary_task: primary.name,
+        asyncio.create_task(secondary.search(query, deadline)): secondary.name,
+    }
+    pending = set(tasks)
+    res = {"code": 400, "msg": "搜索异常"}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                res = task.result()
+                if res.get("code") == 200:
+                    metrics.incr(f"hedge_won_{tasks[task]}")
+                    return res
+        return res
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _fetch(query: str, key: str, deadline: Optional[float]) -> dict:
+    """请求上游并写入缓存"""
+    res = await hedged_search(query, deadline)
+    if res.get("code") == 200:
+        ttl = ttl_for_query(key)
+        search_cache.set(key, res, ttl)
+        if SEMANTIC_CACHE_ENABLED:
+            semantic_index.add(key, query)
+        if disk_cache is not None:
+            await disk_cache.set(key, res, ttl)
+    return res
+
+
+async def _load_from_disk(key: str) -> None:
+    """
+    从持久化缓存回填内存（保留原过期时间，过期条目可用于宽限期和兜底）
+    - 只在磁盘条目比内存条目更晚过期时覆盖：其他 worker 可能已经刷新过同一查询
+    """
+    if disk_cache is None:
+        return
+    item = await disk_cache.get(key)
+    if item is not None:
+        value, expires_at = item
+        ttl = expires_at - time.time()
+        remaining = search_cache.ttl_remaining(key)
+        if remaining is None or ttl > remaining:
+            search_cache.set(key, value, ttl)
+
+
+async def run_search(query: str, deadline: Optional[float] = None) -> dict:
+    """
+    执行搜索，返回结构与 search_baidu 一致：{"code", "msg"}
+    - query: 已经过 build_search_query / optimize_search_query 处理的查询
+    - deadline: 调用方截止时间（time.monotonic() 时间点），相同查询合并时以首个调用方为准
+    """
+    if WEATHER_CACHE_ENABLED:
+        wkey = weather_key(query)
+        if wkey is not None:
+            return await _weather_search(wkey, deadline)
+    return await _run_search(query, deadline)
+
+
+async def _weather_search(wkey: WeatherKey, deadline: Optional[float]) -> dict:
+    """天气查询：先查天气缓存，未命中时用统一的 query 走通用搜索流程并回填"""
+    cached = weather_cache.get(wkey)
+    if cached is not None:
+        logger.info("weather cache hit: %s", wkey.cache_key)
+        return cached
+    res = await _run_search(wkey.query, deadline)
+    if res.get("code") == 200:
+        weather_cache.set(wkey, res)
+    return res
+
+
+async def _run_search(query: str, deadline: Optional[float]) -> dict:
+    key = normalize_query(query)
+    hot_keys.touch(key, query)
+
+    cached, is_stale = search_cache.get_or_stale(key, grace_for_query(key))
+    if cached is None or is_stale:
+        # 内存中没有、已过宽限期或已过期：其他 worker 可能已写入更新的结果，先查持久化缓存
+        await _load_from_disk(key)
+        cached, is_stale = search_cache.get_or_stale(key, grace_for_query(key))
+    if cached is not None:
+        if is_stale:
+            logger.info("search cache stale hit, revalidating: %s", key)
+            _revalidate(query, key)
+        else:
+            logger.info("search cache hit: %s", key)
+        return cached
+
+    if SEMANTIC_CACHE_ENABLED:
+        near = _lookup_near_duplicate(query, key)
+        if near is not None:
+            return near
+
+    res = await search_flight.do(key, lambda: _fetch(query, key, deadline))
+    if res.get("code") != 200:
+        stale = search_cache.get_stale(key, SEARCH_STALE_MAX_AGE)
+        if stale is not None:
+            logger.warning("search failed, serving stale cache: %s", key)
+            return stale
+    return res
+
+
+def _lookup_near_duplicate(query: str, key: str) -> Optional[dict]:
+    """近似重复查询：只返回未过期的结果"""
+    match = semantic_index.lookup(query, exclude=key)
+    if match is None:
+        return None
+    near_key, similarity = match
+    value = search_cache.get(near_key)
+    if value is None:
+        semantic_index.remove(near_key)
+        return None
+    metrics.incr("semantic_cache_hit")
+    logger.info("search semantic cache hit: %s -> %s (%.2f)", key, near_key, similarity)
+    return value
+
+
+def _revalidate(query: str, key: str) -> None:
+    """后台刷新缓存（与前台相同查询合并）"""
+    metrics.incr("search_revalidate")
+    task = asyncio.create_task(search_flight.do(key, lambda: _fetch(query, key, None)))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def _refresh_budget() -> int:
+    """
+    本轮最多可发起的后台刷新数：首选服务商令牌桶当前余量扣除 SEARCH_REFRESH_MIN_TOKENS（留给用户请求），
+    有用户请求在排队时为 0；提前刷新不能挤占用户请求
+    """
+    providers = _pick_providers()
+    if not providers:
+        return 0
+    limiter = providers[0].limiter
+    if limiter is None:
+        return SEARCH_REFRESH_TOP_K
+    if limiter.queue_depth:
+        return 0
+    return max(int(limiter.headroom() - SEARCH_REFRESH_MIN_TOKENS), 0)
+
+
+def _has_headroom() -> bool:
+    """首选服务商的令牌桶是否还能容纳一次后台请求（天气预取逐个等待请求完成，每次请求前检查）"""
+    return _refresh_budget() > 0
+
+
+def refresh_ahead_once() -> int:
+    """
+    检查最热的 top-K 查询，剩余 TTL 不足一定比例时提前刷新，返回本轮刷新数
+    - 刷新只是创建后台任务，循环中令牌还没被消耗，刷新数上限在开始时按令牌余量一次算好
+    """
+    budget = _refresh_budget()
+    refreshed = 0
+    for key, query in hot_keys.top(SEARCH_REFRESH_TOP_K):
+        remaining = search_cache.ttl_remaining(key)
+        if remaining is None or search_flight.waiters(key):
+            continue
+        if remaining > ttl_for_query(key) * SEARCH_REFRESH_AHEAD_RATIO:
+            continue
+        if refreshed >= budget:
+            metrics.incr("search_refresh_ahead_skipped")
+            break
+        metrics.incr("search_refresh_ahead")
+        _revalidate(query, key)
+        refreshed += 1
+    hot_keys.decay()
+    return refreshed
+
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(SEARCH_REFRESH_INTERVAL)
+        try:
+            refresh_ahead_once()
+        except Exception as e:
+            logger.exception("refresh ahead error: %s", e)
+
+
+async def prefetch_weather_once() -> int:
+    """
+    预取常见 location 城市当天的天气（剩余 TTL 不足一定比例或不存在时），返回本轮预取数
+    - 逐个请求，每次请求前检查令牌桶余量，不挤占用户请求
+    """
+    today = date.today()
+    prefetched = 0
+    for city, place in weather_cache.top_cities(WEATHER_PREFETCH_TOP_K):
+        wkey = WeatherKey(city, place, today)
+        remaining = weather_cache.ttl_remaining(wkey)
+        if remaining is not None and remaining > WEATHER_CACHE_TTL * SEARCH_REFRESH_AHEAD_RATIO:
+            continue
+        key = normalize_query(wkey.query)
+        if search_flight.waiters(key):
+            continue
+        if not _has_headroom():
+            metrics.incr("weather_prefetch_skipped")
+            break
+        metrics.incr("weather_prefetch")
+        res = await search_flight.do(key, lambda: _fetch(wkey.query, key, None))
+        if res.get("code") == 200:
+            weather_cache.set(wkey, res)
+            prefetched += 1
+    weather_cache.cities.decay()
+    return prefetched
+
+
+async def _weather_prefetch_loop() -> None:
+    while True:
+        await asyncio.sleep(WEATHER_PREFETCH_INTERVAL)
+        try:
+            await prefetch_weather_once()
+        except Exception as e:
+            logger.exception("weather prefetch error: %s", e)
+
+
+def start_refresh_ahead() -> None:
+    """启动热点查询提前刷新和天气预取（服务启动时调用）"""
+    global _refresher, _weather_prefetcher
+    if SEARCH_REFRESH_AHEAD_ENABLED and _refresher is None:
+        _refresher = asyncio.create_task(_refresh_loop())
+    if WEATHER_CACHE_ENABLED and WEATHER_PREFETCH_ENABLED and _weather_prefetcher is None:
+        _weather_prefetcher = asyncio.create_task(_weather_prefetch_loop())
+
+
+async def stop_refresh_ahead() -> None:
+    """停止提前刷新、天气预取，并取消未完成的后台刷新（服务退出时调用）"""
+    global _refresher, _weather_prefetcher
+    tasks = [t for t in [_refresher, _weather_prefetcher, *_background] if t is not None]
+    _refresher = None
+    _weather_prefetcher = None
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+metrics.register_collector("search_cache", search_cache.stats)
+metrics.register_collector("search_singleflight", search_flight.stats)
+metrics.register_collector("search_providers", search_providers.stats)
+metrics.register_collector("search_semantic_cache", semantic_index.stats)
+metrics.register_collector("weather_cache", weather_cache.stats)
+if disk_cache is not None:
+    metrics.register_collector("search_disk_cache", disk_cache.stats)
@@ -0,0 +1,202 @@
+"""
+近似重复查询缓存（MinHash + LSH，纯 Python）
+模型生成的搜索 query 措辞不同但意图相同，如：
+    "广西钦州 今日天气"  vs  "今日天气 广西壮族自治区钦州市"
+精确 key 缓存无法命中，这里在精确缓存之后再做一次近似查找：
+- 规范化：日期统一为 YYYYMMDD，与 明日/昨日 等相对时间词、数字一起作为“锚点”单独比较
+  （锚点不同一律不命中，避免把明天的天气、去年的数据当成今天的）；
+  地名由地名表解析为短名（广西钦州）并前置；去掉标点、空白；同义词归一
+- 相似度：规范化文本的字符 1-gram + 2-gram 集合（1-gram 对词序不敏感），
+  MinHash 签名 + LSH 分桶取候选，再用精确 Jaccard 校验
+- 阈值按主题分类（与缓存 TTL 分类一致）配置
+"""
+import random
+import re
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from config import SEMANTIC_CACHE_BANDS, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLDS
+from gazetteer import locate
+from search_cache import ttl_class
+
+# ---------- 规范化 ----------
+
+_DATE_SUFFIX_RE = re.compile(r"[，,]?\s*[（(]今日日期[:：]\s*(\d{4})-(\d{1,2})-(\d{1,2})[)）]")
+_DATE_RES = [
+    re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})"),
+    re.compile(r"(\d{4})年(\d{1,2})月(\d{1,2})[日号]"),
+]
+_RELATIVE_DAYS = [
+    ("大后天", "+3"), ("后天", "+2"), ("明天", "+1"), ("明日", "+1"),
+    ("大前天", "-3"), ("前天", "-2"), ("昨天", "-1"), ("昨日", "-1"),
+]
+_NUM_RE = re.compile(r"\d+(?:\.\d+)?")
+_PUNCT_RE = re.compile(r"[\s\W_]+")
+_SYNONYMS = [
+    ("今天", "今日"), ("当天", "今日"), ("当日", "今日"),
+    ("怎么样", ""), ("如何", ""), ("多少", ""), ("查询", ""), ("最新", ""), ("情况", ""),
+]
+
+
+def _extract_anchors(query: str) -> Tuple[str, FrozenSet[str]]:
+    """提取日期、相对时间词和数字，返回 (剩余文本, 锚点集合)"""
+    anchors = set()
+
+    def date_repl(m):
+        y, mo, d = m.groups()
+        anchors.add(f"{y}{int(mo):02d}{int(d):02d}")
+        return " "
+
+    query = _DATE_SUFFIX_RE.sub(date_repl, query)
+    for pattern in _DATE_RES:
+        query = pattern.sub(date_repl, query)
+    for word, anchor in _RELATIVE_DAYS:
+        if word in query:
+            anchors.add(anchor)
+            query = query.replace(word, " ")
+    for num in _NUM_RE.findall(query):
+        anchors.add(num)
+    query = _NUM_RE.sub(" ", query)
+    return query, frozenset(anchors)
+
+
+def canonicalize(query: str) -> Tuple[str, FrozenSet[str]]:
+    """返回 (规范化文本, 锚点集合)"""
+    text, anchors = _extract_anchors(query)
+
+    # 地名用地名表解析，去掉原文中的地名后以短名（广西钦州）前置
+    loc, spans = locate(text)
+    location = loc.key or ""
+    for start, end in reversed(spans):
+        text = text[:start] + " " + text[end:]
+
+    for src, dst in _SYNONYMS:
+        text = text.replace(src, dst)
+    text = _PUNCT_RE.sub("", text)
+    return location + text, anchors
+
+
+# ---------- MinHash / LSH ----------
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _shingles(text: str) -> FrozenSet[str]:
+    """字符 1-gram + 2-gram"""
+    return frozenset(text) | frozenset(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """num_perm 个 (a * x + b) mod p 哈希函数，系数由固定种子生成，跨进程一致"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 20260108):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._coeffs = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shingles: FrozenSet[str]) -> Tuple[int, ...]:
+        values = [zlib.crc32(s.encode("utf-8")) for s in shingles] or [0]
+        return tuple(
+            min(((a * v + b) % _PRIME) & _MAX_HASH for v in values)
+            for a, b in self._coeffs
+        )
+
+
+class SemanticIndex:
+    """
+    近似查询索引：cache key -> (锚点集合, 主题分类, n-gram 集合, 签名)
+    - LSH：签名分成 bands 段，任一段完全相同即为候选
+    - 容量有限，超出时淘汰最早加入的条目
+    """
+
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, bands: int = SEMANTIC_CACHE_BANDS,
+                 num_perm: int = 64, thresholds: Optional[Dict[str, float]] = None):
+        assert num_perm % bands == 0
+        self.max_entries = max_entries
+        self.thresholds = thresholds or SEMANTIC_CACHE_THRESHOLDS
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._buckets: List[Dict[Tuple[int, ...], set]] = [{} for _ in range(bands)]
+        self.lookups = 0
+        self.hits = 0
+
+    def _band_keys(self, sig: Tuple[int, ...]):
+        for i in range(self.bands):
+            yield i, sig[i * self.rows:(i + 1) * self.rows]
+
+    def add(self, key: str, query: str) -> None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        text, anchors = canonicalize(query)
+        shingles = _shingles(text)
+        sig = self._hasher.signature(shingles)
+        self._entries[key] = (anchors, ttl_class(query), shingles, sig)
+        for i, band in self._band_keys(sig):
+            self._buckets[i].setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self.remove(next(iter(self._entries)))
+
+    def remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for i, band in self._band_keys(entry[3]):
+            bucket = self._buckets[i].get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[i][band]
+
+    def lookup(self, query: str, exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """返回最相似且超过主题阈值的 (key, 相似度)，没有则返回 None"""
+        self.lookups += 1
+        text, anchors = canonicalize(query)
+        shingles = _shingles(text)
+        if not shingles:
+            return None
+        topic = ttl_class(query)
+        threshold = self.thresholds[topic]
+        sig = self._hasher.signature(shingles)
+
+        candidates = set()
+        for i, band in self._band_keys(sig):
+            candidates |= self._buckets[i].get(band, set())
+        candidates.discard(exclude)
+
+        best = None
+        for key in candidates:
+            c_anchors, c_topic, c_shingles, _ = self._entries[key]
+            if c_anchors != anchors or c_topic != topic:
+                continue
+            sim = jaccard(shingles, c_shingles)
+            if sim >= threshold and (best is None or sim > best[1]):
+                best = (key, sim)
+        if best is not None:
+            self.hits += 1
+        return best
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "size": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+
+# 进程级近似查询索引
+semantic_index = SemanticIndex()
@@ -0,0 +1,65 @@
+"""
+相同 key 的并发请求合并（singleflight）
+- 同一时刻相同 key 只发起一次上游调用，其余调用者等待同一个结果
+- 结果和异常都会分发给所有等待者
+- 上游调用运行在独立 task 中，单个调用者被取消不会影响其他等待者
+- 最后一个等待者也被取消时（如客户端断开），取消上游调用，不再为没人要的结果排队、付费
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.calls = 0      # 实际发起的上游调用次数
+        self.shared = 0     # 被合并（未发起上游调用）的次数
+        self.orphaned = 0   # 等待者全部取消而被取消的上游调用次数
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            self.calls += 1
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.shared += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(key) is task and self._waiters[key] == 1 and not task.done():
+                task.cancel()
+                self.orphaned += 1
+            raise
+        finally:
+            if key in self._waiters and self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        self._waiters.pop(key, None)
+        # 所有等待者都已取消时，避免 "exception was never retrieved" 告警
+        if not task.cancelled():
+            task.exception()
+
+    def waiters(self, key: str) -> int:
+        """当前等待某个 key 的调用者数量"""
+        return self._waiters.get(key, 0)
+
+    def stats(self, top: int = 20) -> Dict[str, Any]:
+        total = self.calls + self.shared
+        inflight = sorted(self._waiters.items(), key=lambda kv: kv[1], reverse=True)
+        return {
+            "upstream_calls": self.calls,
+            "coalesced": self.shared,
+            "orphaned": self.orphaned,
+            "saved_ratio": round(self.shared / total, 4) if total else 0.0,
+            "inflight_keys": len(self._inflight),
+            "inflight_waiters": dict(inflight[:top]),
+        }
@@ -0,0 +1,126 @@
+"""
+投机搜索（可选）
+- 根据最后一条用户消息判断是否大概率需要搜索（天气、股价、新闻、时间词等）
+- 是则用启发式 query 与第一轮 LLM 请求同时发起搜索
+- 模型实际的 search query 与投机 query 足够相似时复用结果，否则丢弃
+- 统计命中率和浪费率，用于调参
+"""
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+import metrics
+from config import SPECULATION_MATCH_THRESHOLD
+from query_utils import is_weather_query, optimize_search_query, should_append_date
+from search_service import run_search
+
+logger = logging.getLogger(__name__)
+
+_DATE_SUFFIX_RE = re.compile(r"，（今日日期：[\d-]+）$")
+_NOISE_RE = re.compile(r"[\s\W_]+|怎么样|如何|多少|是什么|请问|帮我|查一下|一下|吗|呢|啊|呀|吧|的")
+_SYNONYMS = {"今天": "今日", "当天": "今日", "当日": "今日", "明天": "明日", "昨天": "昨日"}
+
+
+def _norm(query: str) -> str:
+    """匹配前归一化：去日期后缀、标点空白和口语词，统一时间词"""
+    query = _NOISE_RE.sub("", _DATE_SUFFIX_RE.sub("", query))
+    for src, dst in _SYNONYMS.items():
+        query = query.replace(src, dst)
+    return query
+
+
+def _bigrams(text: str) -> set:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def query_similarity(a: str, b: str) -> float:
+    """两个搜索 query 的相似度（字符 bigram Dice 系数）"""
+    sa, sb = _bigrams(_norm(a)), _bigrams(_norm(b))
+    if not sa or not sb:
+        return 0.0
+    return 2 * len(sa & sb) / (len(sa) + len(sb))
+
+
+def heuristic_query(messages: List[Dict[str, Any]], location_city: Optional[str] = None) -> Optional[str]:
+    """
+    根据最后一条用户消息生成投机搜索 query，不需要搜索时返回 None
+    """
+    text = ""
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            text = (msg.get("content") or "").strip()
+            break
+    if not text:
+        return None
+
+    if is_weather_query(text):
+        if location_city and location_city not in text:
+            text = f"{location_city} {text}"
+        return text
+    if should_append_date(text):
+        return text
+    return None
+
+
+class Speculation:
+    """单个请求的投机搜索"""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.task = asyncio.create_task(run_search(query))
+        self.used = False
+        metrics.incr("speculation_started")
+
+    @classmethod
+    def start(cls, messages: List[Dict[str, Any]], location_city: Optional[str] = None) -> Optional["Speculation"]:
+        query = heuristic_query(messages, location_city)
+        if not query:
+            return None
+        return cls(optimize_search_query(query))
+
+    async def take(self, query: str) -> Optional[dict]:
+        """
+        模型实际发起搜索时调用：相似则复用投机结果，否则返回 None
+        - 每个投机结果只会被复用一次
+        """
+        if self.used:
+            return None
+
+        score = query_similarity(self.query, query)
+        if score < SPECULATION_MATCH_THRESHOLD:
+            metrics.incr("speculation_mismatch")
+            logger.info("speculation miss: %s | %s | %.2f", self.query, query, score)
+            return None
+
+        self.used = True
+        metrics.incr("speculation_hit")
+        return await asyncio.shield(self.task)
+
+    def cancel(self) -> None:
+        """客户端已断开：取消仍在进行的投机搜索"""
+        if not self.task.done():
+            self.task.cancel()
+            metrics.incr("speculation_cancelled")
+
+    def finish(self) -> None:
+        """请求结束时调用：未被复用的投机搜索记为浪费"""
+        if not self.used:
+            metrics.incr("speculation_wasted")
+
+
+def stats() -> Dict[str, Any]:
+    started = metrics.get("speculation_started")
+    return {
+        "started": started,
+        "hits": metrics.get("speculation_hit"),
+        "mismatches": metrics.get("speculation_mismatch"),
+        "wasted": metrics.get("speculation_wasted"),
+        "hit_rate": round(metrics.get("speculation_hit") / started, 4) if started else 0.0,
+        "wasted_rate": round(metrics.get("speculation_wasted") / started, 4) if started else 0.0,
+    }
+
+
+metrics.register_collector("speculation", stats)
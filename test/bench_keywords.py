@@ -0,0 +1,94 @@
+"""
+关键词分类性能对比（基于日志中的真实查询）
+
+- 旧实现：每个判断各自 any(w in text for w in words) 扫描一遍
+  （should_append_date + is_weather_query + ttl_class + 路由规则，每个请求约 4~6 次）
+- 新实现：keywords.classify 一次 Aho-Corasick 扫描得到全部分类，请求内复用
+
+同时校验两种实现对每条查询的分类结果一致
+
+运行：python test/bench_keywords.py [llm_server.log] [--rounds 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import keywords  # noqa: E402
+from bench_search_format import load_responses  # noqa: E402
+from eval_router import load_log  # noqa: E402
+from schema import KEYWORD_TABLE  # noqa: E402
+
+SAMPLES = [
+    "今日天气 广西壮族自治区钦州市", "今天北京天气怎么样", "今日纳斯达克指数", "全国有多少个码头",
+    "梅西现在效力于哪个球队", "最近有什么新闻", "讲个笑话", "帮我写一首关于春天的诗",
+    "美元兑人民币汇率", "今年春节是几号", "上周的票房冠军是哪部电影", "解释一下量子纠缠",
+]
+
+
+def old_classify(text: str) -> frozenset:
+    """旧实现：每个分类单独扫描一遍全部关键词"""
+    return frozenset(
+        category for category, words in keywords._table.items()
+        if any(w in text for w in words)
+    )
+
+
+def old_request(text: str) -> None:
+    """旧实现下一个请求中的判断（各自独立扫描）"""
+    words = keywords._table
+    any(w in text for w in words["weather"])                       # is_weather_query（提示地点）
+    any(w in text for w in words["search_rule"])                   # 路由规则
+    any(w in text for w in words["weather"])                       # 路由规则
+    any(w in text for w in words["date_sensitive"]) or any(w in text for w in words["time_word"])  # 追加日期
+    any(w in text for w in words["realtime"])                      # 缓存 TTL
+    any(w in text for w in words["date_sensitive"]) or any(w in text for w in words["time_word"])  # 缓存 TTL
+
+
+def new_request(text: str) -> None:
+    keywords.has(text, keywords.WEATHER)
+    keywords.classify(text)
+    keywords.has(text, keywords.DATE_SENSITIVE)
+    keywords.has(text, keywords.REALTIME)
+
+
+def load_corpus(path: str):
+    corpus = list(SAMPLES)
+    if os.path.exists(path):
+        corpus += [text for text, _ in load_log(path)]
+        corpus += [r["query"] for r in load_responses(path)]
+    return [t for t in corpus if t]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log", nargs="?", default="llm_server.log")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.log)
+    mismatches = [t for t in corpus if old_classify(t) != keywords.classify(t)]
+    print(f"查询数：{len(corpus)}，关键词数：{sum(len(v) for v in keywords._table.values())}"
+          f"（路由规则 {len(KEYWORD_TABLE['search_rule'])}）")
+    print(f"分类结果不一致：{len(mismatches)}")
+    for t in mismatches[:10]:
+        print(f"  {t}: 旧 {sorted(old_classify(t))} 新 {sorted(keywords.classify(t))}")
+
+    def bench(fn, clear: bool) -> float:
+        st = time.perf_counter()
+        for _ in range(args.rounds):
+            if clear:
+                keywords.classify.cache_clear()
+            for t in corpus:
+                fn(t)
+        return (time.perf_counter() - st) / (args.rounds * len(corpus)) * 1e6
+
+    print(f"\n单次全分类：旧 {bench(old_classify, False):.2f} us，新（无缓存）{bench(keywords.classify, True):.2f} us")
+    print(f"每请求全部判断：旧 {bench(old_request, False):.2f} us，"
+          f"新（无缓存）{bench(new_request, True):.2f} us，新（LRU 命中）{bench(new_request, False):.2f} us")
+
+
+if __name__ == "__main__":
+    main()
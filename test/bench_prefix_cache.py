@@ -0,0 +1,137 @@
+"""
+vLLM 前缀缓存友好 prompt 布局 TTFT 对比
+
+对比两种 prompt 组装方式（需 vLLM 开启 --enable-prefix-caching）：
+- 旧布局：人设 + 规则 + 秒级时间 + 位置 合并成一条 system 消息（每秒都不同）
+- 新布局：静态规则前缀 + 人设 → 历史 → 分钟级时间/位置 → 最后一条 user
+
+同时离线统计相邻两次请求的公共前缀长度（无需模型服务）
+
+运行：python test/bench_prefix_cache.py [--runs 10] [--offline]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from config import LOCAL_CFG  # noqa: E402
+from schema import (  # noqa: E402
+    DATA_ACCURACY_SYSTEM, FALLBACK_SYSTEM, LANGUAGE_MATCH_SYSTEM, STATIC_RULES_PREFIX,
+    TOOL_RULE_SYSTEM, TOOLS_DESC, get_datatime_now,
+)
+from utils import build_prompt_messages, split_messages_by_role, truncate_by_rounds_and_chars  # noqa: E402
+
+PERSONA = (
+    "你是一个专业、可靠、注重事实与逻辑一致性的智能助手。你的目标是帮助用户高效解决问题，"
+    "并在回答中体现清晰的结构、明确的推理步骤和可操作的结论。" * 8
+)
+LOCATION_HINT = (
+    "【用户所在地信息】用户当前所在位置：广西壮族自治区钦州市。\n"
+    "当查询天气相关问题时，如果用户问题中没有明确指定地点，\n"
+    "请在search工具的query参数中包含此位置信息中的城市名称（注意忽略街道信息）。\n"
+)
+CLIENT_MESSAGES = [
+    {"role": "system", "content": PERSONA},
+    {"role": "user", "content": "你好呀"},
+    {"role": "assistant", "content": "你好！有什么可以帮你？"},
+    {"role": "user", "content": "今日天气"},
+]
+# 另一个客户端（不同人设）的请求
+OTHER_CLIENT_MESSAGES = [{"role": "system", "content": "你是小光"}, *CLIENT_MESSAGES[1:]]
+
+
+def legacy_layout(client_messages=CLIENT_MESSAGES):
+    """改造前 chat_completion_stream 的组装方式"""
+    msgs = [dict(m) for m in client_messages]
+    msgs += [LANGUAGE_MATCH_SYSTEM, FALLBACK_SYSTEM, DATA_ACCURACY_SYSTEM, TOOL_RULE_SYSTEM, get_datatime_now()]
+    msgs.append({"role": "system", "content": LOCATION_HINT})
+    system_msg, history = split_messages_by_role(msgs)
+    return [system_msg, *truncate_by_rounds_and_chars(history, max_rounds=5, max_chars=8000)]
+
+
+def new_layout(client_messages=CLIENT_MESSAGES):
+    volatile = [get_datatime_now(granularity="minute")["content"], LOCATION_HINT]
+    return build_prompt_messages([dict(m) for m in client_messages], STATIC_RULES_PREFIX, volatile)
+
+
+def render(messages) -> str:
+    return "".join(f"<{m['role']}>{m['content']}" for m in messages)
+
+
+def common_prefix(a: str, b: str) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def offline_report():
+    for name, layout in [("旧布局", legacy_layout), ("新布局", new_layout)]:
+        first = render(layout())
+        time.sleep(1.1)   # 跨过秒级时间变化
+        second = render(layout())
+        other = render(layout(OTHER_CLIENT_MESSAGES))
+        shared = common_prefix(first, second)
+        shared_other = common_prefix(second, other)
+        print(
+            f"{name}: 总长 {len(second)} 字符，"
+            f"同一对话 1 秒后公共前缀 {shared} 字符（{shared / len(second):.1%}），"
+            f"不同人设客户端公共前缀 {shared_other} 字符"
+        )
+
+
+async def ttft(client: AsyncOpenAI, messages) -> float:
+    st = time.perf_counter()
+    stream = await client.chat.completions.create(
+        model=LOCAL_CFG["model"],
+        messages=messages,
+        tools=TOOLS_DESC,
+        temperature=0.1,
+        max_tokens=16,
+        stream=True,
+        extra_body={"chat_template_kwargs": {"enable_thinking": False}},
+    )
+    first = None
+    async for chunk in stream:
+        if first is None and chunk.choices:
+            delta = chunk.choices[0].delta
+            if delta.content or delta.tool_calls:
+                first = time.perf_counter()
+    return ((first or time.perf_counter()) - st) * 1000
+
+
+async def online_report(runs: int):
+    client = AsyncOpenAI(api_key=LOCAL_CFG["api_key"], base_url=LOCAL_CFG["base_url"])
+    results = {"旧布局": [], "新布局": []}
+
+    # 交替执行，避免 GPU 负载波动偏向某一方；间隔 > 1s 让秒级时间变化
+    for i in range(runs):
+        for name, layout in [("旧布局", legacy_layout), ("新布局", new_layout)]:
+            results[name].append(await ttft(client, layout()))
+        await asyncio.sleep(1.1)
+
+    print(f"\n====== TTFT（{runs} 次，去掉首次预热） ======")
+    for name, values in results.items():
+        values = sorted(values[1:] or values)
+        print(
+            f"{name}: 平均 {sum(values) / len(values):.1f} ms，"
+            f"中位数 {values[len(values) // 2]:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--offline", action="store_true", help="只统计公共前缀，不请求模型服务")
+    args = parser.parse_args()
+
+    offline_report()
+    if not args.offline:
+        asyncio.run(online_report(args.runs))
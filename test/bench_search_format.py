@@ -0,0 +1,145 @@
+"""
+搜索结果格式化对比（基于日志中记录的真实百度返回）
+
+- 旧格式：json.dumps(filtered, ensure_ascii=False, indent=2)
+- 新格式：search_format.format_references（排序、去重、按 token 预算裁剪）
+
+默认离线统计 token 数（优先使用 vLLM /tokenize，失败时用估算值）
+--online：用两种格式分别构造第二轮请求，对比 TTFT
+
+运行：python test/bench_search_format.py [llm_server.log] [--online] [--runs 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+from config import LOCAL_CFG  # noqa: E402
+from search_format import estimate_tokens, format_references  # noqa: E402
+
+
+def load_responses(path: str):
+    """从日志中解析 search 模块记录的 {"query", "response"} JSON 块"""
+    records = []
+    block = None
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            if line.rstrip().endswith("[INFO] search: {"):
+                block = ["{"]
+                continue
+            if block is not None:
+                block.append(line)
+                if line.startswith("}"):
+                    try:
+                        data = json.loads("".join(block))
+                        if data.get("response"):
+                            records.append(data)
+                    except json.JSONDecodeError:
+                        pass
+                    block = None
+    return records
+
+
+def count_tokens(texts):
+    """优先用 vLLM 的 /tokenize 精确计数，不可用时退回估算"""
+    base = LOCAL_CFG["base_url"].rstrip("/").removesuffix("/v1")
+    try:
+        with httpx.Client(timeout=5) as client:
+            counts = []
+            for text in texts:
+                resp = client.post(f"{base}/tokenize", json={"model": LOCAL_CFG["model"], "prompt": text})
+                resp.raise_for_status()
+                counts.append(resp.json()["count"])
+            return counts, "vLLM /tokenize"
+    except Exception:
+        return [estimate_tokens(t) for t in texts], "估算"
+
+
+def old_format(record):
+    return json.dumps(record["response"], ensure_ascii=False, indent=2)
+
+
+def new_format(record):
+    return format_references(record["response"])
+
+
+async def ttft(client: AsyncOpenAI, query: str, tool_content: str) -> float:
+    messages = [
+        {"role": "user", "content": query},
+        {"role": "assistant", "content": "", "tool_calls": [{
+            "id": "call_bench", "type": "function",
+            "function": {"name": "search", "arguments": json.dumps({"query": query}, ensure_ascii=False)},
+        }]},
+        {"role": "tool", "tool_call_id": "call_bench",
+         "content": json.dumps({"success": True, "result": tool_content}, ensure_ascii=False)},
+    ]
+    st = time.perf_counter()
+    stream = await client.chat.completions.create(
+        model=LOCAL_CFG["model"],
+        messages=messages,
+        temperature=0.1,
+        max_tokens=8,
+        stream=True,
+        extra_body={"chat_template_kwargs": {"enable_thinking": False}},
+    )
+    first = None
+    async for chunk in stream:
+        if first is None and chunk.choices and chunk.choices[0].delta.content:
+            first = time.perf_counter()
+    return ((first or time.perf_counter()) - st) * 1000
+
+
+async def online(records, runs: int):
+    client = AsyncOpenAI(api_key=LOCAL_CFG["api_key"], base_url=LOCAL_CFG["base_url"])
+    totals = {"旧格式": [], "新格式": []}
+    for _ in range(runs):
+        for record in records:
+            # 末尾加随机串，避免前缀缓存命中掩盖 prefill 差异
+            suffix = f" #{time.time_ns()}"
+            totals["旧格式"].append(await ttft(client, record["query"] + suffix, old_format(record)))
+            totals["新格式"].append(await ttft(client, record["query"] + suffix, new_format(record)))
+
+    print("\n====== 第二轮 TTFT ======")
+    for name, values in totals.items():
+        values.sort()
+        print(f"{name}: 平均 {sum(values) / len(values):.1f} ms，中位数 {values[len(values) // 2]:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log", nargs="?", default="llm_server.log")
+    parser.add_argument("--online", action="store_true")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    records = load_responses(args.log)
+    if not records:
+        print("日志中没有找到搜索返回记录")
+        return
+
+    old_texts = [old_format(r) for r in records]
+    new_texts = [new_format(r) for r in records]
+    old_tokens, method = count_tokens(old_texts)
+    new_tokens, _ = count_tokens(new_texts)
+
+    print(f"记录数：{len(records)}（token 计数方式：{method}）")
+    print(f"旧格式：平均 {sum(old_tokens) / len(records):.0f} tokens，平均 {sum(map(len, old_texts)) / len(records):.0f} 字符")
+    print(f"新格式：平均 {sum(new_tokens) / len(records):.0f} tokens，平均 {sum(map(len, new_texts)) / len(records):.0f} 字符")
+    print(f"token 减少：{1 - sum(new_tokens) / sum(old_tokens):.1%}")
+
+    print("\n====== 新格式示例 ======")
+    print(new_texts[0])
+
+    if args.online:
+        asyncio.run(online(records, args.runs))
+
+
+if __name__ == "__main__":
+    main()
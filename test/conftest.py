@@ -0,0 +1,18 @@
+"""
+pytest 公共配置
+- 测试脚本也可以直接运行（python test/test_xxx.py），各自在 __main__ 中做同样的设置
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def no_disk_cache(monkeypatch):
+    """只测试内存缓存，不读写持久化缓存文件；需要持久化缓存的测试自行替换为临时数据库"""
+    import search_service
+
+    monkeypatch.setattr(search_service, "disk_cache", None)
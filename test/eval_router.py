@@ -0,0 +1,127 @@
+"""
+本地搜索路由离线评估
+
+从服务日志中还原 (最后一条用户消息, 模型是否调用了 search)：
+- "chat_handlers: openai_messages [...]" 行给出请求消息
+- 到下一个请求之前出现 "search:" 日志（搜索结果 / 搜索失败）即视为模型调用了 search
+
+统计路由与模型实际决策的一致率：
+- 覆盖率：路由给出 search / answer（未回退）的比例
+- 一致率：覆盖样本中，路由决策与模型决策一致的比例
+
+也可以用日志标签训练线性模型：
+    python test/eval_router.py llm_server.log --train router_model.json
+
+也支持 JSONL 样本：每行 {"text": "...", "label": 0/1}
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import re
+import sys
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_router  # noqa: E402
+from search_router import LinearRouter  # noqa: E402
+
+REQUEST_RE = re.compile(r"chat_handlers: openai_messages (\[.*\])\s*$")
+SEARCH_RE = re.compile(r"\[(INFO|ERROR)\] (search|search_service):")
+
+
+def load_log(path: str) -> List[Tuple[str, int]]:
+    samples: List[Tuple[str, int]] = []
+    current = None
+    searched = 0
+
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            m = REQUEST_RE.search(line)
+            if m:
+                if current:
+                    samples.append((current, searched))
+                try:
+                    messages = ast.literal_eval(m.group(1))
+                except (ValueError, SyntaxError):
+                    current = None
+                    continue
+                current = search_router.last_user_text(messages)
+                searched = 0
+            elif current and SEARCH_RE.search(line):
+                searched = 1
+
+    if current:
+        samples.append((current, searched))
+    return samples
+
+
+def load_jsonl(path: str) -> List[Tuple[str, int]]:
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                d = json.loads(line)
+                samples.append((d["text"], int(d["label"])))
+    return samples
+
+
+def evaluate(samples: List[Tuple[str, int]], model=None) -> dict:
+    covered = agree = 0
+    confusion = {"search": [0, 0], "answer": [0, 0], "fallback": [0, 0]}
+    disagreements = []
+
+    for text, label in samples:
+        decision = search_router.route([{"role": "user", "content": text}], model=model)
+        confusion[decision.action][label] += 1
+        if decision.action == "fallback":
+            continue
+        covered += 1
+        predicted = 1 if decision.action == "search" else 0
+        if predicted == label:
+            agree += 1
+        else:
+            disagreements.append((text, label, decision.action, round(decision.score, 3)))
+
+    n = len(samples)
+    return {
+        "samples": n,
+        "coverage": round(covered / n, 4) if n else 0.0,
+        "agreement": round(agree / covered, 4) if covered else 0.0,
+        # 每个决策下：[模型未搜索, 模型搜索] 的样本数
+        "confusion": confusion,
+        "disagreements": disagreements[:20],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="llm_server.log 或 JSONL 样本文件")
+    parser.add_argument("--train", help="用样本训练线性模型并保存到该路径")
+    parser.add_argument("--holdout", type=float, default=0.2, help="训练时留出评估的比例")
+    args = parser.parse_args()
+
+    samples = load_jsonl(args.path) if args.path.endswith(".jsonl") else load_log(args.path)
+    print(f"样本数：{len(samples)}，其中模型调用 search：{sum(y for _, y in samples)}")
+
+    print("\n====== 规则 / 当前模型 ======")
+    print(json.dumps(evaluate(samples), ensure_ascii=False, indent=2))
+
+    if args.train:
+        random.seed(0)
+        random.shuffle(samples)
+        n_test = int(len(samples) * args.holdout)
+        test, train = samples[:n_test], samples[n_test:]
+
+        model = LinearRouter()
+        model.fit(train)
+        model.save(args.train)
+        print(f"\n====== 训练后（训练 {len(train)} / 留出 {len(test)}） ======")
+        print(json.dumps(evaluate(test or train, model), ensure_ascii=False, indent=2))
+        print(f"模型已保存：{args.train}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+近似重复查询缓存离线评估
+
+1. 日志回放（默认）：按时间顺序回放日志中记录的搜索 {"query", "response"}，
+   每条查询先在近似索引中查找，再加入索引，统计：
+   - 命中率：近似命中（不含完全相同的 key）的比例
+   - 命中质量：命中条目的返回结果与该查询实际返回结果的标题重合度（Jaccard），
+     低于 --bad 视为误命中，逐条打印便于人工核对
+2. 标注样本（--pairs）：JSONL，每行 {"a": "...", "b": "...", "same": 0/1}，
+   统计各阈值下的准确率 / 召回率
+
+--thresholds 0.6,0.7,0.8 对所有主题使用统一阈值做扫描；不指定时使用 config 中按主题的阈值
+
+运行：python test/eval_semantic_cache.py [llm_server.log] [--pairs pairs.jsonl] [--thresholds 0.6,0.7]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search_format import load_responses  # noqa: E402
+from config import SEMANTIC_CACHE_THRESHOLDS  # noqa: E402
+from search_cache import normalize_query  # noqa: E402
+from semantic_cache import SemanticIndex, _shingles, canonicalize, jaccard  # noqa: E402
+
+
+def titles(response) -> set:
+    if isinstance(response, list):
+        return {(r.get("标题") or "").strip() for r in response if isinstance(r, dict)} - {""}
+    return set()
+
+
+def replay(records, thresholds, bad: float):
+    index = SemanticIndex(thresholds=thresholds)
+    responses = {}
+    lookups = hits = bad_hits = 0
+    overlaps = []
+
+    for record in records:
+        query = record["query"]
+        key = normalize_query(query)
+        if key not in responses:
+            lookups += 1
+            match = index.lookup(query, exclude=key)
+            if match is not None:
+                hits += 1
+                near_key, sim = match
+                overlap = jaccard(frozenset(titles(responses[near_key])), frozenset(titles(record["response"])))
+                overlaps.append(overlap)
+                if overlap < bad:
+                    bad_hits += 1
+                    print(f"  误命中? sim={sim:.2f} overlap={overlap:.2f}\n    {query}\n    {near_key}")
+        responses[key] = record["response"]
+        index.add(key, query)
+
+    return {
+        "lookups": lookups,
+        "hits": hits,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "avg_overlap": sum(overlaps) / len(overlaps) if overlaps else None,
+        "bad_hits": bad_hits,
+    }
+
+
+def eval_pairs(path: str, thresholds):
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                pairs.append(json.loads(line))
+
+    scored = []
+    for p in pairs:
+        (ta, aa), (tb, ab) = canonicalize(p["a"]), canonicalize(p["b"])
+        sim = jaccard(_shingles(ta), _shingles(tb)) if aa == ab else 0.0
+        scored.append((sim, int(p["same"])))
+
+    for t in thresholds:
+        tp = sum(1 for s, y in scored if s >= t and y)
+        fp = sum(1 for s, y in scored if s >= t and not y)
+        fn = sum(1 for s, y in scored if s < t and y)
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        print(f"阈值 {t:.2f}：准确率 {precision:.1%}，召回率 {recall:.1%}（{len(scored)} 对）")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log", nargs="?", default="llm_server.log")
+    parser.add_argument("--pairs")
+    parser.add_argument("--thresholds")
+    parser.add_argument("--bad", type=float, default=0.2, help="标题重合度低于该值视为误命中")
+    args = parser.parse_args()
+
+    sweep = [float(t) for t in args.thresholds.split(",")] if args.thresholds else None
+
+    if args.pairs:
+        eval_pairs(args.pairs, sweep or sorted(set(SEMANTIC_CACHE_THRESHOLDS.values())))
+        return
+
+    records = load_responses(args.log)
+    if not records:
+        print("日志中没有找到搜索返回记录")
+        return
+    print(f"记录数：{len(records)}")
+
+    configs = [(f"统一阈值 {t:.2f}", {k: t for k in SEMANTIC_CACHE_THRESHOLDS}) for t in sweep] if sweep \
+        else [("按主题阈值 " + json.dumps(SEMANTIC_CACHE_THRESHOLDS), SEMANTIC_CACHE_THRESHOLDS)]
+    for name, thresholds in configs:
+        print(f"\n====== {name} ======")
+        r = replay(records, thresholds, args.bad)
+        avg = f"{r['avg_overlap']:.2f}" if r["avg_overlap"] is not None else "-"
+        print(f"查找 {r['lookups']} 次，近似命中 {r['hits']} 次（{r['hit_rate']:.1%}），"
+              f"平均标题重合度 {avg}，疑似误命中 {r['bad_hits']} 次")
+
+
+if __name__ == "__main__":
+    main()
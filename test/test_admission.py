@@ -0,0 +1,118 @@
+"""
+准入控制测试
+
+验证：
+1. 超出 max_inflight 的请求排队，名额归还时按到达顺序转交，排队时间单独统计
+2. 队列已满立即拒绝；排队被取消时不占用名额
+3. CoDel：队列持续非空超过 interval 后，新排队请求最多等 target_delay
+4. 接口被拒绝时返回 503 + Retry-After
+
+运行：python test/test_admission.py  或  pytest test/test_admission.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main_robust  # noqa: E402
+from admission import AdmissionController, Overloaded  # noqa: E402
+from config import LOCAL_CFG  # noqa: E402
+
+
+def test_queue_and_handoff():
+    async def run():
+        ac = AdmissionController(max_inflight=2, max_queue=10, target_delay=1, interval=5, max_wait=5)
+        assert await ac.acquire() == 0.0
+        assert await ac.acquire() == 0.0
+        order = []
+
+        async def waiter(i):
+            waited = await ac.acquire()
+            order.append(i)
+            return waited
+
+        tasks = [asyncio.create_task(waiter(i)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        assert ac.queue_depth == 2 and ac.in_flight == 2
+        ac.release()
+        ac.release()
+        waits = await asyncio.gather(*tasks)
+        assert order == [0, 1]
+        assert all(w >= 0.04 for w in waits)
+        assert ac.in_flight == 2 and ac.queue_depth == 0
+        assert ac.stats()["wait"]["count"] == 4
+
+    asyncio.run(run())
+
+
+def test_queue_full_and_cancelled_waiter():
+    async def run():
+        ac = AdmissionController(max_inflight=1, max_queue=1, target_delay=1, interval=5, max_wait=5)
+        await ac.acquire()
+        waiter = asyncio.create_task(ac.acquire())
+        await asyncio.sleep(0.01)
+        try:
+            await ac.acquire()
+            raise AssertionError("queue full should be rejected")
+        except Overloaded as e:
+            assert e.reason == "queue_full" and e.retry_after >= 1
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert ac.queue_depth == 0
+        ac.release()
+        assert ac.in_flight == 0
+        assert ac.shed["queue_full"] == 1
+
+    asyncio.run(run())
+
+
+def test_codel_sheds_when_queue_stays_busy():
+    async def run():
+        ac = AdmissionController(max_inflight=1, max_queue=10, target_delay=0.05, interval=0.1, max_wait=5)
+        await ac.acquire()
+        # 第一个排队请求：队列刚变为非空，最多等 max_wait
+        first = asyncio.create_task(ac.acquire())
+        await asyncio.sleep(0.15)
+        assert ac.overloaded()
+        st = time.monotonic()
+        try:
+            await ac.acquire()
+            raise AssertionError("should be shed")
+        except Overloaded as e:
+            assert e.reason == "queue_delay"
+        assert time.monotonic() - st < 0.5
+        assert not first.done()
+
+        ac.release()
+        await first
+        ac.release()
+        assert ac.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_endpoint_returns_503_with_retry_after():
+    saved = main_robust.admission.max_inflight, main_robust.admission.max_queue
+    main_robust.admission.max_inflight, main_robust.admission.max_queue = 0, 0
+    try:
+        resp = TestClient(main_robust.app).post("/v1/chat/completions", json={
+            "model": LOCAL_CFG["model"],
+            "messages": [{"role": "user", "content": "你好"}],
+        })
+    finally:
+        main_robust.admission.max_inflight, main_robust.admission.max_queue = saved
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+
+
+if __name__ == "__main__":
+    test_queue_and_handoff()
+    test_queue_full_and_cancelled_waiter()
+    test_codel_sheds_when_queue_stays_busy()
+    test_endpoint_returns_503_with_retry_after()
+    print("ok")
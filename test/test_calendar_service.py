@@ -0,0 +1,96 @@
+"""
+本地日历服务测试
+
+运行：python test/test_calendar_service.py  或  pytest test/test_calendar_service.py
+"""
+import asyncio
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calendar_service  # noqa: E402
+import chat_handlers  # noqa: E402
+from calendar_service import answer, day_status, festival_date, is_self_contained, next_festival  # noqa: E402
+
+TODAY = date(2026, 10, 18)
+
+
+def test_festival_dates():
+    assert festival_date("春节", 2027) == date(2027, 2, 6)
+    assert festival_date("除夕", 2027) == date(2027, 2, 5)
+    assert festival_date("元宵节", 2026) == date(2026, 3, 3)
+    assert festival_date("清明节", 2026) == date(2026, 4, 5)
+    assert festival_date("国庆节", 2040) == date(2040, 10, 1)
+    # 超出历表范围不做推算
+    assert festival_date("中秋节", 2040) is None
+    assert next_festival("中秋节", TODAY) == date(2027, 9, 15)
+    assert next_festival("圣诞节", TODAY) == date(2026, 12, 25)
+
+
+def test_day_status_with_make_up_workdays():
+    assert day_status(date(2026, 10, 10)) == (True, "国庆节调休上班日，需要上班")
+    assert day_status(date(2026, 10, 5))[0] is False
+    assert day_status(date(2025, 10, 6)) == (False, "国庆节、中秋节假期，放假休息")
+    assert day_status(date(2026, 10, 19)) == (True, "工作日，正常上班")
+    assert day_status(date(2026, 10, 24))[0] is False
+    assert "未收录" in day_status(date(2030, 3, 4))[1]
+
+
+def test_answer_countdown_and_holiday():
+    fact = answer("还有多少天过年", TODAY)
+    assert "2027-02-06（星期六）" in fact and "还有 111 天" in fact
+
+    fact = answer("2026年国庆节放假安排", TODAY)
+    assert "10月1日至10月7日放假调休，共 7 天" in fact
+    assert "9月20日（星期日）、10月10日（星期六）上班" in fact
+
+    assert "需要上班" in answer("10月10日上班吗", TODAY)
+    assert "2026-10-19（星期一）：工作日" in answer("明天要上班吗", TODAY)
+    assert "不在全体公民放假的法定节假日之列" in answer("圣诞节放假吗", TODAY)
+    assert "还剩 74 天" in answer("今年还剩多少天", TODAY)
+
+
+def test_answer_declines_unknown_or_unrelated():
+    # 2027 年放假安排未收录：交给搜索
+    assert answer("春节放假安排", TODAY) is None
+    assert answer("2040年春节是哪天", TODAY) is None
+    assert answer("北京今天天气", TODAY) is None
+    assert answer("春节习俗有哪些", TODAY) is None
+    # 表外的农历日期不做换算
+    assert answer("农历三月初三是几号", TODAY) is None
+    assert not is_self_contained("农历三月初三是几号")
+
+
+def test_is_self_contained():
+    assert is_self_contained("距离国庆节还有几天？")
+    assert is_self_contained("今年中秋是几号")
+    assert is_self_contained("周六要补班吗")
+    assert not is_self_contained("国庆假期去哪玩")
+    assert not is_self_contained("国庆期间北京天气怎么样")
+
+
+def test_search_tool_short_circuit():
+    async def no_search(query, deadline=None):
+        raise AssertionError("calendar query should not reach search")
+
+    original = chat_handlers.run_search
+    chat_handlers.run_search = no_search
+    try:
+        tc = {"function": {"name": "search", "arguments": '{"query": "距离春节还有多少天"}'}}
+        outcome = asyncio.run(chat_handlers._execute_tool_call(tc, lambda q: q))
+    finally:
+        chat_handlers.run_search = original
+    assert outcome["success"] and "【本地日历】" in outcome["result"]
+    assert calendar_service.answer("距离春节还有多少天") == outcome["result"]
+
+
+if __name__ == "__main__":
+    test_festival_dates()
+    test_day_status_with_make_up_workdays()
+    test_answer_countdown_and_holiday()
+    test_answer_declines_unknown_or_unrelated()
+    test_is_self_contained()
+    test_search_tool_short_circuit()
+    print("ok")
@@ -0,0 +1,109 @@
+"""
+熔断器测试
+
+用假的服务商函数模拟故障，验证：
+1. 连续失败达到阈值后熔断，熔断期间快速失败，不再请求上游
+2. 冷却结束后进入半开状态，探测成功则恢复
+3. 主服务商熔断时直接改用备用服务商；全部不可用时返回过期缓存
+
+运行：python test/test_circuit_breaker.py  或  pytest test/test_circuit_breaker.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import circuit_breaker  # noqa: E402
+import search_providers  # noqa: E402
+import search_service  # noqa: E402
+from config import BREAKER_MIN_CALLS, SEARCH_FALLBACKS, SEARCH_PRIMARY, SEARCH_SECONDARY  # noqa: E402
+
+
+class FakeBackend:
+    """可切换成功/失败的假上游"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ok = True
+        self.calls = 0
+
+    async def __call__(self, query: str) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"code": 200 if self.ok else 400, "msg": f"{self.name}: {query}"}
+
+
+def install(*names):
+    saved = {name: search_providers.get_provider(name) for name in names}
+    backends = {}
+    for name in names:
+        backends[name] = FakeBackend(name)
+        search_providers.register_provider(search_providers.SearchProvider(name, backends[name]))
+    return saved, backends
+
+
+def restore(saved):
+    for provider in saved.values():
+        search_providers.register_provider(provider)
+
+
+def test_breaker_opens_and_recovers():
+    saved, backends = install(SEARCH_PRIMARY)
+    provider = search_providers.get_provider(SEARCH_PRIMARY)
+    backend = backends[SEARCH_PRIMARY]
+    try:
+        backend.ok = False
+        for _ in range(BREAKER_MIN_CALLS):
+            asyncio.run(provider.search("q"))
+        assert provider.breaker.state == circuit_breaker.OPEN
+
+        # 熔断期间快速失败，不请求上游
+        calls = backend.calls
+        res = asyncio.run(provider.search("q"))
+        assert res["code"] == 503
+        assert backend.calls == calls
+
+        # 冷却结束 -> 半开 -> 探测成功 -> 恢复
+        provider.breaker._opened_at = time.monotonic() - 3600
+        backend.ok = True
+        while provider.breaker.state != circuit_breaker.CLOSED:
+            assert asyncio.run(provider.search("q"))["code"] == 200
+    finally:
+        restore(saved)
+
+
+def test_open_primary_falls_back_then_stale_cache():
+    names = list(dict.fromkeys([SEARCH_PRIMARY, SEARCH_SECONDARY, *SEARCH_FALLBACKS]))
+    saved, backends = install(*names)
+    search_service.search_cache.clear()
+    try:
+        # 先缓存一份结果，并让它过期
+        assert asyncio.run(search_service.run_search("今日金价"))["code"] == 200
+        key = search_service.normalize_query("今日金价")
+        value, _ = search_service.search_cache._data[key]
+        search_service.search_cache._data[key] = (value, time.monotonic() - 1)
+
+        # 主服务商熔断：直接使用备用服务商
+        search_providers.get_provider(SEARCH_PRIMARY).breaker._trip()
+        res = asyncio.run(search_service.hedged_search("今日金价"))
+        assert res["msg"].startswith(names[1])
+        assert backends[SEARCH_PRIMARY].calls == 1
+
+        # 全部熔断：返回过期缓存
+        for name in names:
+            search_providers.get_provider(name).breaker._trip()
+        res = asyncio.run(search_service.run_search("今日金价"))
+        assert res == value
+    finally:
+        restore(saved)
+        search_service.search_cache.clear()
+
+
+if __name__ == "__main__":
+    # 只测试内存缓存，不读写持久化缓存文件（pytest 下由 conftest.py 处理）
+    search_service.disk_cache = None
+    test_breaker_opens_and_recovers()
+    test_open_primary_falls_back_then_stale_cache()
+    print("ok")
@@ -0,0 +1,172 @@
+"""
+客户端断开测试
+
+用假的 OpenAI 流和假的搜索服务商，验证客户端断开时：
+1. 生成器被关闭（GeneratorExit）：上游流被关闭，省下的 token 计入指标
+2. task 被取消（CancelledError，服务端检测到断开）：等待中的搜索被取消，上游搜索调用随之取消
+
+运行：python test/test_client_disconnect.py  或  pytest test/test_client_disconnect.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai.types.chat import ChatCompletionChunk  # noqa: E402
+
+import chat_handlers  # noqa: E402
+import llm_pool  # noqa: E402
+import metrics  # noqa: E402
+import search_providers  # noqa: E402
+import search_service  # noqa: E402
+from config import SEARCH_FALLBACKS, SEARCH_PRIMARY, SEARCH_SECONDARY  # noqa: E402
+from schema import Message  # noqa: E402
+from search_cache import search_cache  # noqa: E402
+
+NAMES = list(dict.fromkeys(n for n in [SEARCH_PRIMARY, SEARCH_SECONDARY, *SEARCH_FALLBACKS] if n))
+
+
+def chunk(content=None, tool_calls=None, finish_reason=None) -> ChatCompletionChunk:
+    delta = {"role": "assistant"}
+    if content is not None:
+        delta["content"] = content
+    if tool_calls is not None:
+        delta["tool_calls"] = tool_calls
+    return ChatCompletionChunk.model_validate({
+        "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "test",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    })
+
+
+class FakeStream:
+    """逐个吐出 chunk 的上游流，记录是否被关闭"""
+
+    def __init__(self, chunks, interval=0.01):
+        self.chunks = chunks
+        self.interval = interval
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for c in self.chunks:
+            if self.closed:
+                return
+            await asyncio.sleep(self.interval)
+            yield c
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.created = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        stream = self.streams.pop(0)
+        self.created.append(stream)
+        return stream
+
+
+def install_client(streams):
+    original = chat_handlers.pool
+    fake = FakeClient(streams)
+    chat_handlers.pool = llm_pool.LLMPool([llm_pool.Backend("fake", "http://fake/v1", client=fake)])
+    return original, fake
+
+
+def test_closing_generator_aborts_upstream_stream():
+    stream = FakeStream([chunk(content=str(i)) for i in range(100)] + [chunk(finish_reason="stop")])
+    original, fake = install_client([stream])
+    before = metrics.get("decode_tokens_avoided_upper_bound"), metrics.get("decode_chunks_before_abort")
+
+    async def run():
+        gen = chat_handlers.chat_completion_stream([Message(role="user", content="讲个长故事")], max_tokens=500)
+        received = 0
+        async for _ in gen:
+            received += 1
+            if received == 3:
+                break
+        await gen.aclose()
+        return received
+
+    try:
+        asyncio.run(run())
+    finally:
+        chat_handlers.pool = original
+
+    assert stream.closed
+    assert metrics.get("decode_tokens_avoided_upper_bound") - before[0] == 500 - 3
+    assert metrics.get("decode_chunks_before_abort") - before[1] == 3
+
+
+class SlowUpstream:
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self, query: str) -> dict:
+        self.started += 1
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"code": 200, "msg": "late"}
+
+
+def test_cancel_during_search_cancels_tool_calls():
+    upstream = SlowUpstream()
+    saved = {name: search_providers.get_provider(name) for name in NAMES}
+    for name in NAMES:
+        search_providers.register_provider(search_providers.SearchProvider(name, upstream))
+    search_cache.clear()
+
+    tool_call = [{
+        "index": 0, "id": "call_1", "type": "function",
+        "function": {"name": "search", "arguments": '{"query": "英伟达最新财报"}'},
+    }]
+    first = FakeStream([chunk(tool_calls=tool_call), chunk(finish_reason="tool_calls")])
+    original, fake = install_client([first])
+    cancelled_before = metrics.get("tool_calls_cancelled")
+
+    async def consume():
+        async for _ in chat_handlers.chat_completion_stream([Message(role="user", content="英伟达最新财报")]):
+            pass
+
+    async def run():
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.2)
+        assert upstream.started >= 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        # 在事件循环结束（asyncio.run 会取消剩余任务）之前检查，上游搜索确实随请求取消
+        assert upstream.cancelled == upstream.started
+
+    try:
+        asyncio.run(run())
+    finally:
+        chat_handlers.pool = original
+        for provider in saved.values():
+            search_providers.register_provider(provider)
+        search_cache.clear()
+
+    # 第二轮没有发起，搜索被取消
+    assert len(fake.created) == 1
+    assert metrics.get("tool_calls_cancelled") - cancelled_before >= 1
+    assert search_service.search_flight.stats()["orphaned"] >= 1
+
+
+if __name__ == "__main__":
+    # 只测试内存缓存，不读写持久化缓存文件（pytest 下由 conftest.py 处理）
+    search_service.disk_cache = None
+    test_closing_generator_aborts_upstream_stream()
+    test_cancel_during_search_cancels_tool_calls()
+    print("ok")
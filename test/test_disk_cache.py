@@ -0,0 +1,154 @@
+"""
+持久化搜索缓存测试（使用临时目录中的数据库文件）
+
+验证：
+1. 写入后可读出，过期时间跨实例（模拟重启）保持
+2. 多个进程并发写同一个数据库文件不丢数据、不报错
+3. 压缩删除过期过久的条目，并把总大小控制在上限以内
+4. 重启后内存缓存为空时，run_search 从持久化缓存回填，不请求上游
+5. 内存中的条目已过期、而其他 worker 已写入更新的磁盘条目时，使用磁盘条目，不请求上游
+
+运行：python test/test_disk_cache.py  或  pytest test/test_disk_cache.py
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_providers  # noqa: E402
+import search_service  # noqa: E402
+from config import SEARCH_FALLBACKS, SEARCH_PRIMARY, SEARCH_SECONDARY  # noqa: E402
+from disk_cache import DiskCache  # noqa: E402
+
+WORKERS = 4
+WRITES_PER_WORKER = 200
+
+
+def _writer(path: str, worker: int) -> None:
+    cache = DiskCache(path, max_bytes=1 << 30)
+    for i in range(WRITES_PER_WORKER):
+        cache.set_sync(f"w{worker}-{i}", {"code": 200, "msg": f"{worker}-{i}"}, 300)
+    cache.close()
+
+
+def test_roundtrip_across_instances():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+        cache = DiskCache(path, max_bytes=1 << 20)
+        cache.set_sync("今日金价", {"code": 200, "msg": "金价"}, 300)
+        cache.close()
+
+        reopened = DiskCache(path, max_bytes=1 << 20)
+        value, expires_at = reopened.get_sync("今日金价")
+        reopened.close()
+    assert value == {"code": 200, "msg": "金价"}
+    assert 290 < expires_at - time.time() <= 300
+
+
+def test_concurrent_writers_from_processes():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+        DiskCache(path, max_bytes=1 << 30).compact_sync()   # 建表
+        procs = [multiprocessing.Process(target=_writer, args=(path, w)) for w in range(WORKERS)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+
+        cache = DiskCache(path, max_bytes=1 << 30)
+        count = cache._connect().execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        cache.close()
+    assert all(p.exitcode == 0 for p in procs)
+    assert count == WORKERS * WRITES_PER_WORKER
+
+
+def test_compaction_enforces_expiry_and_size_cap():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DiskCache(os.path.join(tmp, "cache.db"), max_bytes=10_000, keep_stale=60)
+        cache.set_sync("expired", {"msg": "x"}, -120)
+        for i in range(100):
+            cache.set_sync(f"k{i}", {"msg": "x" * 200}, 100 + i)
+        cache.compact_sync()
+
+        conn = cache._connect()
+        total = conn.execute("SELECT SUM(size) FROM search_cache").fetchone()[0]
+        keys = {row[0] for row in conn.execute("SELECT key FROM search_cache")}
+        cache.close()
+    assert "expired" not in keys
+    assert total <= 10_000
+    # 保留的是过期时间最晚的条目
+    assert "k99" in keys and "k0" not in keys
+
+
+async def fake_search(query: str) -> dict:
+    fake_search.calls += 1
+    return {"code": 200, "msg": f"fresh: {query}"}
+
+
+def with_disk_cache(test):
+    """用临时数据库替换持久化缓存、用 fake_search 替换全部服务商"""
+    def run():
+        names = list(dict.fromkeys(n for n in [SEARCH_PRIMARY, SEARCH_SECONDARY, *SEARCH_FALLBACKS] if n))
+        saved = {name: search_providers.get_provider(name) for name in names}
+        for name in names:
+            search_providers.register_provider(search_providers.SearchProvider(name, fake_search))
+        saved_disk = search_service.disk_cache
+        fake_search.calls = 0
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                search_service.disk_cache = DiskCache(os.path.join(tmp, "cache.db"), max_bytes=1 << 20)
+                search_service.search_cache.clear()
+                try:
+                    test()
+                finally:
+                    search_service.disk_cache.close()
+        finally:
+            search_service.disk_cache = saved_disk
+            search_service.search_cache.clear()
+            for provider in saved.values():
+                search_providers.register_provider(provider)
+    run.__name__ = test.__name__
+    return run
+
+
+@with_disk_cache
+def test_run_search_loads_from_disk_after_restart():
+    first = asyncio.run(search_service.run_search("今日金价"))
+
+    # 模拟重启：内存缓存清空
+    search_service.search_cache.clear()
+    again = asyncio.run(search_service.run_search("今日金价"))
+
+    assert again == first
+    assert fake_search.calls == 1
+
+
+@with_disk_cache
+def test_expired_memory_entry_picks_up_fresher_disk_row():
+    key = search_service.normalize_query("英伟达股价")
+    # 本 worker 内存中的条目已过宽限期；另一个 worker 刚刷新并写入磁盘
+    search_service.search_cache.set(key, {"code": 200, "msg": "old"}, -3600)
+    search_service.disk_cache.set_sync(key, {"code": 200, "msg": "from other worker"}, 300)
+
+    res = asyncio.run(search_service.run_search("英伟达股价"))
+    assert res == {"code": 200, "msg": "from other worker"}
+    assert fake_search.calls == 0
+    assert search_service.search_cache.ttl_remaining(key) > 290
+
+    # 磁盘条目比内存条目更早过期时不覆盖内存
+    search_service.disk_cache.set_sync(key, {"code": 200, "msg": "older"}, 10)
+    asyncio.run(search_service._load_from_disk(key))
+    assert search_service.search_cache.get(key) == {"code": 200, "msg": "from other worker"}
+
+
+if __name__ == "__main__":
+    test_roundtrip_across_instances()
+    test_concurrent_writers_from_processes()
+    test_compaction_enforces_expiry_and_size_cap()
+    test_run_search_loads_from_disk_after_restart()
+    test_expired_memory_entry_picks_up_fresher_disk_row()
+    print("ok")
@@ -0,0 +1,81 @@
+"""
+地名表地址解析测试
+
+运行：python test/test_gazetteer.py  或  pytest test/test_gazetteer.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aho_corasick import AhoCorasick  # noqa: E402
+from gazetteer import Location, resolve  # noqa: E402
+from query_utils import extract_province_city  # noqa: E402
+
+
+def test_aho_corasick_longest_non_overlapping():
+    ac = AhoCorasick([("he", 1), ("she", 2), ("hers", 3), ("his", 4)])
+    assert sorted(ac.iter("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 3)]
+    assert ac.longest("ushers") == [(1, 4, 2)]
+    assert ac.longest("hishers") == [(0, 3, 4), (3, 7, 3)]
+
+
+def test_aho_corasick_rebuild_does_not_duplicate_outputs():
+    ac = AhoCorasick([("he", 1), ("she", 2), ("hers", 3)])
+    assert sorted(ac.iter("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 3)]
+    # 构建后再插入并重新构建：失配链上的输出不会重复合并
+    ac.add("his", 4)
+    ac.build()
+    ac.build()
+    assert sorted(ac.iter("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 3)]
+    assert sorted(ac.iter("this")) == [(1, 4, 4)]
+
+
+def test_resolve_levels_and_aliases():
+    assert resolve("广西钦州码头开发区街道") == Location("广西壮族自治区", "钦州市")
+    assert resolve("钦州") == Location("广西壮族自治区", "钦州市")
+    assert resolve("北京朝阳区") == Location("北京市", None, "朝阳区")
+    assert resolve("辽宁朝阳") == Location("辽宁省", "朝阳市")
+    assert resolve("吉林省吉林市") == Location("吉林省", "吉林市")
+    assert resolve("今日天气") == Location()
+
+
+def test_short_alias_needs_boundary_or_province():
+    # 两个字的别名出现在更长的词中：不是地名
+    assert resolve("阿里巴巴") == Location()
+    assert resolve("阿里巴巴总部在杭州") == Location("浙江省", "杭州市")
+    assert resolve("长治久安") == Location()
+    # 词边界：文本结束、常见后续字词
+    assert resolve("阿里天气") == Location("西藏自治区", "阿里地区")
+    assert resolve("大连今天下雨吗") == Location("辽宁省", "大连市")
+    assert resolve("我在大同") == Location("山西省", "大同市")
+    # 有省份上下文时不要求词边界
+    assert resolve("西藏阿里改则县") == Location("西藏自治区", "阿里地区")
+    assert resolve("广西钦州码头开发区街道") == Location("广西壮族自治区", "钦州市")
+
+
+def test_canonical_and_key():
+    loc = resolve("今日天气 广西壮族自治区钦州市")
+    assert loc.canonical == "广西壮族自治区钦州市"
+    assert loc.key == "广西钦州"
+    assert resolve("上海浦东").canonical == "上海市"
+
+
+def test_extract_province_city():
+    # 旧正则会把“恩施土家族苗族自治州”解析成“州恩施市”
+    assert extract_province_city("湖北省恩施土家族苗族自治州恩施市") == "湖北省恩施土家族苗族自治州"
+    assert extract_province_city("广东省深圳市南山区") == "广东省深圳市"
+    assert extract_province_city("北京市海淀区") == "北京市"
+    # 地名表未覆盖时退回正则
+    assert extract_province_city("某某市") == "某某市"
+    assert extract_province_city("") is None
+
+
+if __name__ == "__main__":
+    test_aho_corasick_longest_non_overlapping()
+    test_aho_corasick_rebuild_does_not_duplicate_outputs()
+    test_resolve_levels_and_aliases()
+    test_short_alias_needs_boundary_or_province()
+    test_canonical_and_key()
+    test_extract_province_city()
+    print("ok")
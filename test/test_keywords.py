@@ -0,0 +1,40 @@
+"""
+关键词分类测试
+
+运行：python test/test_keywords.py  或  pytest test/test_keywords.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import keywords  # noqa: E402
+from query_utils import is_weather_query, should_append_date  # noqa: E402
+from search_cache import ttl_class  # noqa: E402
+
+QUERIES = [
+    "今日天气 广西壮族自治区钦州市", "今日纳斯达克指数", "最近有什么新闻", "讲个笑话",
+    "美元兑人民币汇率", "上周的票房冠军是哪部电影", "台风什么时候登陆", "全国有多少个码头",
+]
+
+
+def test_classify_matches_substring_scan():
+    for q in QUERIES:
+        expected = {c for c, words in keywords._table.items() if any(w in q for w in words)}
+        assert keywords.classify(q) == expected, q
+
+
+def test_rewired_helpers():
+    assert is_weather_query("台风什么时候登陆")
+    assert not is_weather_query("今日纳斯达克指数")
+    assert should_append_date("最近有什么新闻")
+    assert not should_append_date("讲个笑话")
+    assert ttl_class("今日纳斯达克指数") == "realtime"
+    assert ttl_class("最近有什么新闻") == "daily"
+    assert ttl_class("全国有多少个码头") == "stable"
+
+
+if __name__ == "__main__":
+    test_classify_matches_substring_scan()
+    test_rewired_helpers()
+    print("ok")
@@ -0,0 +1,178 @@
+"""
+LLM 后端池测试
+
+在本机启动两个模拟的 OpenAI 兼容服务（/v1/models、/v1/chat/completions，支持流式），验证：
+1. least_outstanding：并发请求均匀分到两个后端
+2. 会话粘性：同一对话的多轮请求固定到同一后端
+3. 后端返回 5xx：换后端重试，连续失败后摘除；恢复后经主动探测重新加入
+4. ewma_ttft：首 token 慢的后端分到的请求更少
+
+运行：python test/test_llm_pool.py  或  pytest test/test_llm_pool.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from config import LLM_EJECT_FAILURES, LLM_READMIT_SUCCESSES  # noqa: E402
+from llm_pool import EWMA_TTFT, LEAST_OUTSTANDING, Backend, LLMPool  # noqa: E402
+
+MODEL = "mock"
+
+
+class MockServer:
+    """模拟的 OpenAI 兼容服务：delay 为首 token 前的延迟，failing 时返回 500"""
+
+    def __init__(self, name: str, delay: float = 0.0):
+        self.name = name
+        self.delay = delay
+        self.failing = False
+        self.requests = 0
+        self.app = FastAPI()
+        self.app.get("/v1/models")(self.models)
+        self.app.post("/v1/chat/completions")(self.completions)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=0, log_level="error"))
+        self.task = None
+
+    async def models(self):
+        if self.failing:
+            return JSONResponse({"error": "down"}, status_code=500)
+        return {"object": "list", "data": [{"id": MODEL, "object": "model", "created": 0, "owned_by": "test"}]}
+
+    async def completions(self, request: Request):
+        body = await request.json()
+        self.requests += 1
+        if self.failing:
+            return JSONResponse({"error": {"message": "down"}}, status_code=500)
+        await asyncio.sleep(self.delay)
+        if not body.get("stream"):
+            return {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": 0, "model": MODEL,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.name},
+                             "finish_reason": "stop"}],
+            }
+
+        async def sse():
+            for content, finish in [(self.name, None), ("", "stop")]:
+                chunk = {
+                    "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": 0, "model": MODEL,
+                    "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": finish}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    async def start(self) -> str:
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1"
+
+    async def stop(self) -> None:
+        self.server.should_exit = True
+        await self.task
+
+
+def messages(conversation: str, turn: int = 0):
+    msgs = [{"role": "system", "content": "你是一个助手"}, {"role": "user", "content": conversation}]
+    for i in range(turn):
+        msgs += [{"role": "assistant", "content": f"回答{i}"}, {"role": "user", "content": f"追问{i}"}]
+    return msgs
+
+
+def run_with_servers(test, delays=(0.0, 0.0), routing=LEAST_OUTSTANDING, sticky=False):
+    async def run():
+        servers = [MockServer(f"s{i}", delay) for i, delay in enumerate(delays)]
+        urls = [await s.start() for s in servers]
+        pool = LLMPool([Backend(s.name, url) for s, url in zip(servers, urls)], routing=routing, sticky=sticky)
+        try:
+            await test(pool, servers)
+        finally:
+            await pool.stop_health_checks()
+            for s in servers:
+                await s.stop()
+
+    asyncio.run(run())
+
+
+async def ask(pool, msgs, stream=False) -> str:
+    resp = await pool.create(model=MODEL, messages=msgs, stream=stream)
+    if not stream:
+        return resp.choices[0].message.content
+    content = ""
+    async for chunk in resp:
+        content += chunk.choices[0].delta.content or ""
+    return content
+
+
+def test_least_outstanding_spreads_concurrent_requests():
+    async def test(pool, servers):
+        answers = await asyncio.gather(*[ask(pool, messages(f"问题{i}")) for i in range(8)])
+        assert sorted(answers) == ["s0"] * 4 + ["s1"] * 4
+        assert all(b.outstanding == 0 for b in pool.backends)
+
+    run_with_servers(test, delays=(0.2, 0.2))
+
+
+def test_sticky_conversation():
+    async def test(pool, servers):
+        for conv in ["北京天气", "讲个笑话", "英伟达财报", "今天几号"]:
+            answers = {await ask(pool, messages(conv, turn), stream=True) for turn in range(4)}
+            assert len(answers) == 1
+        assert pool.sticky_hits == 16
+
+    run_with_servers(test, sticky=True)
+
+
+def test_failover_ejection_and_readmission():
+    async def test(pool, servers):
+        servers[1].failing = True
+        # 每次并发两个请求：各分到一个后端，s1 上的失败后换到 s0
+        answers = []
+        for i in range(5):
+            answers += await asyncio.gather(ask(pool, messages(f"问题{i}")), ask(pool, messages(f"问题{i}b")))
+        assert answers == ["s0"] * 10
+        s1 = pool.backends[1]
+        assert not s1.healthy and s1.ejections == 1
+        assert pool.failovers == LLM_EJECT_FAILURES
+        # 摘除后不再分到请求
+        assert servers[1].requests == LLM_EJECT_FAILURES
+
+        servers[1].failing = False
+        for _ in range(LLM_READMIT_SUCCESSES):
+            await pool.probe_once()
+        assert s1.healthy
+        answers = await asyncio.gather(*[ask(pool, messages(f"问题{i}")) for i in range(4)])
+        assert "s1" in answers
+
+    run_with_servers(test, delays=(0.05, 0.05))
+
+
+def test_ewma_ttft_prefers_fast_backend():
+    async def test(pool, servers):
+        for i in range(4):
+            await asyncio.gather(ask(pool, messages(f"预热{i}"), stream=True), ask(pool, messages(f"预热{i}b"), stream=True))
+        st = time.monotonic()
+        answers = await asyncio.gather(*[ask(pool, messages(f"问题{i}"), stream=True) for i in range(10)])
+        assert answers.count("s0") > answers.count("s1")
+        assert pool.backends[0].ewma_ttft < pool.backends[1].ewma_ttft
+        assert time.monotonic() - st < 2
+
+    run_with_servers(test, delays=(0.02, 0.3), routing=EWMA_TTFT)
+
+
+if __name__ == "__main__":
+    test_least_outstanding_spreads_concurrent_requests()
+    test_sticky_conversation()
+    test_failover_ejection_and_readmission()
+    test_ewma_ttft_prefers_fast_backend()
+    print("ok")
@@ -0,0 +1,136 @@
+"""
+LLM 连接池测试
+
+用 test_llm_pool 中模拟的 OpenAI 兼容服务，验证：
+1. 启动预热后连接留在池中，后续请求复用，不再新建连接
+2. 流式请求在流结束前计入 in_flight，结束后归还
+3. 连接数用尽时等待空闲连接超时（pool_timeout）被统计，请求以 APITimeoutError 失败
+4. 数字形式的 timeout 被拆成分阶段超时，每个阶段不超过剩余总时间
+5. 非流式请求的 read 超时覆盖整个生成过程，而不是流式的 chunk 间隔
+6. 数字形式的 timeout 也是整个调用的截止时间，超出时以 APITimeoutError 失败
+
+运行：python test/test_llm_transport.py  或  pytest test/test_llm_transport.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai  # noqa: E402
+
+from config import DEADLINE_DECODE_TOKENS_PER_SECOND, LLM_HTTP_CFG  # noqa: E402
+from llm_pool import Backend, LLMPool, request_timeout  # noqa: E402
+from test_llm_pool import MODEL, MockServer, messages  # noqa: E402
+
+
+def run_with_server(test, http_cfg, delay=0.0):
+    async def run():
+        server = MockServer("s0", delay)
+        url = await server.start()
+        pool = LLMPool([Backend("s0", url, http_cfg=http_cfg)], sticky=False)
+        try:
+            await test(pool, pool.backends[0].transport)
+        finally:
+            await pool.stop_health_checks()
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_warmup_connections_are_reused():
+    cfg = {**LLM_HTTP_CFG, "max_connections": 8, "max_keepalive_connections": 8, "warmup_connections": 3}
+
+    async def test(pool, transport):
+        await pool.warmup()
+        stats = transport.stats()
+        assert stats["connections"] == 3 and stats["idle_connections"] == 3
+        await asyncio.gather(*[pool.create(model=MODEL, messages=messages(f"问题{i}")) for i in range(3)])
+        stats = transport.stats()
+        assert stats["connections"] == 3
+        assert stats["requests"] == 6 and stats["in_flight"] == 0
+
+    run_with_server(test, cfg, delay=0.05)
+
+
+def test_stream_counts_as_in_flight_until_closed():
+    async def test(pool, transport):
+        stream = await pool.create(model=MODEL, messages=messages("你好"), stream=True)
+        assert transport.in_flight == 1
+        async for _ in stream:
+            pass
+        assert transport.in_flight == 0
+
+        stream = await pool.create(model=MODEL, messages=messages("你好"), stream=True)
+        await stream.close()
+        assert transport.in_flight == 0
+        assert transport.stats()["peak_in_flight"] == 1
+
+    run_with_server(test, LLM_HTTP_CFG)
+
+
+def test_pool_timeout_is_counted():
+    cfg = {**LLM_HTTP_CFG, "max_connections": 1, "max_keepalive_connections": 1, "pool_timeout": 0.05}
+
+    async def test(pool, transport):
+        results = await asyncio.gather(
+            *[pool.create(model=MODEL, messages=messages(f"问题{i}")) for i in range(2)],
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        assert len(errors) == 1 and isinstance(errors[0], openai.APITimeoutError)
+        stats = transport.stats()
+        assert stats["pool_timeouts"] == 1 and stats["in_flight"] == 0
+        # 等待连接超时不算后端故障
+        assert pool.backends[0].consecutive_failures == 0
+
+    run_with_server(test, cfg, delay=0.3)
+
+
+def test_request_timeout_capped_by_total():
+    cfg = {"connect_timeout": 3.0, "read_timeout": 60.0, "write_timeout": 10.0, "pool_timeout": 5.0}
+    t = request_timeout(4.0, cfg)
+    assert (t.connect, t.read, t.write, t.pool) == (3.0, 4.0, 4.0, 4.0)
+    t = request_timeout(cfg=cfg)
+    assert (t.connect, t.read, t.write, t.pool) == (3.0, 60.0, 10.0, 5.0)
+    # 非流式：read 覆盖整个生成过程
+    assert request_timeout(90.0, cfg, stream=False).read == 90.0
+    assert request_timeout(cfg=cfg, stream=False, max_tokens=3000).read == 3000 / DEADLINE_DECODE_TOKENS_PER_SECOND
+    assert request_timeout(cfg=cfg, stream=False, max_tokens=10).read == 60.0
+
+
+def test_non_stream_read_covers_generation():
+    # 流式 chunk 间隔 0.1 秒，而非流式响应要等生成结束（0.3 秒）才返回
+    cfg = {**LLM_HTTP_CFG, "read_timeout": 0.1}
+
+    async def test(pool, transport):
+        resp = await pool.create(model=MODEL, messages=messages("你好"), max_tokens=30)
+        assert resp.choices[0].message.content == "s0"
+
+    run_with_server(test, cfg, delay=0.3)
+
+
+def test_total_budget_is_enforced():
+    async def test(pool, transport):
+        st = time.monotonic()
+        try:
+            await pool.create(model=MODEL, messages=messages("你好"), max_tokens=3000, timeout=0.2)
+        except openai.APITimeoutError:
+            pass
+        else:
+            raise AssertionError("expected APITimeoutError")
+        assert time.monotonic() - st < 0.4
+        assert pool.backends[0].outstanding == 0
+
+    run_with_server(test, LLM_HTTP_CFG, delay=1.0)
+
+
+if __name__ == "__main__":
+    test_warmup_connections_are_reused()
+    test_stream_counts_as_in_flight_until_closed()
+    test_pool_timeout_is_counted()
+    test_request_timeout_capped_by_total()
+    test_non_stream_read_covers_generation()
+    test_total_budget_is_enforced()
+    print("ok")
@@ -0,0 +1,125 @@
+"""
+前缀缓存友好的 prompt 布局测试
+
+验证 utils.build_prompt_messages 及聊天处理实际发出的消息：
+1. 顺序：静态规则前缀 + 人设（同一条 system）→ 历史 → 易变信息（system）→ 最后一条 user
+2. 易变信息之前的内容在不同日期、不同位置的请求间逐字节相同（vLLM 前缀缓存可复用）
+
+运行：python test/test_prompt_layout.py  或  pytest test/test_prompt_layout.py
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chat_handlers  # noqa: E402
+import llm_pool  # noqa: E402
+import schema  # noqa: E402
+from schema import STATIC_RULES_PREFIX, Message  # noqa: E402
+from test_client_disconnect import FakeStream, chunk  # noqa: E402
+from utils import build_prompt_messages  # noqa: E402
+
+PERSONA = "你是小智，一个乐于助人的助手"
+CLIENT_MESSAGES = [
+    {"role": "system", "content": PERSONA},
+    {"role": "user", "content": "你好呀"},
+    {"role": "assistant", "content": "你好！有什么可以帮你？"},
+    {"role": "user", "content": "今日天气"},
+]
+
+
+def prefix_before_volatile(messages) -> str:
+    """易变信息 system 消息之前的全部内容（序列化后逐字节比较）"""
+    end = next(i for i, m in enumerate(messages) if i > 0 and m["role"] == "system")
+    return json.dumps(messages[:end], ensure_ascii=False)
+
+
+def test_layout_order():
+    volatile = ["【今日基准时间】今日日期：2026-01-08", "【用户所在地信息】广西壮族自治区钦州市"]
+    result = build_prompt_messages([dict(m) for m in CLIENT_MESSAGES], STATIC_RULES_PREFIX, volatile)
+
+    assert [m["role"] for m in result] == ["system", "user", "assistant", "system", "user"]
+    assert result[0]["content"] == f"{STATIC_RULES_PREFIX}\n\n{PERSONA}"
+    assert result[3]["content"] == "\n\n".join(volatile)
+    assert result[4] == CLIENT_MESSAGES[-1]
+
+
+def test_prefix_identical_across_dates_and_locations():
+    prefixes = set()
+    for day in ["2026-01-08", "2026-02-17"]:
+        for city in ["广西壮族自治区钦州市", "北京市"]:
+            volatile = [f"【今日基准时间】今日日期：{day}", f"【用户所在地信息】{city}"]
+            result = build_prompt_messages([dict(m) for m in CLIENT_MESSAGES], STATIC_RULES_PREFIX, volatile)
+            prefixes.add(prefix_before_volatile(result))
+    assert len(prefixes) == 1
+
+    # 没有易变信息时不插入空的 system 消息
+    result = build_prompt_messages([dict(m) for m in CLIENT_MESSAGES], STATIC_RULES_PREFIX, ["", ""])
+    assert [m["role"] for m in result] == ["system", "user", "assistant", "user"]
+
+
+class RecordingClient:
+    """记录第一轮请求的消息，直接结束回答"""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return FakeStream([chunk(content="好"), chunk(finish_reason="stop")], interval=0)
+
+
+def fixed_datetime(day: str):
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.fromisoformat(f"{day}T09:30:00")
+    return FixedDatetime
+
+
+def sent_messages(day: str, location: str):
+    client = RecordingClient()
+    saved_pool, saved_datetime = chat_handlers.pool, schema.datetime
+    chat_handlers.pool = llm_pool.LLMPool([llm_pool.Backend("fake", "http://fake/v1", client=client)])
+    schema.datetime = fixed_datetime(day)
+    messages = [Message(**m) for m in CLIENT_MESSAGES]
+
+    async def run():
+        async for _ in chat_handlers.chat_completion_stream(messages, location=location):
+            pass
+
+    try:
+        asyncio.run(run())
+    finally:
+        chat_handlers.pool, schema.datetime = saved_pool, saved_datetime
+    return client.calls[0]["messages"]
+
+
+def test_handler_sends_stable_prefix():
+    sent = [sent_messages(day, location)
+            for day in ["2026-01-08", "2026-02-17"]
+            for location in ["广西壮族自治区钦州市钦南区", "北京市海淀区"]]
+
+    for messages in sent:
+        roles = [m["role"] for m in messages]
+        assert messages[0]["content"].startswith(STATIC_RULES_PREFIX)
+        assert messages[0]["content"].endswith(PERSONA)
+        # 易变的 system 消息紧挨在最后一条 user 之前
+        assert roles[-2:] == ["system", "user"]
+        assert messages[-1]["content"] == CLIENT_MESSAGES[-1]["content"]
+
+    assert "2026-01-08" in sent[0][-2]["content"] and "钦州" in sent[0][-2]["content"]
+    assert "2026-02-17" in sent[3][-2]["content"] and "北京" in sent[3][-2]["content"]
+    assert len({prefix_before_volatile(m) for m in sent}) == 1
+
+
+if __name__ == "__main__":
+    test_layout_order()
+    test_prefix_identical_across_dates_and_locations()
+    test_handler_sends_stable_prefix()
+    print("ok")
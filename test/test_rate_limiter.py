@@ -0,0 +1,102 @@
+"""
+令牌桶限流测试
+
+验证：
+1. burst 以内立即放行，超出部分按 qps 排队
+2. 预计等待超过调用方截止时间、或队列已满时立即拒绝
+3. 服务商被限流时快速失败，run_search 返回过期缓存
+
+运行：python test/test_rate_limiter.py  或  pytest test/test_rate_limiter.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_providers  # noqa: E402
+import search_service  # noqa: E402
+from config import SEARCH_FALLBACKS, SEARCH_PRIMARY, SEARCH_SECONDARY  # noqa: E402
+from rate_limiter import TokenBucket  # noqa: E402
+
+QPS = 20
+BURST = 5
+
+
+async def run_burst(n: int):
+    bucket = TokenBucket("test", qps=QPS, burst=BURST, max_queue=100)
+    st = time.monotonic()
+    done_at = []
+
+    async def one():
+        assert await bucket.acquire()
+        done_at.append(time.monotonic() - st)
+
+    await asyncio.gather(*[one() for _ in range(n)])
+    return sorted(done_at), bucket
+
+
+def test_burst_then_qps():
+    n = BURST + 10
+    done_at, bucket = asyncio.run(run_burst(n))
+
+    assert all(t < 0.05 for t in done_at[:BURST])
+    # 超出 burst 的 10 个请求约需 10 / QPS 秒
+    assert abs(done_at[-1] - (n - BURST) / QPS) < 0.1, done_at[-1]
+    assert bucket.queue_depth == 0
+    assert bucket.stats()["wait"]["count"] == n
+
+
+async def run_rejections():
+    bucket = TokenBucket("test", qps=1, burst=1, max_queue=1)
+    assert await bucket.acquire()
+    # 需要等 1 秒，但截止时间只剩 0.1 秒
+    assert not await bucket.acquire(time.monotonic() + 0.1)
+    # 一个排队中，第二个因队列已满被拒绝
+    waiter = asyncio.create_task(bucket.acquire())
+    await asyncio.sleep(0)
+    assert not await bucket.acquire()
+    waiter.cancel()
+    return bucket
+
+
+def test_rejects_on_deadline_and_full_queue():
+    bucket = asyncio.run(run_rejections())
+    assert bucket.rejected_deadline == 1
+    assert bucket.rejected_queue_full == 1
+
+
+async def fake_search(query: str) -> dict:
+    return {"code": 200, "msg": f"fresh: {query}"}
+
+
+def test_rate_limited_search_serves_stale_cache():
+    names = list(dict.fromkeys(n for n in [SEARCH_PRIMARY, SEARCH_SECONDARY, *SEARCH_FALLBACKS] if n))
+    saved = {name: search_providers.get_provider(name) for name in names}
+    for name in names:
+        search_providers.register_provider(search_providers.SearchProvider(
+            name, fake_search, rate_limit={"qps": 0.01, "burst": 1, "max_queue": 0}))
+    search_service.search_cache.clear()
+    try:
+        first = asyncio.run(search_service.run_search("今日金价"))
+        assert first["code"] == 200
+        key = search_service.normalize_query("今日金价")
+        value, _ = search_service.search_cache._data[key]
+        search_service.search_cache._data[key] = (value, time.monotonic() - 1)
+
+        # 令牌已用完：所有服务商都返回"搜索繁忙"，改为返回过期缓存
+        res = asyncio.run(search_service.run_search("今日金价", time.monotonic() + 1))
+        assert res == first
+    finally:
+        for provider in saved.values():
+            search_providers.register_provider(provider)
+        search_service.search_cache.clear()
+
+
+if __name__ == "__main__":
+    # 只测试内存缓存，不读写持久化缓存文件（pytest 下由 conftest.py 处理）
+    search_service.disk_cache = None
+    done_at, bucket = asyncio.run(run_burst(BURST + 10))
+    print("获得令牌时间(ms)：", [round(t * 1000) for t in done_at])
+    print(bucket.stats())
@@ -0,0 +1,99 @@
+"""
+请求时间预算测试
+
+用假的 OpenAI 流验证：
+1. 剩余预算不够 搜索 + 回答：不带工具，带提示直接回答，记录 search skipped
+2. 剩余时间不够按 max_tokens 解码：截短 max_tokens，并以剩余预算作为请求超时
+3. 流式输出过程中超出预算：关闭上游流，返回 deadline 错误，记录阶段结果
+
+运行：python test/test_request_budget.py  或  pytest test/test_request_budget.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chat_handlers  # noqa: E402
+import llm_pool  # noqa: E402
+import request_budget  # noqa: E402
+from config import DEADLINE_MIN_MAX_TOKENS  # noqa: E402
+from request_budget import RequestBudget, parse_timeout  # noqa: E402
+from schema import DEADLINE_NOTE_SYSTEM, Message  # noqa: E402
+from test_client_disconnect import FakeStream, chunk  # noqa: E402
+
+
+class RecordingClient:
+    """记录每次 create 的参数"""
+
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.calls = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.streams.pop(0)
+
+
+def run_stream(streams, budget, text="英伟达最新财报"):
+    original = chat_handlers.pool
+    fake = RecordingClient(streams)
+    chat_handlers.pool = llm_pool.LLMPool([llm_pool.Backend("fake", "http://fake/v1", client=fake)])
+
+    async def run():
+        items = []
+        async for item in chat_handlers.chat_completion_stream(
+            [Message(role="user", content=text)], max_tokens=3000, budget=budget
+        ):
+            items.append(item)
+        return items
+
+    try:
+        return asyncio.run(run()), fake
+    finally:
+        chat_handlers.pool = original
+
+
+def test_parse_timeout():
+    assert parse_timeout("12.5") == 12.5
+    assert parse_timeout(None) is None
+    assert parse_timeout("abc") is None
+    assert parse_timeout(-1) is None
+    assert RequestBudget(10_000).seconds == request_budget.REQUEST_DEADLINE_MAX
+
+
+def test_low_budget_skips_search_and_cuts_max_tokens():
+    stream = FakeStream([chunk(content="好的"), chunk(finish_reason="stop")])
+    budget = RequestBudget(2)
+    items, fake = run_stream([stream], budget)
+
+    assert len(fake.calls) == 1
+    call = fake.calls[0]
+    assert "tools" not in call
+    assert call["messages"][-1] == DEADLINE_NOTE_SYSTEM
+    assert DEADLINE_MIN_MAX_TOKENS <= call["max_tokens"] < 3000
+    assert 0 < call["timeout"].read <= 2 and call["timeout"].connect <= 2
+    assert [s[:2] for s in budget.stages] == [("search", "skipped"), ("first", "ok")]
+    assert items[-1]["choices"][0]["finish_reason"] == "stop"
+
+
+def test_deadline_during_stream_closes_upstream():
+    stream = FakeStream([chunk(content=str(i)) for i in range(100)] + [chunk(finish_reason="stop")], interval=0.02)
+    budget = RequestBudget(0.1)
+    before = request_budget.stats().get("first", {}).get("outcomes", {}).get("deadline", 0)
+    items, fake = run_stream([stream], budget)
+
+    assert stream.closed
+    assert items[-1]["type"] == "error" and items[-1]["stage"] == "deadline"
+    assert len(items) < 20
+    assert budget.stages[-1][:2] == ("first", "deadline")
+    assert request_budget.stats()["first"]["outcomes"]["deadline"] == before + 1
+
+
+if __name__ == "__main__":
+    test_parse_timeout()
+    test_low_budget_skips_search_and_cuts_max_tokens()
+    test_deadline_during_stream_closes_upstream()
+    print("ok")
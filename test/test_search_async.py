@@ -0,0 +1,156 @@
+"""
+异步搜索并发测试
+
+用本地 MockTransport 模拟百度搜索（每次固定延迟），验证：
+1. N 个并发的工具调用请求总耗时 ≈ 单个请求耗时（事件循环未被阻塞）
+2. 搜索进行中，其他协程（如 token 转发）仍能正常调度
+3. 相同查询的并发请求只会发起一次上游调用（singleflight）
+4. 没有可用引用时返回非 200 的 NO_RESULT，不写入缓存
+
+运行：python test/test_search_async.py  或  pytest test/test_search_async.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_pool  # noqa: E402
+import search  # noqa: E402
+import search_service  # noqa: E402
+
+SEARCH_DELAY = 0.5   # 模拟的上游搜索延迟（秒）
+N_PARALLEL = 20      # 并发请求数
+
+upstream_calls = 0
+
+
+async def fake_baidu(request: httpx.Request) -> httpx.Response:
+    """模拟百度搜索接口：固定延迟后返回一条引用"""
+    global upstream_calls
+    upstream_calls += 1
+    await asyncio.sleep(SEARCH_DELAY)
+    query = json.loads(request.content)["messages"][0]["content"]
+    return httpx.Response(200, json={
+        "references": [
+            {"id": 1, "title": f"{query} 标题", "content": "内容", "date": "2026-01-08",
+             "rerank_score": 0.9, "authority_score": 0.8},
+        ]
+    })
+
+
+def use_mock_client():
+    http_pool._clients["baidu"] = httpx.AsyncClient(transport=httpx.MockTransport(fake_baidu))
+
+
+async def timed_search(query: str) -> tuple[dict, float]:
+    st = time.perf_counter()
+    res = await search.async_search_baidu(query)
+    return res, time.perf_counter() - st
+
+
+async def run_concurrency():
+    use_mock_client()
+
+    # 单个请求耗时
+    _, single = await timed_search("今日天气 广西壮族自治区钦州市")
+
+    # 心跳协程：模拟同一 worker 上其他流的 token 转发
+    ticks = 0
+    stop = asyncio.Event()
+
+    async def heartbeat():
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    hb = asyncio.create_task(heartbeat())
+    st = time.perf_counter()
+    results = await asyncio.gather(*[
+        timed_search(f"今日纳斯达克指数 {i}") for i in range(N_PARALLEL)
+    ])
+    total = time.perf_counter() - st
+    stop.set()
+    await hb
+    await http_pool.close_all()
+
+    return single, total, ticks, results
+
+
+def test_parallel_searches_finish_in_single_latency():
+    single, total, ticks, results = asyncio.run(run_concurrency())
+
+    assert all(res["code"] == 200 for res, _ in results)
+    # N 个并发请求总耗时应接近单个请求，而不是 N 倍
+    assert total < single * 2, f"single={single:.3f}s total={total:.3f}s"
+    # 搜索期间事件循环保持响应
+    assert ticks >= int(SEARCH_DELAY / 0.01) // 2, f"ticks={ticks}"
+
+
+async def run_coalescing():
+    global upstream_calls
+    use_mock_client()
+    search_service.search_cache.clear()
+    upstream_calls = 0
+
+    results = await asyncio.gather(*[
+        search_service.run_search("今日天气 广西壮族自治区钦州市") for _ in range(N_PARALLEL)
+    ])
+    await http_pool.close_all()
+    return results, upstream_calls
+
+
+def test_identical_searches_are_coalesced():
+    results, calls = asyncio.run(run_coalescing())
+
+    assert all(res["code"] == 200 for res in results)
+    assert calls == 1, f"upstream_calls={calls}"
+
+
+async def run_empty_result():
+    async def empty_baidu(request: httpx.Request) -> httpx.Response:
+        # 只有空内容的引用：格式化后为空
+        return httpx.Response(200, json={"references": [{"id": 1, "title": "标题", "content": " "}]})
+
+    http_pool._clients["baidu"] = httpx.AsyncClient(transport=httpx.MockTransport(empty_baidu))
+    res = await search.async_search_baidu("没有结果的查询")
+    await http_pool.close_all()
+
+    saved = search_service.hedged_search
+
+    async def fake_hedged(query, deadline=None):
+        return res
+
+    search_service.hedged_search = fake_hedged
+    search_service.search_cache.clear()
+    try:
+        await search_service._fetch("没有结果的查询", "没有结果的查询", None)
+    finally:
+        search_service.hedged_search = saved
+    return res, search_service.search_cache.ttl_remaining("没有结果的查询")
+
+
+def test_empty_result_is_not_cached():
+    res, remaining = asyncio.run(run_empty_result())
+
+    assert res == search.NO_RESULT
+    assert remaining is None
+
+
+if __name__ == "__main__":
+    # 只测试内存缓存，不读写持久化缓存文件（pytest 下由 conftest.py 处理）
+    search_service.disk_cache = None
+    single, total, ticks, _ = asyncio.run(run_concurrency())
+    print(f"单个请求耗时: {single * 1000:.1f} ms")
+    print(f"{N_PARALLEL} 个并发请求总耗时: {total * 1000:.1f} ms")
+    print(f"期间心跳次数: {ticks}")
+
+    _, calls = asyncio.run(run_coalescing())
+    print(f"{N_PARALLEL} 个相同查询的上游调用次数: {calls}")
+
+    test_empty_result_is_not_cached()
@@ -0,0 +1,148 @@
+"""
+搜索结果缓存（TTLCache）测试
+
+用可拨动的假时钟替换 search_cache 中的 time，验证：
+1. 按主题分类的 TTL：realtime / daily / stable 各自到期
+2. 宽限期内返回旧结果（get_or_stale），ttl_remaining 过期后为负数
+3. 超出容量时按最久未使用淘汰（get 会刷新使用顺序）
+4. 命中 / 未命中 / 过期 / 淘汰 / 宽限命中统计
+5. HotKeys 不运行 decay() 也不会超过 max_keys，已满时替换热度最低的 key
+
+运行：python test/test_search_cache.py  或  pytest test/test_search_cache.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_cache  # noqa: E402
+from config import SEARCH_CACHE_GRACE, SEARCH_CACHE_TTL  # noqa: E402
+from search_cache import HotKeys, TTLCache, grace_for_query, ttl_class, ttl_for_query  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def with_clock(test):
+    def run():
+        clock = FakeClock()
+        original = search_cache.time
+        search_cache.time = clock
+        try:
+            test(clock)
+        finally:
+            search_cache.time = original
+    run.__name__ = test.__name__
+    return run
+
+
+def test_ttl_classes():
+    assert ttl_class("英伟达股价") == "realtime"
+    assert ttl_class("今天新闻") == "daily"
+    assert ttl_class("李白是谁") == "stable"
+    assert ttl_for_query("英伟达股价") == SEARCH_CACHE_TTL["realtime"]
+    assert grace_for_query("李白是谁") == SEARCH_CACHE_GRACE["stable"]
+
+
+@with_clock
+def test_expiry_per_ttl_class(clock):
+    for q in ["英伟达股价", "今天新闻", "李白是谁"]:
+        cache = TTLCache(16)
+        ttl = ttl_for_query(q)
+        cache.set(q, q, ttl)
+        clock.advance(ttl - 1)
+        assert cache.get(q) == q
+        clock.advance(1)
+        assert cache.get(q) is None
+        assert cache.ttl_remaining(q) == 0
+
+
+@with_clock
+def test_get_or_stale_within_grace(clock):
+    cache = TTLCache(16)
+    cache.set("k", "v", 10)
+    assert cache.get_or_stale("k", grace=5) == ("v", False)
+    assert cache.ttl_remaining("k") == 10
+
+    clock.advance(12)
+    assert cache.ttl_remaining("k") == -2
+    assert cache.get_or_stale("k", grace=5) == ("v", True)
+    clock.advance(4)
+    assert cache.get_or_stale("k", grace=5) == (None, False)
+    # 上游不可用时的兜底
+    assert cache.get_stale("k", max_stale=10) == "v"
+    assert cache.ttl_remaining("missing") is None
+
+
+@with_clock
+def test_lru_eviction_order(clock):
+    cache = TTLCache(3)
+    for k in "abc":
+        cache.set(k, k, 60)
+    # 访问 a 使其变为最近使用，再插入 d 时淘汰 b
+    assert cache.get("a") == "a"
+    cache.set("d", "d", 60)
+    assert cache.get("b") is None
+    # 覆盖写 c 也会刷新顺序，再插入 e 淘汰 a
+    cache.set("c", "c2", 60)
+    cache.set("e", "e", 60)
+    assert cache.get("a") is None
+    assert [cache.get(k) for k in "cde"] == ["c2", "d", "e"]
+    assert cache.evictions == 2 and len(cache) == 3
+
+
+@with_clock
+def test_stats(clock):
+    cache = TTLCache(2)
+    cache.set("a", 1, 10)
+    cache.get("a")            # hit
+    cache.get("missing")      # miss
+    clock.advance(11)
+    cache.get("a")            # expired -> miss
+    cache.get_or_stale("a", grace=5)   # expired miss + grace hit
+    cache.get_stale("a", max_stale=5)
+    cache.set("b", 2, 10)
+    cache.set("c", 3, 10)     # evicts a
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["expirations"] == 2
+    assert stats["grace_hits"] == 1
+    assert stats["stale_hits"] == 1
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+    assert stats["hit_rate"] == 0.25
+
+
+def test_hot_keys_bounded_without_decay():
+    hot = HotKeys(max_keys=3)
+    for key, hits in [("a", 3), ("b", 1), ("c", 2)]:
+        for _ in range(hits):
+            hot.touch(key, key.upper())
+    # 已满：新 key 替换热度最低的 b
+    hot.touch("d", "D")
+    assert len(hot) == 3
+    assert hot.top(3) == [("a", "A"), ("c", "C"), ("d", "D")]
+    for i in range(100):
+        hot.touch(f"cold{i}", "")
+    assert len(hot) == 3
+    assert hot.top(2) == [("a", "A"), ("c", "C")]
+
+
+if __name__ == "__main__":
+    test_ttl_classes()
+    test_expiry_per_ttl_class()
+    test_get_or_stale_within_grace()
+    test_lru_eviction_order()
+    test_stats()
+    test_hot_keys_bounded_without_decay()
+    print("ok")
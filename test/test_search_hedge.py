@@ -0,0 +1,119 @@
+"""
+对冲请求测试
+
+用假的服务商函数模拟主/备用搜索服务商，验证：
+1. 主服务商超过对冲等待时间仍未返回时，发起备用请求并采用先返回的结果
+2. 主服务商在等待时间内返回时，不发起备用请求
+3. 主服务商提前失败时，直接改用备用服务商
+4. 失败请求的延迟不计入对冲等待时间使用的延迟直方图
+
+运行：python test/test_search_hedge.py  或  pytest test/test_search_hedge.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_providers  # noqa: E402
+import search_service  # noqa: E402
+from config import HEDGE_MIN_DELAY, HEDGE_MIN_SAMPLES, SEARCH_PRIMARY, SEARCH_SECONDARY  # noqa: E402
+
+
+def fake_provider(name: str, delay: float, ok: bool = True, calls: list = None):
+    async def fn(query: str) -> dict:
+        if calls is not None:
+            calls.append(name)
+        await asyncio.sleep(delay)
+        return {"code": 200 if ok else 400, "msg": f"{name}: {query}"}
+    return search_providers.SearchProvider(name, fn)
+
+
+def install(primary, secondary):
+    saved = {name: search_providers.get_provider(name) for name in (SEARCH_PRIMARY, SEARCH_SECONDARY)}
+    search_providers.register_provider(primary)
+    search_providers.register_provider(secondary)
+    return saved
+
+
+def restore(saved):
+    for provider in saved.values():
+        search_providers.register_provider(provider)
+
+
+async def timed(query: str):
+    st = time.perf_counter()
+    res = await search_service.hedged_search(query)
+    return res, time.perf_counter() - st
+
+
+def test_slow_primary_is_hedged():
+    primary = fake_provider(SEARCH_PRIMARY, 5)
+    secondary = fake_provider(SEARCH_SECONDARY, 0.05)
+    saved = install(primary, secondary)
+    try:
+        res, elapsed = asyncio.run(timed("今日金价"))
+    finally:
+        restore(saved)
+
+    assert res["msg"].startswith(SEARCH_SECONDARY)
+    assert elapsed < primary.hedge_delay() + 1, f"elapsed={elapsed:.3f}s"
+
+
+def test_fast_primary_skips_hedge():
+    calls = []
+    saved = install(fake_provider(SEARCH_PRIMARY, 0.05, calls=calls),
+                    fake_provider(SEARCH_SECONDARY, 0.05, calls=calls))
+    try:
+        res, _ = asyncio.run(timed("今日金价"))
+    finally:
+        restore(saved)
+
+    assert res["msg"].startswith(SEARCH_PRIMARY)
+    assert calls == [SEARCH_PRIMARY]
+
+
+def test_failed_primary_fails_over():
+    saved = install(fake_provider(SEARCH_PRIMARY, 0.01, ok=False),
+                    fake_provider(SEARCH_SECONDARY, 0.05))
+    try:
+        res, _ = asyncio.run(timed("今日金价"))
+    finally:
+        restore(saved)
+
+    assert res["code"] == 200
+    assert res["msg"].startswith(SEARCH_SECONDARY)
+
+
+def test_failures_do_not_inflate_hedge_delay():
+    outcomes = [True] * HEDGE_MIN_SAMPLES + [False] * 4
+
+    async def fn(query: str) -> dict:
+        if outcomes.pop(0):
+            return {"code": 200, "msg": query}
+        # 失败的请求都很慢：若计入直方图，p95 会被拉高到 0.1 秒
+        await asyncio.sleep(0.1)
+        return {"code": 400, "msg": "搜索异常"}
+
+    provider = search_providers.SearchProvider("flaky", fn, rate_limit={})
+
+    async def run():
+        for _ in range(HEDGE_MIN_SAMPLES + 4):
+            await provider.search("今日金价")
+
+    asyncio.run(run())
+    assert len(provider.latency) == HEDGE_MIN_SAMPLES
+    assert len(provider.error_latency) == 4
+    assert provider.latency.percentile(95) < 0.05
+    assert provider.hedge_delay() == HEDGE_MIN_DELAY
+    assert provider.stats()["errors"] == 4
+
+
+if __name__ == "__main__":
+    saved = install(fake_provider(SEARCH_PRIMARY, 5), fake_provider(SEARCH_SECONDARY, 0.05))
+    try:
+        res, elapsed = asyncio.run(timed("今日金价"))
+    finally:
+        restore(saved)
+    print(f"慢主服务商：{res['msg']}，耗时 {elapsed * 1000:.1f} ms")
@@ -0,0 +1,140 @@
+"""
+缓存宽限期与热点提前刷新测试
+
+用假的服务商函数计数上游调用，验证：
+1. 过期但在宽限期内的缓存立即返回旧结果，并在后台刷新
+2. 热点查询剩余 TTL 不足时被提前刷新；令牌桶余量不足时跳过
+3. 一轮中待刷新的热点查询很多时，刷新数不超过令牌余量减去 SEARCH_REFRESH_MIN_TOKENS，令牌桶不被耗尽
+
+运行：python test/test_search_refresh.py  或  pytest test/test_search_refresh.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_providers  # noqa: E402
+import search_service  # noqa: E402
+from config import SEARCH_FALLBACKS, SEARCH_PRIMARY, SEARCH_REFRESH_MIN_TOKENS, SEARCH_SECONDARY  # noqa: E402
+from search_cache import hot_keys, normalize_query, search_cache  # noqa: E402
+
+QUERY = "今日纳斯达克指数"
+NAMES = list(dict.fromkeys(n for n in [SEARCH_PRIMARY, SEARCH_SECONDARY, *SEARCH_FALLBACKS] if n))
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, query: str) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"code": 200, "msg": f"v{self.calls}"}
+
+
+def install(rate_limit):
+    upstream = Upstream()
+    saved = {name: search_providers.get_provider(name) for name in NAMES}
+    for name in NAMES:
+        search_providers.register_provider(search_providers.SearchProvider(name, upstream, rate_limit=rate_limit))
+    search_cache.clear()
+    return saved, upstream
+
+
+def restore(saved):
+    for provider in saved.values():
+        search_providers.register_provider(provider)
+    search_cache.clear()
+
+
+def age(key: str, seconds_left: float):
+    value, _ = search_cache._data[key]
+    search_cache._data[key] = (value, time.monotonic() + seconds_left)
+
+
+async def run_stale_while_revalidate():
+    key = normalize_query(QUERY)
+    first = await search_service.run_search(QUERY)
+    age(key, -1)
+
+    st = time.monotonic()
+    stale = await search_service.run_search(QUERY)
+    elapsed = time.monotonic() - st
+    await asyncio.sleep(0.2)
+    fresh = await search_service.run_search(QUERY)
+    return first, stale, elapsed, fresh
+
+
+def test_stale_entry_served_and_revalidated():
+    saved, upstream = install({"qps": 100, "burst": 10, "max_queue": 10})
+    try:
+        first, stale, elapsed, fresh = asyncio.run(run_stale_while_revalidate())
+    finally:
+        restore(saved)
+
+    assert stale == first
+    assert elapsed < 0.02, f"elapsed={elapsed:.3f}s"
+    assert fresh["msg"] == "v2"
+    assert upstream.calls == 2
+
+
+async def run_refresh_ahead(drain_tokens: bool):
+    key = normalize_query(QUERY)
+    await search_service.run_search(QUERY)
+    age(key, 1)
+    limiter = search_providers.get_provider(SEARCH_PRIMARY).limiter
+    if drain_tokens:
+        limiter._tokens = 0
+    refreshed = search_service.refresh_ahead_once()
+    await asyncio.sleep(0.2)
+    return refreshed, search_cache.ttl_remaining(key)
+
+
+def test_hot_key_refreshed_ahead_within_rate_limit():
+    saved, upstream = install({"qps": 0.001, "burst": 5, "max_queue": 10})
+    try:
+        refreshed, remaining = asyncio.run(run_refresh_ahead(drain_tokens=False))
+        assert refreshed == 1 and upstream.calls == 2
+        assert remaining > 1
+
+        hot_keys.touch(normalize_query(QUERY), QUERY)
+        refreshed, _ = asyncio.run(run_refresh_ahead(drain_tokens=True))
+        assert refreshed == 0
+    finally:
+        restore(saved)
+
+
+async def run_many_hot_keys(n: int):
+    # 直接写入即将过期的缓存条目，不经过上游（上游调用只来自提前刷新）
+    for i in range(n):
+        query = f"{QUERY} {i}"
+        key = normalize_query(query)
+        search_cache.set(key, {"code": 200, "msg": query}, 1)
+        hot_keys.touch(key, query)
+    limiter = search_providers.get_provider(SEARCH_PRIMARY).limiter
+    refreshed = search_service.refresh_ahead_once()
+    await asyncio.sleep(0.2)
+    return refreshed, limiter.headroom()
+
+
+def test_refresh_ahead_bounded_by_token_budget():
+    saved, upstream = install({"qps": 0.001, "burst": 5, "max_queue": 10})
+    try:
+        refreshed, headroom = asyncio.run(run_many_hot_keys(20))
+    finally:
+        restore(saved)
+
+    assert refreshed == 5 - SEARCH_REFRESH_MIN_TOKENS
+    assert upstream.calls == refreshed
+    assert headroom >= SEARCH_REFRESH_MIN_TOKENS - 0.01
+
+
+if __name__ == "__main__":
+    # 只测试内存缓存，不读写持久化缓存文件（pytest 下由 conftest.py 处理）
+    search_service.disk_cache = None
+    test_stale_entry_served_and_revalidated()
+    test_hot_key_refreshed_ahead_within_rate_limit()
+    test_refresh_ahead_bounded_by_token_budget()
+    print("ok")
@@ -0,0 +1,106 @@
+"""
+本地搜索必要性路由测试
+
+验证：
+1. 含泛用词（现在 / 统计 / 分布 / 排名 / 事件）的闲聊、知识和编程问题不会被强制搜索
+2. 只有规则命中时得分低于搜索阈值，回退到模型两轮流程；线性模型同样判断为搜索时才直接搜索
+3. 询问时间 / 日期、打招呼直接回答
+4. 最近 5 轮对话中已调用过 search 时不直接搜索（由模型判断是否复用）
+
+运行：python test/test_search_router.py  或  pytest test/test_search_router.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_router  # noqa: E402
+from config import ROUTER_SEARCH_THRESHOLD  # noqa: E402
+from search_router import route  # noqa: E402
+
+
+class FixedModel:
+    """固定输出概率的线性模型替身"""
+
+    def __init__(self, p: float):
+        self.p = p
+
+    def predict_proba(self, text: str) -> float:
+        return self.p
+
+
+def user(text: str):
+    return [{"role": "user", "content": text}]
+
+
+def without_model(fn):
+    def run():
+        saved = search_router.linear_model
+        search_router.linear_model = None
+        try:
+            fn()
+        finally:
+            search_router.linear_model = saved
+    run.__name__ = fn.__name__
+    return run
+
+
+@without_model
+def test_generic_words_do_not_force_search():
+    for text in ["我现在很难过", "解释一下正态分布", "帮我写一个统计学的作业",
+                 "用Python实现数组排名", "这个事件对你有什么启发"]:
+        assert route(user(text)).action == "fallback", text
+
+
+@without_model
+def test_rule_hit_alone_is_below_threshold():
+    decision = route(user("英伟达股价"))
+    assert decision.action == "fallback"
+    assert decision.score < ROUTER_SEARCH_THRESHOLD
+    # 模型同样判断为搜索：直接搜索
+    decision = route(user("英伟达股价"), model=FixedModel(0.99))
+    assert decision.action == "search" and decision.query == "英伟达股价"
+    # 模型不认同：回退
+    assert route(user("英伟达股价"), model=FixedModel(0.5)).action == "fallback"
+
+
+@without_model
+def test_weather_query_gets_location():
+    decision = route(user("今天天气怎么样"), location_city="广西钦州", model=FixedModel(0.99))
+    assert decision.action == "search"
+    assert decision.query == "广西钦州 今天天气怎么样"
+
+
+@without_model
+def test_time_and_greetings_are_answered():
+    for text in ["现在几点", "今天星期几", "今天是什么日期", "你好", "谢谢！"]:
+        assert route(user(text)).action == "answer", text
+
+
+@without_model
+def test_recent_search_defers_to_model():
+    history = [
+        {"role": "user", "content": "英伟达股价"},
+        {"role": "assistant", "content": "", "tool_calls": [{
+            "id": "call_1", "type": "function",
+            "function": {"name": "search", "arguments": '{"query": "英伟达股价"}'},
+        }]},
+        {"role": "tool", "tool_call_id": "call_1", "content": "英伟达 收盘 100 美元"},
+        {"role": "assistant", "content": "英伟达收盘 100 美元"},
+    ]
+    model = FixedModel(0.99)
+    assert route(history + user("英伟达股价"), model=model).action == "fallback"
+
+    # 超过 5 轮之前的搜索不影响
+    for i in range(5):
+        history += [{"role": "user", "content": f"闲聊{i}"}, {"role": "assistant", "content": "好的"}]
+    assert route(history + user("英伟达股价"), model=model).action == "search"
+
+
+if __name__ == "__main__":
+    test_generic_words_do_not_force_search()
+    test_rule_hit_alone_is_below_threshold()
+    test_weather_query_gets_location()
+    test_time_and_greetings_are_answered()
+    test_recent_search_defers_to_model()
+    print("ok")
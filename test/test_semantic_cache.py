@@ -0,0 +1,72 @@
+"""
+近似重复查询缓存测试
+
+运行：python test/test_semantic_cache.py  或  pytest test/test_semantic_cache.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_providers  # noqa: E402
+import search_service  # noqa: E402
+from config import SEARCH_FALLBACKS, SEARCH_PRIMARY, SEARCH_SECONDARY  # noqa: E402
+from search_cache import normalize_query  # noqa: E402
+from semantic_cache import SemanticIndex, canonicalize  # noqa: E402
+
+DATE = "，（今日日期：2026-01-08）"
+
+
+def test_canonicalize_location_and_date():
+    a = canonicalize("广西钦州 今日天气" + DATE)
+    b = canonicalize("今日天气 广西壮族自治区钦州市" + DATE)
+    assert a == b == ("广西钦州今日天气", frozenset({"20260108"}))
+    assert canonicalize("2026年1月8日 金价")[1] == canonicalize("金价 2026-01-08")[1]
+
+
+def test_index_matches_paraphrase_only():
+    index = SemanticIndex()
+    index.add("k1", "今日天气 广西壮族自治区钦州市" + DATE)
+    index.add("k2", "今日纳斯达克指数")
+
+    assert index.lookup("广西钦州 今日天气" + DATE)[0] == "k1"
+    assert index.lookup("纳斯达克指数今天")[0] == "k2"
+    # 城市、日期、相对时间不同都不能命中
+    assert index.lookup("广西南宁 今日天气" + DATE) is None
+    assert index.lookup("广西钦州 今日天气，（今日日期：2026-01-09）") is None
+    assert index.lookup("广西钦州 明天天气" + DATE) is None
+
+
+async def fake_search(query: str) -> dict:
+    fake_search.calls += 1
+    return {"code": 200, "msg": query}
+
+
+def test_run_search_reuses_near_duplicate():
+    names = list(dict.fromkeys(n for n in [SEARCH_PRIMARY, SEARCH_SECONDARY, *SEARCH_FALLBACKS] if n))
+    saved = {name: search_providers.get_provider(name) for name in names}
+    for name in names:
+        search_providers.register_provider(search_providers.SearchProvider(name, fake_search))
+    fake_search.calls = 0
+    search_service.search_cache.clear()
+    try:
+        first = asyncio.run(search_service.run_search("今日天气 广西壮族自治区钦州市" + DATE))
+        second = asyncio.run(search_service.run_search("广西钦州 今日天气" + DATE))
+    finally:
+        for provider in saved.values():
+            search_providers.register_provider(provider)
+        search_service.search_cache.clear()
+        search_service.semantic_index.remove(normalize_query("今日天气 广西壮族自治区钦州市" + DATE))
+
+    assert second == first
+    assert fake_search.calls == 1
+
+
+if __name__ == "__main__":
+    # 只测试内存缓存，不读写持久化缓存文件（pytest 下由 conftest.py 处理）
+    search_service.disk_cache = None
+    test_canonicalize_location_and_date()
+    test_index_matches_paraphrase_only()
+    test_run_search_reuses_near_duplicate()
+    print("ok")
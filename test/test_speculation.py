@@ -0,0 +1,116 @@
+"""
+投机搜索测试
+
+用假的搜索函数替换 speculation.run_search，验证：
+1. 模型实际 query 与投机 query 相似：复用投机结果（命中），且只复用一次
+2. 参数不相似：不复用（mismatch），请求结束时记为浪费
+3. 客户端断开时取消仍在进行的投机搜索，上游调用被取消
+4. 不需要搜索的问题不发起投机搜索
+
+运行：python test/test_speculation.py  或  pytest test/test_speculation.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+import speculation  # noqa: E402
+from speculation import Speculation, heuristic_query  # noqa: E402
+
+COUNTERS = ["speculation_started", "speculation_hit", "speculation_mismatch",
+            "speculation_wasted", "speculation_cancelled"]
+
+
+class FakeSearch:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.queries = []
+        self.cancelled = 0
+
+    async def __call__(self, query: str, deadline=None) -> dict:
+        self.queries.append(query)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"code": 200, "msg": f"result: {query}"}
+
+
+def run(coro_fn, search):
+    saved = speculation.run_search
+    speculation.run_search = search
+    before = {name: metrics.get(name) for name in COUNTERS}
+    try:
+        result = asyncio.run(coro_fn())
+    finally:
+        speculation.run_search = saved
+    return result, {name: metrics.get(name) - before[name] for name in COUNTERS}
+
+
+def test_hit_is_reused_once():
+    search = FakeSearch(0.05)
+
+    async def go():
+        spec = Speculation("北京今天天气")
+        first = await spec.take("北京今日天气怎么样")
+        again = await spec.take("北京今天天气")
+        spec.finish()
+        return first, again
+
+    (first, again), delta = run(go, search)
+    assert first == {"code": 200, "msg": "result: 北京今天天气"}
+    assert again is None
+    assert search.queries == ["北京今天天气"]
+    assert delta["speculation_started"] == 1 and delta["speculation_hit"] == 1
+    assert delta["speculation_wasted"] == 0
+
+
+def test_mismatch_counts_as_wasted():
+    search = FakeSearch()
+
+    async def go():
+        spec = Speculation("北京今天天气")
+        result = await spec.take("英伟达最新财报")
+        await spec.task
+        spec.finish()
+        return result
+
+    result, delta = run(go, search)
+    assert result is None
+    assert delta["speculation_mismatch"] == 1 and delta["speculation_hit"] == 0
+    assert delta["speculation_wasted"] == 1
+
+
+def test_cancel_unused_speculation():
+    search = FakeSearch(5)
+
+    async def go():
+        spec = Speculation("上海明天天气")
+        await asyncio.sleep(0.01)
+        spec.cancel()
+        await asyncio.gather(spec.task, return_exceptions=True)
+        spec.finish()
+        # 已结束的任务再取消不重复计数
+        spec.cancel()
+        return spec.task.cancelled()
+
+    cancelled, delta = run(go, search)
+    assert cancelled and search.cancelled == 1
+    assert delta["speculation_cancelled"] == 1
+    assert delta["speculation_wasted"] == 1
+
+
+def test_no_speculation_without_search_intent():
+    assert heuristic_query([{"role": "user", "content": "写一首关于春天的诗"}]) is None
+    assert heuristic_query([{"role": "user", "content": "今天天气怎么样"}], "广西钦州") == "广西钦州 今天天气怎么样"
+
+
+if __name__ == "__main__":
+    test_hit_is_reused_once()
+    test_mismatch_counts_as_wasted()
+    test_cancel_unused_speculation()
+    test_no_speculation_without_search_intent()
+    print("ok")
@@ -0,0 +1,94 @@
+"""
+并发工具调用测试
+
+用延迟各不相同的假搜索函数替换 chat_handlers.run_search，验证：
+1. 多个工具调用并发执行，结果按原 tool_calls 顺序返回
+2. 单个调用抛异常或超时不影响其他调用
+3. 单个调用的超时取 TOOL_CALL_TIMEOUT 与请求剩余预算（扣除回答预留）中较小者
+
+运行：python test/test_tool_calls.py  或  pytest test/test_tool_calls.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chat_handlers  # noqa: E402
+import request_budget  # noqa: E402
+from request_budget import RequestBudget  # noqa: E402
+
+# query -> 延迟（秒）；"boom" 抛异常
+LATENCIES = {"慢": 0.3, "中": 0.15, "快": 0.0, "很慢": 5.0}
+
+
+async def fake_search(query: str, deadline=None) -> dict:
+    if query == "boom":
+        raise RuntimeError("provider down")
+    await asyncio.sleep(LATENCIES[query])
+    return {"code": 200, "msg": f"result: {query}"}
+
+
+def tool_call(i: int, query: str) -> dict:
+    return {
+        "id": f"call_{i}", "type": "function",
+        "function": {"name": "search", "arguments": json.dumps({"query": query}, ensure_ascii=False)},
+    }
+
+
+def run_calls(queries, budget, tool_timeout=None):
+    saved = chat_handlers.run_search, chat_handlers.TOOL_CALL_TIMEOUT
+    chat_handlers.run_search = fake_search
+    if tool_timeout is not None:
+        chat_handlers.TOOL_CALL_TIMEOUT = tool_timeout
+    calls = [tool_call(i, q) for i, q in enumerate(queries)]
+    try:
+        st = time.monotonic()
+        outcomes = asyncio.run(chat_handlers._run_tool_calls(calls, lambda q: q, budget))
+        return outcomes, time.monotonic() - st
+    finally:
+        chat_handlers.run_search, chat_handlers.TOOL_CALL_TIMEOUT = saved
+
+
+def test_results_keep_order_and_run_concurrently():
+    budget = RequestBudget()
+    outcomes, elapsed = run_calls(["慢", "中", "快"], budget)
+    assert [o["result"] for o in outcomes] == ["result: 慢", "result: 中", "result: 快"]
+    assert all(o["success"] for o in outcomes)
+    # 并发执行：总耗时接近最慢的一个，而不是三者之和
+    assert elapsed < 0.4
+    assert [s[:2] for s in budget.stages] == [("search", "ok")] * 3
+
+
+def test_failure_and_timeout_are_isolated():
+    budget = RequestBudget()
+    outcomes, elapsed = run_calls(["中", "boom", "很慢", "快"], budget, tool_timeout=0.2)
+    assert outcomes[0] == {"success": True, "result": "result: 中"}
+    assert not outcomes[1]["success"] and "provider down" in outcomes[1]["result"]
+    assert outcomes[2] == {"success": False, "result": "Tool timeout"}
+    assert outcomes[3] == {"success": True, "result": "result: 快"}
+    assert elapsed < 0.5
+    assert sorted(s[1] for s in budget.stages) == ["error", "ok", "ok", "timeout"]
+
+
+def test_timeout_capped_by_budget():
+    saved = request_budget.DEADLINE_MIN_SEARCH_SECONDS, request_budget.DEADLINE_ANSWER_RESERVE
+    request_budget.DEADLINE_MIN_SEARCH_SECONDS, request_budget.DEADLINE_ANSWER_RESERVE = 0.1, 0.3
+    try:
+        # 预算 0.5 秒、回答预留 0.3 秒：搜索最多 0.2 秒，远小于 TOOL_CALL_TIMEOUT
+        budget = RequestBudget(0.5)
+        outcomes, elapsed = run_calls(["中", "慢"], budget)
+    finally:
+        request_budget.DEADLINE_MIN_SEARCH_SECONDS, request_budget.DEADLINE_ANSWER_RESERVE = saved
+    assert outcomes[0]["success"]
+    assert outcomes[1] == {"success": False, "result": "Tool timeout"}
+    assert elapsed < 0.3
+
+
+if __name__ == "__main__":
+    test_results_keep_order_and_run_concurrently()
+    test_failure_and_timeout_are_isolated()
+    test_timeout_capped_by_budget()
+    print("ok")
@@ -0,0 +1,150 @@
+"""
+流式工具调用参数拼接测试
+
+验证 ToolCallAssembler / _ArgsScanner：
+1. 字符串内的 { } 和 \\" 转义不影响括号计数
+2. 流中途 tc.index 变化时，之前的工具调用视为完成
+3. 括号闭合但 JSON 无效时不提前完成，等到新 index 或 finish()
+4. 闭合后到达的增量继续拼接，不重复完成
+5. finish() 完成尚未闭合的工具调用
+6. 工具调用之后仍有文本输出时，空 chunk 计数重新开始，第一轮不会被提前关闭
+
+运行：python test/test_tool_stream.py  或  pytest test/test_tool_stream.py
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall  # noqa: E402
+
+import chat_handlers  # noqa: E402
+from config import TOOL_STREAM_IDLE_CHUNKS  # noqa: E402
+from schema import Message  # noqa: E402
+from test_client_disconnect import FakeStream, chunk, install_client  # noqa: E402
+from tool_stream import ToolCallAssembler, _ArgsScanner  # noqa: E402
+
+
+def delta(index, arguments=None, name=None, id=None):
+    function = {}
+    if name is not None:
+        function["name"] = name
+    if arguments is not None:
+        function["arguments"] = arguments
+    return ChoiceDeltaToolCall.model_validate({
+        "index": index, "id": id, "type": "function" if id else None, "function": function,
+    })
+
+
+def feed_all(assembler, pieces, index=0):
+    done = []
+    for piece in pieces:
+        done += assembler.feed([delta(index, piece)])
+    return done
+
+
+def test_braces_and_escapes_inside_strings():
+    scanner = _ArgsScanner()
+    text = '{"query": "a } b { c \\" } \\\\", "n": [1, {"x": "]"}]}'
+    assert json.loads(text)
+    # 逐字符输入，只在最后一个字符闭合
+    results = [scanner.feed(ch) for ch in text]
+    assert results[-1] and not any(results[:-1])
+
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, name="search", id="call_a")])
+    pieces = ['{"query": "', '天气 {北京', '} \\"', '今天\\"', '"', "}"]
+    assert feed_all(assembler, pieces) == [0]
+    call = assembler.tool_calls()[0]
+    assert call["id"] == "call_a" and call["function"]["name"] == "search"
+    assert json.loads(call["function"]["arguments"]) == {"query": '天气 {北京} "今天"'}
+
+
+def test_index_change_completes_previous_call():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, name="search", id="call_a")])
+    # 第一个调用的参数还没闭合，模型已开始输出第二个调用
+    assert feed_all(assembler, ['{"query": "北京天气"']) == []
+    assert assembler.feed([delta(1, '{"query"', name="search", id="call_b")]) == [0]
+    assert assembler.feed([delta(1, ': "上海天气"}')]) == [1]
+    assert assembler.all_complete
+    assert [c["id"] for c in assembler.tool_calls()] == ["call_a", "call_b"]
+
+
+def test_invalid_json_after_braces_balance():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, name="search", id="call_a")])
+    # 括号已闭合，但内容不是合法 JSON：不提前执行
+    assert feed_all(assembler, ['{"query": 北京}']) == []
+    assert not assembler.all_complete
+    # 之后的增量不再触发完成，留到 finish()
+    assert feed_all(assembler, [" "]) == []
+    assert assembler.finish() == [0]
+    assert assembler.tool_calls()[0]["function"]["arguments"] == '{"query": 北京} '
+
+
+def test_deltas_after_close_are_appended_once():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, name="search", id="call_a")])
+    assert feed_all(assembler, ['{"query": "x"}']) == [0]
+    assert feed_all(assembler, ["\n", " "]) == []
+    assert assembler.finish() == []
+    assert assembler.completed == [0]
+    assert json.loads(assembler.tool_calls()[0]["function"]["arguments"]) == {"query": "x"}
+
+
+def test_finish_completes_unclosed_call():
+    assembler = ToolCallAssembler()
+    assert not assembler
+    assembler.feed([delta(0, name="search")])
+    feed_all(assembler, ['{"query": "北京'])
+    assert assembler and not assembler.all_complete
+    assert assembler.finish() == [0]
+    assert assembler.all_complete
+    # 没有 id 的调用生成一个
+    assert assembler.tool_calls()[0]["id"].startswith("call_")
+
+
+def test_prose_after_tool_call_resets_idle_count():
+    async def fake_search(query, deadline=None):
+        return {"code": 200, "msg": "ok"}
+
+    tool_call = [{
+        "index": 0, "id": "call_1", "type": "function",
+        "function": {"name": "search", "arguments": '{"query": "英伟达财报"}'},
+    }]
+    # 工具调用完成后，空 chunk 与文本交替出现：累计超过阈值，但从未连续达到阈值
+    tail = []
+    for i in range(TOOL_STREAM_IDLE_CHUNKS):
+        tail += [chunk(content="")] * (TOOL_STREAM_IDLE_CHUNKS - 1) + [chunk(content=f"说明{i}")]
+    first = FakeStream([chunk(tool_calls=tool_call), *tail, chunk(finish_reason="tool_calls")], interval=0)
+    second = FakeStream([chunk(content="答案"), chunk(finish_reason="stop")], interval=0)
+    original, fake = install_client([first, second])
+    saved = chat_handlers.run_search
+    chat_handlers.run_search = fake_search
+
+    async def run():
+        return [item async for item in chat_handlers.chat_completion_stream([Message(role="user", content="英伟达财报")])]
+
+    try:
+        items = asyncio.run(run())
+    finally:
+        chat_handlers.pool = original
+        chat_handlers.run_search = saved
+
+    contents = [i["choices"][0]["delta"].get("content") for i in items if i.get("choices")]
+    assert f"说明{TOOL_STREAM_IDLE_CHUNKS - 1}" in contents
+    assert not first.closed
+    assert contents[-2:] == ["答案", None]
+
+
+if __name__ == "__main__":
+    test_braces_and_escapes_inside_strings()
+    test_index_change_completes_previous_call()
+    test_invalid_json_after_braces_balance()
+    test_deltas_after_close_are_appended_once()
+    test_finish_completes_unclosed_call()
+    test_prose_after_tool_call_resets_idle_count()
+    print("ok")
@@ -0,0 +1,132 @@
+"""
+天气缓存测试
+
+用假的服务商函数计数上游调用，验证：
+1. 不同措辞的同城同日天气查询归一为同一个 key；多天 / 非天气问法不走天气缓存
+2. TTL 内天气查询直接由天气缓存返回，不请求上游
+3. 预取 location 中最常见城市当天的天气；令牌桶余量不足时跳过
+
+运行：python test/test_weather_cache.py  或  pytest test/test_weather_cache.py
+"""
+import asyncio
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_providers  # noqa: E402
+import search_service  # noqa: E402
+from config import SEARCH_FALLBACKS, SEARCH_PRIMARY, SEARCH_SECONDARY  # noqa: E402
+from search_cache import search_cache  # noqa: E402
+from weather_cache import WeatherKey, weather_cache, weather_key  # noqa: E402
+
+NAMES = list(dict.fromkeys(n for n in [SEARCH_PRIMARY, SEARCH_SECONDARY, *SEARCH_FALLBACKS] if n))
+TODAY = date(2026, 10, 18)
+
+
+class Upstream:
+    def __init__(self):
+        self.queries = []
+
+    async def __call__(self, query: str) -> dict:
+        self.queries.append(query)
+        await asyncio.sleep(0.01)
+        return {"code": 200, "msg": f"weather: {query}"}
+
+
+def install(rate_limit):
+    upstream = Upstream()
+    saved = {name: search_providers.get_provider(name) for name in NAMES}
+    for name in NAMES:
+        search_providers.register_provider(search_providers.SearchProvider(name, upstream, rate_limit=rate_limit))
+    search_cache.clear()
+    weather_cache.clear()
+    return saved, upstream
+
+
+def restore(saved):
+    for provider in saved.values():
+        search_providers.register_provider(provider)
+    search_cache.clear()
+    weather_cache.clear()
+
+
+def test_weather_key_normalization():
+    key = WeatherKey("广西钦州", "广西壮族自治区钦州市", TODAY)
+    assert weather_key("钦州今天天气怎么样", TODAY) == key
+    assert weather_key("今日天气 广西壮族自治区钦州市", TODAY) == key
+    assert weather_key("广西钦州 天气预报，（今日日期：2026-10-18）", TODAY) == key
+    assert weather_key("钦州明天会下雨吗", TODAY).day == date(2026, 10, 19)
+    assert weather_key("北京朝阳区天气", TODAY).city == "北京朝阳"
+    assert key.query == "广西壮族自治区钦州市 2026年10月18日 天气"
+
+    # 不是“某城市某一天的天气”
+    assert weather_key("广东天气", TODAY) is None
+    assert weather_key("北京未来一周天气", TODAY) is None
+    assert weather_key("北京今天天气适合跑步吗", TODAY) is None
+    assert weather_key("深圳昨天天气", TODAY) is None
+    assert weather_key("北京今天新闻", TODAY) is None
+
+
+def test_weather_queries_served_from_cache():
+    saved, upstream = install({"qps": 100, "burst": 10, "max_queue": 10})
+
+    async def run():
+        results = []
+        for q in ["钦州今天天气怎么样", "今日天气 广西壮族自治区钦州市", "广西钦州天气预报"]:
+            results.append(await search_service.run_search(q))
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        restore(saved)
+
+    assert len(upstream.queries) == 1
+    assert upstream.queries[0].startswith("广西壮族自治区钦州市 ")
+    assert results[0] == results[1] == results[2]
+
+
+def test_prefetch_top_location_cities():
+    saved, upstream = install({"qps": 100, "burst": 10, "max_queue": 10})
+    for location in ["广西钦州市钦南区某街道"] * 3 + ["北京市海淀区中关村"] * 2 + ["上海市浦东新区"]:
+        weather_cache.note_location(location)
+
+    async def run():
+        first = await search_service.prefetch_weather_once()
+        again = await search_service.prefetch_weather_once()
+        served = await search_service.run_search("北京今天天气")
+        return first, again, served
+
+    try:
+        first, again, served = asyncio.run(run())
+        top = [city for city, _ in weather_cache.top_cities(3)]
+    finally:
+        restore(saved)
+
+    assert top == ["广西钦州", "北京", "上海"]
+    assert first == 3 and again == 0
+    assert len(upstream.queries) == 3
+    assert served["msg"].startswith("weather: 北京市 ")
+
+
+def test_prefetch_skipped_without_headroom():
+    # 桶容量 1、几乎不补充：余量低于 SEARCH_REFRESH_MIN_TOKENS，不预取
+    saved, upstream = install({"qps": 0.001, "burst": 1, "max_queue": 10})
+    weather_cache.note_location("广西钦州市")
+    try:
+        prefetched = asyncio.run(search_service.prefetch_weather_once())
+    finally:
+        restore(saved)
+    assert prefetched == 0 and upstream.queries == []
+
+
+if __name__ == "__main__":
+    # 只测试内存缓存，不读写持久化缓存文件（pytest 下由 conftest.py 处理）
+    search_service.disk_cache = None
+    test_weather_key_normalization()
+    test_weather_queries_served_from_cache()
+    test_prefetch_top_location_cities()
+    test_prefetch_skipped_without_headroom()
+    print("ok")
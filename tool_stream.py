@@ -0,0 +1,117 @@
+"""
+流式工具调用参数拼接
+- 按 tc.index 增量拼接 name / arguments
+- 检测某个工具调用的 JSON arguments 是否已闭合：
+  1. 增量括号扫描（忽略字符串内的括号），顶层对象闭合且可解析即完成
+  2. 出现更大的 tc.index 时，之前的工具调用视为完成
+- 完成后即可提前执行工具，不必等第一轮流结束
+"""
+import json
+import uuid
+from typing import Any, Dict, List
+
+
+class _ArgsScanner:
+    """增量扫描 JSON 文本，判断顶层对象是否闭合"""
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.closed = False
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if self.closed:
+                break
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+                self.started = True
+            elif ch in "}]":
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    self.closed = True
+        return self.closed
+
+
+class ToolCallAssembler:
+
+    def __init__(self):
+        self.buffers: Dict[int, Dict[str, Any]] = {}
+        self._scanners: Dict[int, _ArgsScanner] = {}
+        self.completed: List[int] = []
+
+    def feed(self, delta_tool_calls) -> List[int]:
+        """
+        输入一个 chunk 的 delta.tool_calls，返回本次新完成的工具调用 index
+        """
+        newly: List[int] = []
+
+        for tc in delta_tool_calls:
+            idx = tc.index
+
+            if idx not in self.buffers:
+                # 出现新的 index：之前的工具调用都已结束
+                for prev in sorted(self.buffers):
+                    if prev < idx:
+                        newly += self._complete(prev)
+
+                self.buffers[idx] = {
+                    "id": tc.id or f"call_{uuid.uuid4()}",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""},
+                }
+                self._scanners[idx] = _ArgsScanner()
+
+            buf = self.buffers[idx]
+
+            if tc.function and tc.function.name:
+                buf["function"]["name"] = tc.function.name
+
+            if tc.function and tc.function.arguments:
+                buf["function"]["arguments"] += tc.function.arguments
+                if self._scanners[idx].feed(tc.function.arguments):
+                    newly += self._complete(idx, require_valid=True)
+
+        return newly
+
+    def finish(self) -> List[int]:
+        """流结束：剩余未完成的工具调用全部视为完成"""
+        newly: List[int] = []
+        for idx in sorted(self.buffers):
+            newly += self._complete(idx)
+        return newly
+
+    def _complete(self, idx: int, require_valid: bool = False) -> List[int]:
+        if idx in self.completed:
+            return []
+        if require_valid:
+            try:
+                json.loads(self.buffers[idx]["function"]["arguments"])
+            except json.JSONDecodeError:
+                return []
+        self.completed.append(idx)
+        return [idx]
+
+    @property
+    def all_complete(self) -> bool:
+        return bool(self.buffers) and len(self.completed) == len(self.buffers)
+
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        """按 index 顺序返回拼接好的工具调用"""
+        return [self.buffers[i] for i in sorted(self.buffers)]
+
+    def __bool__(self) -> bool:
+        return bool(self.buffers)
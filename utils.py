@@ -11,6 +11,7 @@ def split_messages_by_role(
     """划分消息类型"""
     system_contents = []
     history = []
+    system_msg = {"role": "system", "content": ""}
 
     for msg in messages:
         role = msg.get("role")
@@ -84,4 +85,42 @@ def truncate_by_rounds_and_chars(
     if kept and kept[0]["role"] == "assistant":
         kept = kept[1:]
 
-    return kept
\ No newline at end of file
+    return kept
+
+
+def build_prompt_messages(
+    messages: List[Dict[str, Any]],
+    static_prefix: str,
+    volatile_contents: List[str],
+    max_rounds: int = 5,
+    max_chars: int = 8000,
+) -> List[Dict[str, Any]]:
+    """
+    按前缀缓存友好的固定布局组装消息：
+    1. system：静态规则前缀（字节稳定） + 客户端人设
+    2. 裁剪后的历史对话
+    3. 易变信息（时间、位置等）作为 system 消息，插在最后一条 user 消息之前
+    这样规则、人设和更早的对话轮次在多次请求间保持相同前缀
+    """
+    persona_msg, history = split_messages_by_role(messages)
+    history = truncate_by_rounds_and_chars(
+        history,
+        max_rounds=max_rounds,
+        max_chars=max_chars,
+    )
+
+    system_content = static_prefix
+    if persona_msg["content"]:
+        system_content = f"{static_prefix}\n\n{persona_msg['content']}"
+    result = [{"role": "system", "content": system_content}, *history]
+
+    volatile = [c for c in volatile_contents if c]
+    if volatile:
+        volatile_msg = {"role": "system", "content": "\n\n".join(volatile)}
+        last_user = max(
+            (i for i, m in enumerate(result) if m["role"] == "user"),
+            default=len(result),
+        )
+        result.insert(last_user, volatile_msg)
+
+    return result
@@ -0,0 +1,152 @@
+"""
+按 城市 + 日期 的天气缓存
+- 天气是最主要的工具调用类别，模型生成的 query 措辞各异（"钦州今天天气" / "广西钦州 天气预报 今日"），
+  按 (规范城市, 日期) 归一后共用一条缓存，TTL 内不再请求上游
+- 只处理“某城市某一天的天气”：一周预报、逐小时、适合做什么 等问法返回 None，走通用搜索
+- 按请求中的 location 统计常见城市，供后台定期预取这些城市当天的天气
+"""
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config import WEATHER_CACHE_MAX_ENTRIES, WEATHER_CACHE_TTL, WEATHER_CITIES_MAX
+import keywords
+from gazetteer import Location, locate, resolve
+from gazetteer_data import CITIES
+from schema import KEYWORD_TABLE
+from search_cache import HotKeys, TTLCache
+
+_DATE_SUFFIX_RE = re.compile(r"[，,]?\s*[（(]今日日期[:：]\s*(\d{4})-(\d{1,2})-(\d{1,2})[)）]")
+_DATE_RES = [
+    re.compile(r"(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})[日号]?"),
+    re.compile(r"()(\d{1,2})月(\d{1,2})[日号]"),
+]
+_REL_DAY_RE = re.compile(r"大后天|后天|明天|明日|今天|今日|当天|当日")
+_REL_DAYS = {"今天": 0, "今日": 0, "当天": 0, "当日": 0, "明天": 1, "明日": 1, "后天": 2, "大后天": 3}
+# 多天、逐小时、历史、气候等：不是“某一天的天气”
+_RANGE_RE = re.compile(
+    r"本周|这周|下周|周末|未来|一周|\d+天|[一二三四五六七八九十]+天|几天|近期|最近|小时|逐时|"
+    r"历史|往年|去年|昨天|昨日|前天|月份|季节|气候"
+)
+# 去掉地名、日期后只允许剩下这些词（天气相关词 + 虚词）
+_FILLER_RE = re.compile(
+    "|".join(sorted(map(re.escape, KEYWORD_TABLE["weather"]), key=len, reverse=True))
+    + r"|预报|情况|怎么样|咋样|如何|怎样|查询|实时|最新|的|是|会|吗|呢|啊|[\s\W_\d]"
+)
+# 只看未来几天（搜索结果中的预报通常覆盖一周）
+_MAX_DAYS_AHEAD = 6
+
+
+class WeatherKey(NamedTuple):
+    city: str    # 短名：广西钦州 / 北京海淀
+    place: str   # 全称，用于上游查询：广西壮族自治区钦州市
+    day: date
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.city}|{self.day.isoformat()}"
+
+    @property
+    def query(self) -> str:
+        """统一的上游查询"""
+        return f"{self.place} {self.day.year}年{self.day.month}月{self.day.day}日 天气"
+
+
+def _city_level(loc: Location) -> bool:
+    """到市一级（直辖市、港澳台省级即可）"""
+    return bool(loc.city) or (loc.province is not None and loc.province not in CITIES)
+
+
+def weather_key(query: str, today: Optional[date] = None) -> Optional[WeatherKey]:
+    """query 是“某城市某一天的天气”时返回缓存 key，否则返回 None"""
+    if not query or not keywords.has(query, keywords.WEATHER):
+        return None
+    ref = today or date.today()
+    text = query
+    m = _DATE_SUFFIX_RE.search(text)
+    if m is not None:
+        ref = date(*map(int, m.groups()))
+        text = text[:m.start()] + " " + text[m.end():]
+    if _RANGE_RE.search(text):
+        return None
+
+    loc, spans = locate(text)
+    if not _city_level(loc):
+        return None
+    for start, end in reversed(spans):
+        text = text[:start] + " " + text[end:]
+
+    days = set()
+
+    def date_repl(m):
+        y, mo, d = m.groups()
+        try:
+            days.add(date(int(y or ref.year), int(mo), int(d)))
+        except ValueError:
+            days.add(None)
+        return " "
+
+    for pattern in _DATE_RES:
+        text = pattern.sub(date_repl, text)
+
+    def rel_repl(m):
+        days.add(ref + timedelta(days=_REL_DAYS[m.group(0)]))
+        return " "
+
+    text = _REL_DAY_RE.sub(rel_repl, text)
+    if len(days) > 1 or None in days:
+        return None
+    day = days.pop() if days else ref
+    if not 0 <= (day - ref).days <= _MAX_DAYS_AHEAD:
+        return None
+    if len(_FILLER_RE.sub("", text)) > 1:
+        return None
+    return WeatherKey(loc.key, loc.canonical + (loc.district or ""), day)
+
+
+class WeatherCache:
+    """
+    天气结果缓存：WeatherKey -> 搜索结果
+    - cities：按 location 统计的常见城市（衰减计数），预取时取 top-K
+    """
+
+    def __init__(self, max_entries: int = WEATHER_CACHE_MAX_ENTRIES, ttl: float = WEATHER_CACHE_TTL,
+                 max_cities: int = WEATHER_CITIES_MAX):
+        self.ttl = ttl
+        self._cache = TTLCache(max_entries)
+        self.cities = HotKeys(max_cities)
+
+    def get(self, key: WeatherKey) -> Optional[Any]:
+        return self._cache.get(key.cache_key)
+
+    def set(self, key: WeatherKey, value: Any) -> None:
+        self._cache.set(key.cache_key, value, self.ttl)
+
+    def ttl_remaining(self, key: WeatherKey) -> Optional[float]:
+        return self._cache.ttl_remaining(key.cache_key)
+
+    def clear(self) -> None:
+        """清空缓存和城市统计"""
+        self._cache.clear()
+        self.cities = HotKeys(self.cities.max_keys, self.cities.decay_factor)
+
+    def note_location(self, location: Optional[str]) -> None:
+        """记录请求中的用户位置（市一级，忽略区、街道）"""
+        if not location:
+            return
+        loc = resolve(location)
+        if not _city_level(loc):
+            return
+        loc = Location(loc.province, loc.city)
+        self.cities.touch(loc.key, loc.canonical)
+
+    def top_cities(self, k: int) -> List[Tuple[str, str]]:
+        """最常见的 k 个城市 (短名, 全称)"""
+        return self.cities.top(k)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "ttl": self.ttl, "tracked_cities": len(self.cities)}
+
+
+# 进程级天气缓存
+weather_cache = WeatherCache()